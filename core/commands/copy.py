@@ -154,6 +154,22 @@ class Copy(CommandBase):
             default=constant.DEFAULT_BATCH_SIZE,
             help="Commit transaction after X changes have " "been replayed",
         )
+        parser.add_argument(
+            "--replay-commit-interval",
+            type=float,
+            default=0,
+            help="Commit the replay transaction once it has been open for "
+            "this many seconds, instead of after --replay-batch-size changes. "
+            "0 means committing by the number of changes",
+        )
+        parser.add_argument(
+            "--replay-batch-target-time",
+            type=float,
+            default=0,
+            help="Adjust the number of changes replayed between commits, so "
+            "that each replay transaction takes about this many seconds. "
+            "0 means committing after a fixed --replay-batch-size changes",
+        )
         parser.add_argument(
             "--replay-grouping-size",
             type=int,
@@ -225,6 +241,23 @@ class Copy(CommandBase):
             "WRITE may fail because of dead lock or lock "
             "timeout.",
         )
+        parser.add_argument(
+            "--kill-metadata-lock-holders",
+            action="store_true",
+            help="When tables can't be locked in time, also kill the "
+            "sessions holding a metadata lock on them according to "
+            "performance_schema, including idle transactions. Needs the "
+            "metadata lock instrument to be enabled",
+        )
+        parser.add_argument(
+            "--cut-over-lock-wait-timeout",
+            type=int,
+            help="lock_wait_timeout in seconds for locking tables "
+            "before swapping them. Other queries on the table are "
+            "blocked while the lock is waiting, so a low value "
+            "gives up early and retries, up to --lock-max-attempts "
+            "times. Server's session value is used if not given",
+        )
         parser.add_argument(
             "--mysql-session-timeout",
             default=constant.SESSION_TIMEOUT,
@@ -254,6 +287,55 @@ class Copy(CommandBase):
             "of delta event. Use this option only if you rely "
             "on unique_checks to perform blind writes",
         )
+        parser.add_argument(
+            "--batch-updates",
+            action="store_true",
+            help="Group consecutive updates on different primary keys "
+            "during replay, and replay each group with a single "
+            "UPDATE ... JOIN statement",
+        )
+        parser.add_argument(
+            "--replay-multi-statements",
+            action="store_true",
+            help="Send consecutive groups of the same type of changes to "
+            "MySQL as a single multi-statement query during replay, up to "
+            "--replay-batch-size changes per round trip",
+        )
+        parser.add_argument(
+            "--replay-deletes-by-pk",
+            action="store_true",
+            help="Replay deletes with the primary key values read from the "
+            "delta table, instead of joining it again. Only applies to tables "
+            "with a single column primary key",
+        )
+        parser.add_argument(
+            "--skip-superseded-updates",
+            action="store_true",
+            help="Don't replay an update if the same row is updated again "
+            "later in the same run of consecutive updates. Only applies when "
+            "the new table has the same primary key as the old one",
+        )
+        parser.add_argument(
+            "--bulk-replay-threshold",
+            type=int,
+            default=0,
+            help="Replay runs of at least this many inserts with contiguous "
+            "change IDs by ID range, --replay-batch-size changes per "
+            "statement. 0 means always replaying by the list of IDs",
+        )
+        parser.add_argument(
+            "--parallel-checksum",
+            action="store_true",
+            help="Checksum the new table on a second connection while the "
+            "old table is being checksummed",
+        )
+        parser.add_argument(
+            "--fail-fast-checksum",
+            action="store_true",
+            help="Compare the checksum of old and new table chunk by chunk, "
+            "and stop at the first mismatching chunk instead of scanning "
+            "both tables in full first",
+        )
         parser.add_argument(
             "--skip-checksum",
             action="store_true",
@@ -261,6 +343,14 @@ class Copy(CommandBase):
             "sure about what you're doing and don't want "
             "waste time in checksuming",
         )
+        parser.add_argument(
+            "--skip-triggers",
+            action="store_true",
+            help="Don't create triggers or catch up changes, if you're sure "
+            "nothing writes to the table during OSC. Both tables are checksummed "
+            "while they are locked for the swap, which will be aborted if they "
+            "differ. This holds the lock for a full scan of both tables",
+        )
         parser.add_argument(
             "--skip-delta-checksum",
             action="store_true",
@@ -349,6 +439,37 @@ class Copy(CommandBase):
             default=constant.DUMP_THREADS,
             help="Number of worker threads to use in DUMP TABLE",
         )
+        parser.add_argument(
+            "--dump-chunk-target-time",
+            type=float,
+            default=0,
+            help="Adjust the number of rows in each dump chunk, so that "
+            "dumping a chunk takes about this many seconds. "
+            "0 means using a fixed chunk size",
+        )
+        parser.add_argument(
+            "--native-alter-below-rows",
+            type=int,
+            default=0,
+            help="Run a plain online ALTER TABLE instead of copying the table, "
+            "if the table has fewer rows than this. 0 means always copying",
+        )
+        parser.add_argument(
+            "--prefetch-outfile",
+            action="store_true",
+            help="Read the next outfile into page cache while the current one "
+            "is being loaded. Only useful when running on the MySQL host, "
+            "as a user who can read the outfiles written by mysqld",
+        )
+        parser.add_argument(
+            "--load-while-dump",
+            action="store_true",
+            help="Load each outfile chunk on a second connection as soon as "
+            "it has been dumped, instead of after the whole dump. Doesn't "
+            "apply to MyRocks tables, --use-dump-table or --use-sql-wsenv. "
+            "The load stage then has nothing left to do, so its progress "
+            "isn't logged and --prefetch-outfile has no effect",
+        )
         parser.add_argument(
             "--enable-outfile-compression",
             action="store_true",
@@ -54,7 +54,26 @@ MAX_REPLAY_CHANGES = 2146483647
 WSENV_CHUNK_BYTES = 64 * 1024 * 1024
 CHECKSUM_CHUNK_BYTES = 64 * 1024 * 1024
 GC_COLLECT_TIME_INTERVAL = 120  # 2 minutes
+SLAVE_STATUS_CACHE_TTL = 5  # seconds
+# How far adaptive dump chunk sizing may grow a chunk beyond its initial size
+DUMP_CHUNK_MAX_GROWTH = 4
+# How far adaptive replay batching may grow a batch beyond replay_batch_size
+REPLAY_BATCH_MAX_GROWTH = 4
+# Weight of the latest replay transaction time in its moving average
+REPLAY_BATCH_EWMA_WEIGHT = 0.3
+# Max number of idle side connections kept open for reuse
+SIDE_CONN_POOL_SIZE = 2
+# How many delta windows to checksum in a single query
+CHECKSUM_REPLAY_WINDOWS_PER_QUERY = 16
+# Max length of the args of a failed statement to put in the error log
+SQL_ARGS_LOG_MAX_CHARS = 2048
+# How far the row count in the persistent statistics of the new table may be
+# off from the number of rows loaded, for ANALYZE TABLE to be skipped
+STATS_ROWS_TOLERANCE = 0.1
 
 # Types to exclude from checksum. These are non-deterministic when doing logical
 # dump and load due to unpredictability in string serialization.
 CHECKSUM_EXCLUDE_COLUMN_TYPES = ["FLOAT", "DOUBLE", "JSON"]
+
+# Column types which carry a charset and collation
+TEXT_COLUMN_TYPES = {"CHAR", "VARCHAR", "TEXT", "MEDIUMTEXT", "LONGTEXT", "ENUM"}
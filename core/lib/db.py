@@ -24,6 +24,10 @@ from . import sql
 
 log = logging.getLogger(__name__)
 
+# Values of enum_mysql_set_option, for mysql_set_server_option()
+MYSQL_OPTION_MULTI_STATEMENTS_ON = 0
+MYSQL_OPTION_MULTI_STATEMENTS_OFF = 1
+
 
 def default_get_mysql_connection(
     user_name,
@@ -114,6 +118,17 @@ class MySQLSocketConnection:
             connect_timeout=self.connect_timeout,
             charset=self.charset,
         )
+        self._connection_id = None
+
+    @property
+    def connection_id(self) -> int:
+        """
+        Server side id of this connection, as shown in the processlist. It's
+        known by the client, so this doesn't need a round trip
+        """
+        if self._connection_id is None:
+            self._connection_id = self.conn.thread_id()
+        return self._connection_id
 
     def disconnect(self):
         """Close an existing open connection to a MySQL server."""
@@ -181,6 +196,21 @@ class MySQLSocketConnection:
         cursor.execute("%s %s" % (self.query_header, sql), args)
         return cursor.fetchall()
 
+    def query_stream(self, sql: str, args: tuple[Any, ...] | None = None):
+        """
+        Run the sql query, and yield the result set row by row as tuples,
+        using a server side cursor (SSCursor). Rows are not buffered on the
+        client side, so this is suitable for large result sets. The result
+        set must be fully consumed before running another query on this
+        connection
+        """
+        cursor: MySQLdb.cursors.SSCursor = self.conn.cursor(MySQLdb.cursors.SSCursor)
+        try:
+            cursor.execute("%s %s" % (self.query_header, sql), args)
+            yield from cursor
+        finally:
+            cursor.close()
+
     def execute(self, sql: str, args=None) -> int:
         """
         Execute the given sql against current open connection
@@ -203,6 +233,29 @@ class MySQLSocketConnection:
                 )
             return cursor.rowcount
 
+    def execute_multi(self, statements: list[tuple[str, tuple[Any, ...]]]) -> list[int]:
+        """
+        Execute the given list of (sql, args) in a single round trip as a
+        multi-statement query. Multi-statement support is only turned on for
+        the duration of this call.
+
+        Returns the number of affected rows of each statement.
+        """
+        sql = ";\n".join(stmt for stmt, _ in statements)
+        # Without any argument the SQL must not go through %-formatting, or a
+        # literal % in it would break the query
+        args = tuple(arg for _, stmt_args in statements for arg in stmt_args) or None
+        self.conn.set_server_option(MYSQL_OPTION_MULTI_STATEMENTS_ON)
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("%s %s" % (self.query_header, sql), args)
+            affected_rows = [cursor.rowcount]
+            while cursor.nextset():
+                affected_rows.append(cursor.rowcount)
+        finally:
+            self.conn.set_server_option(MYSQL_OPTION_MULTI_STATEMENTS_OFF)
+        return affected_rows
+
     def get_running_queries(self):
         """
         Get a list of running queries. A wrapper of a single query to make it
@@ -459,6 +459,16 @@ class OSCError(Exception):
             ),
             "retryable": True,
         },
+        "WRITES_WITHOUT_TRIGGERS": {
+            "code": 156,
+            "desc": (
+                "Table `{table}` has been written to during the copy, while "
+                "--skip-triggers is specified. Its checksum no longer matches "
+                "the one of the new table"
+            ),
+            "retryable": True,
+            "internal": True,
+        },
         # reserved for special internal errors
         "ASSERTION_ERROR": {
             "code": 249,
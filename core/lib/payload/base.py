@@ -61,6 +61,8 @@ class Payload:
         self.skip_named_lock = kwargs.get("skip_named_lock", False)
         self.mysql_vars: dict[str, str] = {}
         self.is_slave_stopped_by_me = False
+        # (timestamp, result) of the last SHOW SLAVE STATUS
+        self._slave_status_cache = None
         self.num_finished_dbs = 0
         self._current_db = None
         self.use_ast_parser = kwargs.get("use_ast_parser", True)
@@ -159,7 +161,7 @@ class Payload:
         log.debug(
             "Checking replication role type, expecting: {}".format(self.repl_status)
         )
-        r = self.query("SHOW SLAVE STATUS")
+        r = self.get_slave_status()
         if not r:
             repl_status_now = "master"
         log.debug("Replication mode for database is: {}".format(repl_status_now))
@@ -190,9 +192,7 @@ class Payload:
         """
         self._sql_now = sql
         self._sql_args_now = args
-        log.debug(
-            "Running the following query on MySQL: [{}] Args: {}".format(sql, args)
-        )
+        log.debug("Running the following query on MySQL: [%s] Args: %s", sql, args)
         return self._conn.query_array(sql, args)
 
     def query(
@@ -204,11 +204,19 @@ class Payload:
         """
         self._sql_now = sql
         self._sql_args_now = args
-        log.debug(
-            "Running the following query on MySQL: [{}] Args: {}".format(sql, args)
-        )
+        log.debug("Running the following query on MySQL: [%s] Args: %s", sql, args)
         return self._conn.query(sql, args)
 
+    def query_stream(self, sql: str, args: tuple[Any, ...] | None = None):
+        """
+        Execute sql again MySQL instance and yield the result row by row as
+        tuples (uses SSCursor underneath.)
+        """
+        self._sql_now = sql
+        self._sql_args_now = args
+        log.debug("Streaming the following query on MySQL: [%s] Args: %s", sql, args)
+        return self._conn.query_stream(sql, args)
+
     def execute_sql(self, sql, args=None) -> int:
         """
         Execute the given sql against MySQL without caring about the result
@@ -216,10 +224,34 @@ class Payload:
         """
         self._sql_now = sql
         self._sql_args_now = args
+        log.debug("Executing the following query on MySQL: [%s] Args: %s", sql, args)
+        return self._conn.execute(sql, args)
+
+    def execute_sql_multi(self, statements) -> list[int]:
+        """
+        Execute the given list of (sql, args) against MySQL in a single
+        round trip, and return the number of affected rows of each of them
+        """
+        self._sql_now = ";\n".join(stmt for stmt, _ in statements)
+        self._sql_args_now = [args for _, args in statements]
         log.debug(
-            "Executing the following query on MySQL: [{}] Args: {}".format(sql, args)
+            "Executing the following queries on MySQL: [%s] Args: %s",
+            self._sql_now,
+            self._sql_args_now,
         )
-        return self._conn.execute(sql, args)
+        return self._conn.execute_multi(statements)
+
+    def sql_args_for_log(self) -> str:
+        """
+        Args of the statement currently being executed, truncated so that a
+        failed bulk statement doesn't flood the log
+        """
+        args_str = repr(self._sql_args_now)
+        if len(args_str) > constant.SQL_ARGS_LOG_MAX_CHARS:
+            return "{}... ({} chars)".format(
+                args_str[: constant.SQL_ARGS_LOG_MAX_CHARS], len(args_str)
+            )
+        return args_str
 
     def fetch_mysql_vars(self):
         """
@@ -454,13 +486,37 @@ class Payload:
         """
         return util.rm(filename, sudo=self.sudo)
 
+    def get_slave_status(self):
+        """
+        Result of SHOW SLAVE STATUS. SHOW SLAVE STATUS is not free, so the
+        result is cached for a few seconds. This is only good enough for
+        checks that don't depend on the sql_thread state, which can change
+        at any time. The cache is invalidated whenever we stop or start the
+        sql_thread ourselves
+        """
+        now = time.monotonic()
+        if (
+            self._slave_status_cache is not None
+            and now - self._slave_status_cache[0] < constant.SLAVE_STATUS_CACHE_TTL
+        ):
+            return self._slave_status_cache[1]
+        return self.refresh_slave_status()
+
+    def refresh_slave_status(self):
+        """
+        Run SHOW SLAVE STATUS, and keep the result for get_slave_status
+        """
+        result = self.query(sql.show_slave_status)
+        self._slave_status_cache = (time.monotonic(), result)
+        return result
+
     def is_sql_thread_running(self):
         """
         Check current SQL thread status. We need to know that exact state
         before we trying to stop the sql_thread. If the sql_thread is not
         stopped by us, then we'll skip starting it afterwards
         """
-        result = self.query(sql.show_slave_status)
+        result = self.refresh_slave_status()
         if result:
             return result[0]["Slave_SQL_Running"] == "Yes"
         return False
@@ -472,6 +528,7 @@ class Payload:
         if self.is_sql_thread_running():
             log.warning("Stopping secondary sql thread.")
             self.execute_sql(sql.stop_slave_sql)
+            self._slave_status_cache = None
             self.is_slave_stopped_by_me = True
 
     def start_slave_sql(self):
@@ -481,6 +538,7 @@ class Payload:
         if self.is_slave_stopped_by_me:
             log.warning("Starting secondary sql thread stopped by OSC.")
             self.execute_sql(sql.start_slave_sql)
+            self._slave_status_cache = None
             self.is_slave_stopped_by_me = False
 
     def get_osc_lock(self):
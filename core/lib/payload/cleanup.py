@@ -23,6 +23,9 @@ from .base import Payload
 
 log = logging.getLogger(__name__)
 
+# Outfile chunks left behind by a previous OSC run
+OSC_OUTFILE_RE = re.compile(r"__osc_.*\.[0-9]+")
+
 
 class CleanupPayload(Payload):
     """
@@ -218,9 +221,13 @@ class CleanupPayload(Payload):
         self.tables_to_print.append(("SELECT * FROM `{}`".format(table), db))
 
     def remove_drop_table_entry(self, db, table_name):
-        for entry in self.to_drop:
-            if entry["type"] == "table" and entry["name"] == table_name:
-                self.to_drop.remove(entry)
+        # Rebuild the list rather than removing while iterating over it,
+        # which would skip the entry right after a removed one
+        self.to_drop = [
+            entry
+            for entry in self.to_drop
+            if not (entry["type"] == "table" and entry["name"] == table_name)
+        ]
 
     def add_drop_trigger_entry(self, db, trigger_name):
         self.to_drop.append({"type": "trigger", "db": db, "name": trigger_name})
@@ -318,7 +325,7 @@ class CleanupPayload(Payload):
         datadir = self.query(sql.select_as("@@datadir", "dir"))[0]["dir"]
         for root, _, files in os.walk(datadir):
             for fname in files:
-                if re.match(r"__osc_.*\.[0-9]+", fname):
+                if OSC_OUTFILE_RE.match(fname):
                     self.add_file_entry(os.path.join(root, fname))
 
     def kill_osc(self):
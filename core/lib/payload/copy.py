@@ -10,13 +10,17 @@ LICENSE file in the root directory of this source tree.
 """
 
 import gc
-import glob
 import logging
 import os
+import queue
 import re
 import time
-from copy import deepcopy
-from threading import Timer
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import groupby, islice
+from operator import itemgetter
+from threading import Thread, Timer
 from typing import collections, List, Optional, Set
 
 import MySQLdb
@@ -32,6 +36,24 @@ from .base import Payload
 from .cleanup import CleanupPayload
 
 log: logging.Logger = logging.getLogger(__name__)
+
+# Patterns for finding the queries kill_selects should kill in the
+# processlist. Only the table pattern depends on the tables involved
+KILL_KEYWORD_PATTERN = (
+    r"(\s|^)"  # whitespace or start
+    r"({})"  # keyword(s)
+    r"(\s|$)"  # whitespace or end
+)
+KILL_TABLE_PATTERN = (
+    r"(\s|`)"  # whitespace or backtick
+    r"({})"  # table(s)
+    r"(\s|`|$)"  # whitespace, backtick or end
+)
+KILL_ALTER_OR_SELECT_RE = re.compile(KILL_KEYWORD_PATTERN.format("select|alter"))
+KILL_INFORMATION_SCHEMA_RE = re.compile(
+    KILL_KEYWORD_PATTERN.format("information_schema")
+)
+
 BulkLoadParams = collections.namedtuple(
     "BulkLoadParams",
     [
@@ -74,6 +96,7 @@ class CopyPayload(Payload):
         self._old_table = None
         self._replayed_chg_ids = util.RangeChain()
         self.select_chunk_size = 0
+        self.max_select_chunk_size = 0
         self.use_batch_updates = False
         self.select_checksum_chunk_size = 0
         self.bypass_replay_timeout = False
@@ -86,10 +109,14 @@ class CopyPayload(Payload):
         self.last_checksumed_id = 0
         self.current_checksum_record = -1
         self.table_size = 0
+        self.table_rows = 0
         self.session_overrides = []
         self.disable_replication = kwargs.get("disable_replication", True)
         self._cleanup_payload = CleanupPayload(*args, **kwargs)
-        self.stats = {}
+        # Counters and timers accumulate with +=, so missing keys start at 0
+        self.stats = defaultdict(int)
+        self._replay_sqls = None
+        self._replay_insert_range_sql = None
         self.partitions = {}
         self.eta_chunks = 1
         self._last_kill_timer = None
@@ -128,6 +155,14 @@ class CopyPayload(Payload):
         self.replay_group_size = kwargs.get(
             "replay_group_size", constant.DEFAULT_REPLAY_GROUP_SIZE
         )
+        # Commit replayed changes based on how long the transaction has been
+        # open instead of replay_batch_size. 0 to disable
+        self.replay_commit_interval: float = kwargs.get("replay_commit_interval", 0)
+        # Adjust the number of changes replayed between commits, so that every
+        # replay transaction takes about this many seconds. 0 to disable
+        self.replay_batch_target_time: float = kwargs.get("replay_batch_target_time", 0)
+        self._replay_commit_size = None
+        self._replay_batch_time = None
         self.skip_pk_coverage_check = kwargs.get("skip_pk_coverage_check", False)
         self.pk_coverage_size_threshold = kwargs.get(
             "pk_coverage_size_threshold", constant.PK_COVERAGE_SIZE_THRESHOLD
@@ -151,6 +186,20 @@ class CopyPayload(Payload):
             "lock_max_wait_before_kill_seconds",
             constant.LOCK_MAX_WAIT_BEFORE_KILL_SECONDS,
         )
+        # Besides the SELECTs found in the processlist, also kill the sessions
+        # performance_schema says are holding a metadata lock on the tables,
+        # when we can't lock them in time. This includes idle transactions
+        # which have touched the tables
+        self.kill_metadata_lock_holders = kwargs.get(
+            "kill_metadata_lock_holders", False
+        )
+        # lock_wait_timeout in seconds for the LOCK TABLES before swapping
+        # tables. While it's waiting, every other query on the table queues
+        # up behind it, so it's better to give up early and try again. None
+        # leaves the session value untouched
+        self.cut_over_lock_wait_timeout = kwargs.get(
+            "cut_over_lock_wait_timeout", None
+        )
         self.session_timeout = kwargs.get(
             "mysql_session_timeout", constant.SESSION_TIMEOUT
         )
@@ -168,10 +217,42 @@ class CopyPayload(Payload):
             "skip_checksum_for_modified", False
         )
         self.skip_delta_checksum = kwargs.get("skip_delta_checksum", False)
+        # Whether to checksum the new table on a second connection while the
+        # old table is being checksummed
+        self.parallel_checksum = kwargs.get("parallel_checksum", False)
+        self.fail_fast_checksum = kwargs.get("fail_fast_checksum", False)
         # Whether to use the server-native CHECKSUM TABLE statement.
         self.use_checksum_statement: bool = kwargs.get("use_checksum_statement", False)
         self.skip_named_lock = kwargs.get("skip_named_lock", False)
         self.skip_affected_rows_check = kwargs.get("skip_affected_rows_check", False)
+        # Whether to group consecutive updates on different primary keys, and
+        # replay them with a single UPDATE ... JOIN statement
+        self.batch_updates = kwargs.get("batch_updates", False)
+        # Whether to send consecutive groups of the same type of changes to
+        # MySQL as a single multi-statement query, up to replay_batch_size
+        # changes per round trip
+        self.replay_multi_statements = kwargs.get("replay_multi_statements", False)
+        # Whether to replay deletes with the primary key values we've already
+        # fetched from the delta table, instead of joining it again
+        self.replay_deletes_by_pk = kwargs.get("replay_deletes_by_pk", False)
+        # Whether to skip replaying an update, when the same row is updated
+        # again later in the same run of consecutive updates
+        self.skip_superseded_updates = kwargs.get("skip_superseded_updates", False)
+        # Runs of inserts with at least this many contiguous change IDs are
+        # replayed by ID range, replay_batch_size changes per statement.
+        # 0 to disable
+        self.bulk_replay_threshold: int = kwargs.get("bulk_replay_threshold", 0)
+        # Whether to have the next outfile read into page cache while the
+        # current one is being loaded. Only useful when the outfiles are on
+        # the same host as this process
+        self.prefetch_outfile = kwargs.get("prefetch_outfile", False)
+        # Whether to load each outfile chunk on a second connection as soon
+        # as it has been dumped, instead of after the whole dump
+        self.load_while_dump = kwargs.get("load_while_dump", False)
+        # Whether the caller guarantees there will be no writes to the table
+        # during OSC. Triggers and catch up are skipped, and the swap is
+        # aborted if InnoDB has seen the table modified in the meantime
+        self.skip_triggers = kwargs.get("skip_triggers", False)
         # Debugging only
         self.skip_chunk_cleanup = False
         self.where = kwargs.get("where", None)
@@ -190,6 +271,12 @@ class CopyPayload(Payload):
         self.use_dump_table_stmt: bool = kwargs.get("use_dump_table", False)
         # If using DUMP TABLE, controls the number of worker threads.
         self.dump_threads: int = kwargs.get("dump_threads", constant.DUMP_THREADS)
+        # Adjust the number of rows in each dump chunk, so that every
+        # SELECT INTO OUTFILE takes about this many seconds. 0 to disable
+        self.dump_chunk_target_time: float = kwargs.get("dump_chunk_target_time", 0)
+        # Tables with fewer rows than this will be altered with a plain
+        # online ALTER TABLE instead of the copy process. 0 to disable
+        self.native_alter_below_rows: int = kwargs.get("native_alter_below_rows", 0)
 
         self.replay_max_changes = kwargs.get(
             "replay_max_changes", constant.MAX_REPLAY_CHANGES
@@ -227,8 +314,34 @@ class CopyPayload(Payload):
         )
         self.max_id_now = 0
         self.mismatch_pk_charset = {}
+        self._load_sql = None
+        self._delete_queue = None
+        self._chunk_deleter = None
+        self._delete_error = None
+        self._load_queue = None
+        self._chunk_loader = None
+        self._load_error = None
+        self._loaded_while_dump = False
+        self._load_finished_at: Optional[float] = None
+        # Idle side connections, used for killing selects while locking
+        # tables
+        self._conn_pool = queue.LifoQueue(maxsize=constant.SIDE_CONN_POOL_SIZE)
+        # Quoted column name lists, rendered once after pre_osc_check
+        self._quoted_old_cols = None
+        self._quoted_old_non_pk_cols = None
+        self._quoted_pk = None
+        self._table_name_pattern = None
         self.last_gc_collected = time.time()
         self.saved_table_timestamp: str = ""
+        # Whether the server can bump the table timestamp on truncate,
+        # probed once on first use
+        self._timestamp_on_truncate_available: Optional[bool] = None
+        # Table size estimates from information_schema for the pre-OSC checks
+        self._table_stats = None
+        # Collations are server wide, so they are fetched once and shared by
+        # every table this payload processes
+        self._collation_charsets: Optional[dict[str, str]] = None
+        self._default_collations: Optional[dict[str, str]] = None
         self.catchup_tool: OscCatchupTool = None
 
     @property
@@ -262,12 +375,12 @@ class CopyPayload(Payload):
         """
         list of column names which exists only in old schema
         """
-        column_list = []
-        new_tbl_columns = [col.name for col in self._new_table.column_list]
-        for col in self._old_table.column_list:
-            if col.name not in new_tbl_columns:
-                column_list.append(col.name)
-        return column_list
+        new_tbl_columns = {col.name for col in self._new_table.column_list}
+        return [
+            col.name
+            for col in self._old_table.column_list
+            if col.name not in new_tbl_columns
+        ]
 
     @property
     def old_column_list(self):
@@ -276,10 +389,12 @@ class CopyPayload(Payload):
         ones are being dropped in the new schema. Used to create triggers and
         delta table.
         """
+        # Evaluate the dropped columns once, rather than for every column
+        dropped_columns = set(self.dropped_column_name_list)
         return [
             col.name
             for col in self._old_table.column_list
-            if col.name not in self.dropped_column_name_list
+            if col.name not in dropped_columns
         ]
 
     @property
@@ -288,11 +403,12 @@ class CopyPayload(Payload):
         A list of column name for all non-pk columns in
         the old schema. It will be used in query construction for replay
         """
+        excluded_columns = set(self._pk_for_filter)
+        excluded_columns.update(self.dropped_column_name_list)
         return [
             col.name
             for col in self._old_table.column_list
-            if col.name not in self._pk_for_filter
-            and col.name not in self.dropped_column_name_list
+            if col.name not in excluded_columns
         ]
 
     def checksum_column_list(self, exclude_pk: bool):
@@ -304,37 +420,49 @@ class CopyPayload(Payload):
         column_list = []
         # Create a mapping from the new table's column names to their definitions
         # to detect changes to column definitions between old and new tables.
-        new_columns = {col.name: col for col in self._new_table.column_list}
-        old_pk_name_list = [c.name for c in self._old_table.primary_key.column_list]
+        # Only needed when modified columns are left out of the checksum
+        if self.skip_checksum_for_modified:
+            new_columns = {col.name: col for col in self._new_table.column_list}
+        old_pk_names = {c.name for c in self._old_table.primary_key.column_list}
+        dropped_columns = set(self.dropped_column_name_list)
         for col in self._old_table.column_list:
             # Filter out non-deterministically serialized column types.
             if col.column_type in constant.CHECKSUM_EXCLUDE_COLUMN_TYPES:
                 continue
-            if exclude_pk and col.name in old_pk_name_list:
+            if exclude_pk and col.name in old_pk_names:
                 continue
-            if col.name in self.dropped_column_name_list:
+            if col.name in dropped_columns:
+                continue
+            if self.skip_checksum_for_modified and col != new_columns[col.name]:
                 continue
-            if col != new_columns[col.name]:
-                if self.skip_checksum_for_modified:
-                    continue
             column_list.append(col.name)
         return column_list
 
+    def _prefixed_table_name(self, prefix, short_prefix, table_name=None):
+        """
+        Name of an object OSC creates for the table: the given prefix
+        followed by the table name. Long table names get the shorter prefix
+        instead, and the ones that still wouldn't fit get a generic name
+        """
+        old_name_len = len(self._old_table.name)
+        if table_name is None:
+            table_name = self._old_table.name
+        if old_name_len < constant.MAX_TABLE_LENGTH - 10:
+            return prefix + table_name
+        elif old_name_len < constant.MAX_TABLE_LENGTH - 2:
+            return short_prefix + table_name
+        else:
+            return prefix + constant.GENERIC_TABLE_NAME
+
     @property
     def delta_table_name(self):
         """
         Name of the physical intermediate table for data loading. Used almost
         everywhere
         """
-        if len(self._old_table.name) < constant.MAX_TABLE_LENGTH - 10:
-            return constant.DELTA_TABLE_PREFIX + self._old_table.name
-        elif (
-            len(self._old_table.name) >= constant.MAX_TABLE_LENGTH - 10
-            and len(self._old_table.name) < constant.MAX_TABLE_LENGTH - 2
-        ):
-            return constant.SHORT_DELTA_TABLE_PREFIX + self._old_table.name
-        else:
-            return constant.DELTA_TABLE_PREFIX + constant.GENERIC_TABLE_NAME
+        return self._prefixed_table_name(
+            constant.DELTA_TABLE_PREFIX, constant.SHORT_DELTA_TABLE_PREFIX
+        )
 
     @property
     def table_name(self):
@@ -349,35 +477,39 @@ class CopyPayload(Payload):
         """
         return self._new_table.name
 
+    @property
+    def table_name_pattern(self):
+        """
+        Compiled regex which matches the name of the original table as a
+        whole identifier, so that `foo` won't match against `foo_v2`
+        """
+        if (
+            self._table_name_pattern is None
+            or self._table_name_pattern[0] != self.table_name
+        ):
+            self._table_name_pattern = (
+                self.table_name,
+                re.compile(r"(?<![\w$]){}(?![\w$])".format(re.escape(self.table_name))),
+            )
+        return self._table_name_pattern[1]
+
     @property
     def new_table_name(self):
         """
         Name of the physical temporary table for loading data during OSC
         """
-        if len(self._old_table.name) < constant.MAX_TABLE_LENGTH - 10:
-            return constant.NEW_TABLE_PREFIX + self.table_name
-        elif (
-            len(self._old_table.name) >= constant.MAX_TABLE_LENGTH - 10
-            and len(self._old_table.name) < constant.MAX_TABLE_LENGTH - 2
-        ):
-            return constant.SHORT_NEW_TABLE_PREFIX + self.table_name
-        else:
-            return constant.NEW_TABLE_PREFIX + constant.GENERIC_TABLE_NAME
+        return self._prefixed_table_name(
+            constant.NEW_TABLE_PREFIX, constant.SHORT_NEW_TABLE_PREFIX, self.table_name
+        )
 
     @property
     def renamed_table_name(self):
         """
         Name of the old table after swap.
         """
-        if len(self._old_table.name) < constant.MAX_TABLE_LENGTH - 10:
-            return constant.RENAMED_TABLE_PREFIX + self._old_table.name
-        elif (
-            len(self._old_table.name) >= constant.MAX_TABLE_LENGTH - 10
-            and len(self._old_table.name) < constant.MAX_TABLE_LENGTH - 2
-        ):
-            return constant.SHORT_RENAMED_TABLE_PREFIX + self._old_table.name
-        else:
-            return constant.RENAMED_TABLE_PREFIX + constant.GENERIC_TABLE_NAME
+        return self._prefixed_table_name(
+            constant.RENAMED_TABLE_PREFIX, constant.SHORT_RENAMED_TABLE_PREFIX
+        )
 
     @property
     def insert_trigger_name(self):
@@ -385,15 +517,9 @@ class CopyPayload(Payload):
         Name of the "AFTER INSERT" trigger on the old table to capture changes
         during data dump/load
         """
-        if len(self._old_table.name) < constant.MAX_TABLE_LENGTH - 10:
-            return constant.INSERT_TRIGGER_PREFIX + self._old_table.name
-        elif (
-            len(self._old_table.name) >= constant.MAX_TABLE_LENGTH - 10
-            and len(self._old_table.name) < constant.MAX_TABLE_LENGTH - 2
-        ):
-            return constant.SHORT_INSERT_TRIGGER_PREFIX + self._old_table.name
-        else:
-            return constant.INSERT_TRIGGER_PREFIX + constant.GENERIC_TABLE_NAME
+        return self._prefixed_table_name(
+            constant.INSERT_TRIGGER_PREFIX, constant.SHORT_INSERT_TRIGGER_PREFIX
+        )
 
     @property
     def update_trigger_name(self):
@@ -401,15 +527,9 @@ class CopyPayload(Payload):
         Name of the "AFTER UPDATE" trigger on the old table to capture changes
         during data dump/load
         """
-        if len(self._old_table.name) < constant.MAX_TABLE_LENGTH - 10:
-            return constant.UPDATE_TRIGGER_PREFIX + self._old_table.name
-        elif (
-            len(self._old_table.name) >= constant.MAX_TABLE_LENGTH - 10
-            and len(self._old_table.name) < constant.MAX_TABLE_LENGTH - 2
-        ):
-            return constant.SHORT_UPDATE_TRIGGER_PREFIX + self._old_table.name
-        else:
-            return constant.UPDATE_TRIGGER_PREFIX + constant.GENERIC_TABLE_NAME
+        return self._prefixed_table_name(
+            constant.UPDATE_TRIGGER_PREFIX, constant.SHORT_UPDATE_TRIGGER_PREFIX
+        )
 
     @property
     def delete_trigger_name(self):
@@ -417,15 +537,9 @@ class CopyPayload(Payload):
         Name of the "AFTER DELETE" trigger on the old table to capture changes
         during data dump/load
         """
-        if len(self._old_table.name) < constant.MAX_TABLE_LENGTH - 10:
-            return constant.DELETE_TRIGGER_PREFIX + self._old_table.name
-        elif (
-            len(self._old_table.name) >= constant.MAX_TABLE_LENGTH - 10
-            and len(self._old_table.name) < constant.MAX_TABLE_LENGTH - 2
-        ):
-            return constant.SHORT_DELETE_TRIGGER_PREFIX + self._old_table.name
-        else:
-            return constant.DELETE_TRIGGER_PREFIX + constant.GENERIC_TABLE_NAME
+        return self._prefixed_table_name(
+            constant.DELETE_TRIGGER_PREFIX, constant.SHORT_DELETE_TRIGGER_PREFIX
+        )
 
     @property
     def outfile(self):
@@ -572,29 +686,36 @@ class CopyPayload(Payload):
             overrides.append(splitted_array)
         return overrides
 
-    def override_session_vars(self):
+    def override_session_vars(self, conn=None):
         """
         Override session variable if there's any
+
+        @param conn:  side connection to apply the overrides to, instead of
+            the main one
         """
         self.session_overrides = self.parse_session_overrides_str(
             self.session_overrides_str
         )
+        if not self.session_overrides:
+            return
         for var_name, var_value in self.session_overrides:
             log.info(
                 "Override session variable {} with value: {}".format(
                     var_name, var_value
                 )
             )
-            self.execute_sql(sql.set_session_variable(var_name), (var_value,))
+        # Apply all the overrides in a single round trip
+        execute = self.execute_sql if conn is None else conn.execute
+        execute(
+            sql.set_session_variables(
+                [var_name for var_name, _ in self.session_overrides]
+            ),
+            tuple(var_value for _, var_value in self.session_overrides),
+        )
 
     def is_var_enabled(self, var_name):
-        if var_name not in self.mysql_vars:
-            return False
-        if self.mysql_vars[var_name] == "OFF":
-            return False
-        if self.mysql_vars[var_name] == "0":
-            return False
-        return True
+        # Missing variables count as disabled
+        return self.mysql_vars.get(var_name, "OFF") not in ("OFF", "0")
 
     @property
     def is_trigger_rbr_safe(self):
@@ -626,21 +747,25 @@ class CopyPayload(Payload):
         if not self.is_trigger_rbr_safe:
             raise OSCError("NOT_RBR_SAFE")
 
-    def skip_cache_fill_for_myrocks(self):
+    def skip_cache_fill_for_myrocks(self, conn=None):
         """
         Skip block cache fill for dumps and scans to avoid cache pollution
         """
         if "rocksdb_skip_fill_cache" in self.mysql_vars:
-            self.execute_sql(sql.set_session_variable("rocksdb_skip_fill_cache"), (1,))
+            execute = self.execute_sql if conn is None else conn.execute
+            execute(sql.set_session_variable("rocksdb_skip_fill_cache"), (1,))
 
     def table_timestamp_change_on_truncation_is_available(self):
-        try:
-            result = self.query_variable(
-                "update_table_create_timestamp_on_truncate", "global"
-            )
-        except MySQLdb.MySQLError:
-            return False
-        return bool(result)
+        # Whether the server has this variable won't change during the run
+        if self._timestamp_on_truncate_available is None:
+            try:
+                result = self.query_variable(
+                    "update_table_create_timestamp_on_truncate", "global"
+                )
+            except MySQLdb.MySQLError:
+                result = None
+            self._timestamp_on_truncate_available = bool(result)
+        return self._timestamp_on_truncate_available
 
     def record_table_timestamp(self):
         if self.table_timestamp_change_on_truncation_is_available():
@@ -721,6 +846,22 @@ class CopyPayload(Payload):
         )
         return bool(table_exists)
 
+    def existing_tables(self, table_names):
+        """
+        Given a list of table names, return the lower cased names of the ones
+        that already exist under current working database, in a single query.
+        Names are lower cased because the server returns them that way when
+        lower_case_table_names is set
+        """
+        result = self.query(
+            sql.existing_tables,
+            (
+                tuple(table_names),
+                self._current_db,
+            ),
+        )
+        return {row["TABLE_NAME"].lower() for row in result}
+
     def fetch_table_schema(self, table_name):
         """
         Use lib.sqlparse.parse_create to turn a CREATE TABLE syntax into a
@@ -750,14 +891,9 @@ class CopyPayload(Payload):
                 table_name,
             ),
         )
-        # If a table doesn't have partition schema the "PARTITION_NAME"
-        # will be string "None" instead of something considered as false
-        # in python
-        return [
-            partition_entry["PARTITION_NAME"]
-            for partition_entry in partition_result
-            if partition_entry["PARTITION_NAME"] != "None"
-        ]
+        # Rows of tables without partition schema are filtered out by the
+        # query itself
+        return [entry["PARTITION_NAME"] for entry in partition_result]
 
     @wrap_hook
     def swap_table_block(self):
@@ -774,16 +910,29 @@ class CopyPayload(Payload):
         we'll act on, this should be the first step before we start to doing
         anything
         """
-        # Check the existence of original table
-        if not self.table_exists(self.table_name):
-            raise OSCError(
-                "TABLE_NOT_EXIST", {"db": self._current_db, "table": self.table_name}
-            )
-        self._old_table = self.fetch_table_schema(self.table_name)
-        self.partitions[self.table_name] = self.fetch_partitions(self.table_name)
+        # SHOW CREATE TABLE also tells us whether the original table exists,
+        # no need for a separate round trip to check it first
+        try:
+            self._old_table = self.fetch_table_schema(self.table_name)
+        except MySQLdb.MySQLError as e:
+            errcode, errmsg = e.args
+            # 1146: Table doesn't exist
+            if errcode == 1146:
+                raise OSCError(
+                    "TABLE_NOT_EXIST",
+                    {"db": self._current_db, "table": self.table_name},
+                )
+            raise
+        # SHOW CREATE TABLE already tells whether the table is partitioned,
+        # only go to information_schema for the partition names if it is
+        if self._old_table.partition is None:
+            self.partitions[self.table_name] = []
+        else:
+            self.partitions[self.table_name] = self.fetch_partitions(self.table_name)
         # The table after swap will have the same partition layout as current
-        # table
-        self.partitions[self.renamed_table_name] = self.partitions[self.table_name]
+        # table. Keep a list of its own, as cleanup pops partitions off the
+        # list of the table it drops
+        self.partitions[self.renamed_table_name] = list(self.partitions[self.table_name])
         # Preserve the auto_inc value from old table, so that we don't revert
         # back to a smaller value after OSC
         if self._old_table.auto_increment:
@@ -827,18 +976,19 @@ class CopyPayload(Payload):
                 )
             )
         )
-        # cleanup outfiles for table dump
-        file_prefixes = [
-            self.outfile,
-            "{}.old".format(self.outfile),
-            "{}.new".format(self.outfile),
-        ]
-        for file_prefix in file_prefixes:
-            log.debug("globbing {}".format(file_prefix))
-            for outfile in glob.glob(
-                "{}.[0-9]*".format(file_prefix),
-            ):
-                cleanup_payload.add_file_entry(outfile)
+        # cleanup outfiles for table dump, including the .old and .new ones
+        # for detailed checksum, in a single pass over the directory
+        outfile_re = re.compile(
+            r"{}(\.old|\.new)?\.[0-9]".format(re.escape(os.path.basename(self.outfile)))
+        )
+        log.debug("Scanning {} for outfiles".format(self.outfile_dir))
+        try:
+            with os.scandir(self.outfile_dir) as entries:
+                for entry in entries:
+                    if outfile_re.match(entry.name):
+                        cleanup_payload.add_file_entry(entry.path)
+        except OSError:
+            log.warning("Unable to list {}".format(self.outfile_dir))
         for trigger in (
             self.delete_trigger_name,
             self.update_trigger_name,
@@ -867,21 +1017,19 @@ class CopyPayload(Payload):
         if self.outfile_dir:
             return
         # if --tmpdir is not specified on command line for outfiles
-        # use @@secure_file_priv
-        for var_name in ("@@secure_file_priv", "@@datadir"):
-            result = self.query(sql.select_as(var_name, "folder"))
-            if not result:
-                raise Exception("Failed to get {} system variable".format(var_name))
-            if result[0]["folder"]:
-                if var_name == "@@secure_file_priv":
-                    self.outfile_dir = result[0]["folder"]
-                else:
-                    self.outfile_dir = os.path.join(
-                        result[0]["folder"], self._current_db_dir
-                    )
-                log.info("Will use {} storing dump outfile".format(self.outfile_dir))
-                return
-        raise Exception("Cannot determine output dir for dump")
+        # use @@secure_file_priv, or the database directory under @@datadir
+        result = self.query(sql.select_outfile_dirs)
+        if not result:
+            raise Exception(
+                "Failed to get @@secure_file_priv and @@datadir system variables"
+            )
+        if result[0]["secure_file_priv"]:
+            self.outfile_dir = result[0]["secure_file_priv"]
+        elif result[0]["datadir"]:
+            self.outfile_dir = os.path.join(result[0]["datadir"], self._current_db_dir)
+        else:
+            raise Exception("Cannot determine output dir for dump")
+        log.info("Will use {} storing dump outfile".format(self.outfile_dir))
 
     def table_check(self):
         tables_to_check = (
@@ -889,8 +1037,9 @@ class CopyPayload(Payload):
             self.delta_table_name,
             self.renamed_table_name,
         )
+        existing_tables = self.existing_tables(tables_to_check)
         for table_name in tables_to_check:
-            if self.table_exists(table_name):
+            if table_name.lower() in existing_tables:
                 raise OSCError(
                     "TABLE_ALREADY_EXIST", {"db": self._current_db, "table": table_name}
                 )
@@ -965,18 +1114,34 @@ class CopyPayload(Payload):
         @param table_name:  Name of the table to fetch size
         @type  table_name:  string
         """
-        result = self.query(sql.show_table_stats(self._current_db), (self.table_name,))
-        if result:
-            record = result[0]
-            table_size = record["Data_length"] + record["Index_length"]
+        record = self.get_table_stats()
+        if record:
+            table_size = record["DATA_LENGTH"] + record["INDEX_LENGTH"]
             log.info(
                 f"Table {self.table_name} size: {table_size} "
-                f"(data {record['Data_length']}, index {record['Index_length']}), "
-                f"rows: {record['Rows']}"
+                f"(data {record['DATA_LENGTH']}, index {record['INDEX_LENGTH']}), "
+                f"rows: {record['TABLE_ROWS']}"
             )
             return table_size
         return 0
 
+    def get_table_stats(self):
+        """
+        Row count, average row length, data and index size of the table from
+        information_schema. These are estimates which are only used by the
+        pre-OSC checks, so they are queried once and shared between them
+        """
+        if self._table_stats is None:
+            result = self.query(
+                sql.table_avg_row_len,
+                (
+                    self._current_db,
+                    self.table_name,
+                ),
+            )
+            self._table_stats = result[0] if result else {}
+        return self._table_stats
+
     def get_table_size_for_myrocks(self, table_name):
         """
         Given a table_name return its raw data size before compression.
@@ -1017,19 +1182,22 @@ class CopyPayload(Payload):
         """
         return 100
 
-    def get_expected_dump_size(self, table_name):
+    def get_expected_dump_size(self, table_name, on_disk_size=None):
         """
         Given a table_name return its expected outfile size in Bytes.
 
         @param table_name:  Name of the table to fetch size
         @type  table_name:  string
+        @param on_disk_size:  Size from get_table_size, if the caller has it
+        @type  on_disk_size:  int
         """
-        on_disk_size = self.get_table_size(table_name)
-
         # Figure out the dump data size and adjust for compression.
-        dump_size = on_disk_size
         if self.is_myrocks_table:
             dump_size = self.get_table_size_for_myrocks(table_name)
+        elif on_disk_size is not None:
+            dump_size = on_disk_size
+        else:
+            dump_size = self.get_table_size(table_name)
 
         if self.enable_outfile_compression:
             dump_size *= self.get_expected_compression_ratio_pct()
@@ -1045,7 +1213,9 @@ class CopyPayload(Payload):
         if self.skip_disk_space_check:
             return True
 
-        dump_size = int(self.get_expected_dump_size(self.table_name))
+        dump_size = int(
+            self.get_expected_dump_size(self.table_name, on_disk_size=self.table_size)
+        )
         disk_space = int(util.disk_partition_free(self.outfile_dir))
         # With allow_new_pk, we will create one giant outfile, and so at
         # some point will have the entire new table and the entire outfile
@@ -1110,15 +1280,16 @@ class CopyPayload(Payload):
         """
         idx_on_new_table = [self._new_table.primary_key] + self._new_table.indexes
         old_pk_len = len(self._pk_for_filter)
+        old_pk_set = set(self._pk_for_filter)
         for idx in idx_on_new_table:
             log.debug("Checking prefix for {}".format(idx.name))
             idx_prefix = idx.column_list[:old_pk_len]
             idx_name_set = {col.name for col in idx_prefix}
             # Identical set and covered set are considered as covering
-            if set(self._pk_for_filter) == idx_name_set:
+            if old_pk_set == idx_name_set:
                 log.info("PK prefix on new table can cover PK from old table")
                 return True
-            if idx.is_unique and set(self._pk_for_filter) > idx_name_set:
+            if idx.is_unique and old_pk_set > idx_name_set:
                 log.info("old PK can uniquely identify rows from new schema")
                 return True
 
@@ -1130,16 +1301,20 @@ class CopyPayload(Payload):
         order to calculate checksum for new table. We will use this index name
         as force index in checksum query
         See validate_post_alter_pk for more detail about pri-key coverage
+        This only looks at the parsed schema without querying MySQL, and is
+        called once per checksum pass, so the result is not cached. That also
+        keeps it correct if the schema object is modified in place
         """
         idx_on_new_table = [self._new_table.primary_key] + self._new_table.indexes
         old_pk_len = len(self._pk_for_filter)
         for idx in idx_on_new_table:
+            if not idx.is_unique:
+                continue
             # list[:idx] where idx > len(list) yields full list
             idx_prefix = idx.column_list[:old_pk_len]
             idx_name_list = [col.name for col in idx_prefix]
             if self._pk_for_filter == idx_name_list:
-                if idx.is_unique:
-                    return idx.name
+                return idx.name
         return None
 
     def init_range_variables(self):
@@ -1175,13 +1350,7 @@ class CopyPayload(Payload):
         Calculate the number of rows for each table dump query table based on
         average row length and the chunks size we've specified
         """
-        result = self.query(
-            sql.table_avg_row_len,
-            (
-                self._current_db,
-                self.table_name,
-            ),
-        )
+        stats = self.get_table_stats()
 
         if (
             self.is_myrocks_table
@@ -1191,8 +1360,9 @@ class CopyPayload(Payload):
             self.checksum_chunk_size = constant.CHUNK_BYTES
             log.info(f"reduce the chunk size: {constant.CHUNK_BYTES}.")
 
-        if result:
-            tbl_avg_length = result[0]["AVG_ROW_LENGTH"]
+        if stats:
+            self.table_rows = stats["TABLE_ROWS"]
+            tbl_avg_length = stats["AVG_ROW_LENGTH"]
             # avoid huge chunk row count
             if tbl_avg_length < 20:
                 tbl_avg_length = 20
@@ -1203,6 +1373,9 @@ class CopyPayload(Payload):
             # outfile to avoid zero division
             if not self.select_chunk_size:
                 self.select_chunk_size = 1
+            self.max_select_chunk_size = (
+                self.select_chunk_size * constant.DUMP_CHUNK_MAX_GROWTH
+            )
 
             self.select_checksum_chunk_size = self.checksum_chunk_size // tbl_avg_length
             if not self.select_checksum_chunk_size:
@@ -1212,10 +1385,10 @@ class CopyPayload(Payload):
                 "Table contains {} rows, data size: {}, index size: {} "
                 "(total size: {}), table_avg_row_len: {} bytes,"
                 "chunk_size: {} bytes, checksum chunk_size {} bytes.".format(
-                    result[0]["TABLE_ROWS"],
-                    result[0]["DATA_LENGTH"],
-                    result[0]["INDEX_LENGTH"],
-                    result[0]["DATA_LENGTH"] + result[0]["INDEX_LENGTH"],
+                    stats["TABLE_ROWS"],
+                    stats["DATA_LENGTH"],
+                    stats["INDEX_LENGTH"],
+                    stats["DATA_LENGTH"] + stats["INDEX_LENGTH"],
                     tbl_avg_length,
                     self.chunk_size,
                     self.checksum_chunk_size,
@@ -1224,9 +1397,7 @@ class CopyPayload(Payload):
             log.info(
                 "Outfile will contain {} rows each.".format(self.select_chunk_size)
             )
-            self.eta_chunks = max(
-                int(result[0]["TABLE_ROWS"] / self.select_chunk_size), 1
-            )
+            self.eta_chunks = max(int(stats["TABLE_ROWS"] / self.select_chunk_size), 1)
         else:
             raise OSCError("FAIL_TO_GUESS_CHUNK_SIZE")
 
@@ -1371,28 +1542,88 @@ class CopyPayload(Payload):
         self.check_disk_size()
         self.ts_bootstrap_check()
         self.drop_columns_check()
+        self.render_column_lists()
 
         # Check things that require myrocks
         if not self.is_myrocks_table:
             if self.use_dump_table_stmt:
                 raise OSCError("MYROCKS_REQUIRED", {"reason": "DUMP TABLE statement"})
 
+    def can_use_native_alter(self) -> bool:
+        """
+        Whether the table is small enough that MySQL's own online ALTER TABLE
+        will be much cheaper than the whole copy process.
+        Rebuilds, partition removal, duplicate elimination and filtered copies
+        can't be expressed with a plain ALTER TABLE, so they always go through
+        the copy process
+        """
+        if not self.native_alter_below_rows:
+            return False
+        if self.rebuild or self.rm_partition or self.eliminate_dups or self.where:
+            return False
+        return self.table_rows < self.native_alter_below_rows
+
+    def native_alter(self) -> bool:
+        """
+        Bring the existing table to the desired schema with a single
+        ALTER TABLE, using ALGORITHM=INPLACE and LOCK=NONE so that MySQL
+        refuses to run it if it would block writes.
+
+        @return:  Whether the schema change has been done
+        @rtype :  bool
+        """
+        alter_sql = SchemaDiff(self._old_table, self._new_table).to_sql()
+        if not alter_sql:
+            return False
+        log.info(
+            "Table has about {} rows, which is below {}. Running ALTER TABLE "
+            "directly".format(self.table_rows, self.native_alter_below_rows)
+        )
+        self.ddl_guard()
+        if not self.is_high_pri_ddl_supported:
+            self.wait_until_slow_query_finish()
+        try:
+            self.execute_sql(sql.online_alter(self._new_table.name, alter_sql))
+        except MySQLdb.OperationalError as e:
+            errnum, errmsg = e.args
+            # 1845/1846 stand for the ALTER can't be done in place or
+            # without a lock
+            if errnum not in (1845, 1846):
+                raise
+            log.warning(
+                "Falling back to the copy process, because ALTER TABLE "
+                "can't be done online: {}".format(errmsg)
+            )
+            return False
+        self.stats["native_alter"] = True
+        return True
+
+    def render_column_lists(self):
+        """
+        Column lists won't change once we've decided the PK for filter.
+        Quote them once here instead of every time we generate a SQL
+        """
+        self._quoted_old_cols = sql.list_to_col_str(self.old_column_list)
+        self._quoted_old_non_pk_cols = sql.list_to_col_str(self.old_non_pk_column_list)
+        self._quoted_pk = sql.list_to_col_str(self._pk_for_filter)
+
     def drop_columns_check(self):
         # We only allow dropping columns with the flag --allow-drop-column.
-        if self.dropped_column_name_list:
+        dropped_columns = self.dropped_column_name_list
+        if dropped_columns:
             if self.allow_drop_column:
-                for diff_column in self.dropped_column_name_list:
+                for diff_column in dropped_columns:
                     log.warning(
                         "Column `{}` is missing in the new schema, "
                         "but --allow-drop-column is specified. Will "
                         "drop this column.".format(diff_column)
                     )
             else:
-                missing_columns = ", ".join(self.dropped_column_name_list)
+                missing_columns = ", ".join(dropped_columns)
                 raise OSCError("MISSING_COLUMN", {"column": missing_columns})
             # We don't allow dropping columns from current primary key
             for col in self._pk_for_filter:
-                if col in self.dropped_column_name_list:
+                if col in dropped_columns:
                     raise OSCError("PRI_COL_DROPPED", {"pri_col": col})
 
     def add_drop_table_entry(self, table_name):
@@ -1400,20 +1631,24 @@ class CopyPayload(Payload):
         A wrapper for adding drop table request to CleanupPayload.
         The database name will always be the one we are currently working on.
         Also partition name list will be included as fetched from information
-        schema before DDL
+        schema before DDL. CleanupPayload consumes the list while dropping
+        partitions, so it gets a copy
         """
         self._cleanup_payload.add_drop_table_entry(
-            self._current_db, table_name, self.partitions.get(table_name, [])
+            self._current_db, table_name, list(self.partitions.get(table_name, []))
         )
 
     def get_collations(self):
         """
         Get a list of supported collations with their corresponding charsets
         """
+        if self._collation_charsets is not None:
+            return self._collation_charsets
         collations = self.query(sql.all_collation)
         collation_charsets = {}
         for r in collations:
             collation_charsets[r["COLLATION_NAME"]] = r["CHARACTER_SET_NAME"]
+        self._collation_charsets = collation_charsets
         return collation_charsets
 
     def get_default_collations(self):
@@ -1421,6 +1656,8 @@ class CopyPayload(Payload):
         Get a list of supported character set and their corresponding default
         collations
         """
+        if self._default_collations is not None:
+            return self._default_collations
         collations = self.query(sql.default_collation)
         charset_collations = {}
         for r in collations:
@@ -1434,6 +1671,7 @@ class CopyPayload(Payload):
             charset_collations["utf8mb4"] = utf8_override[0]["Value"]
         if "utf8" not in charset_collations and "utf8mb3" in charset_collations:
             charset_collations["utf8"] = charset_collations["utf8mb3"]
+        self._default_collations = charset_collations
         return charset_collations
 
     def populate_charset_collation(self, schema_obj):
@@ -1457,9 +1695,8 @@ class CopyPayload(Payload):
 
         # make column charset & collate explicit
         # follow https://dev.mysql.com/doc/refman/8.0/en/charset-column.html
-        text_types = {"CHAR", "VARCHAR", "TEXT", "MEDIUMTEXT", "LONGTEXT", "ENUM"}
         for column in schema_obj.column_list:
-            if column.column_type in text_types:
+            if column.column_type in constant.TEXT_COLUMN_TYPES:
                 # Check collate first to guarantee the column uses table collate
                 # if column charset is absent. If checking charset first and column
                 # collate is absent, it will use table charset and get default
@@ -1488,22 +1725,41 @@ class CopyPayload(Payload):
             if index.using == "HASH":
                 index.using = None
 
+    def copy_table_obj(self):
+        """
+        Definition of the physical temporary table using new schema
+        """
+        if self.rm_partition:
+            return self._new_table.clone_with(
+                name=self.new_table_name,
+                partition=self._old_table.partition,
+                partition_config=self._old_table.partition_config,
+            )
+        return self._new_table.clone_with(name=self.new_table_name)
+
     @wrap_hook
     def create_copy_table(self):
         """
         Create the physical temporary table using new schema
         """
-        tmp_sql_obj = deepcopy(self._new_table)
-        tmp_sql_obj.name = self.new_table_name
-        if self.rm_partition:
-            tmp_sql_obj.partition = self._old_table.partition
-            tmp_sql_obj.partition_config = self._old_table.partition_config
+        tmp_sql_obj = self.copy_table_obj()
         tmp_table_ddl = tmp_sql_obj.to_sql()
         log.info("Creating copy table using: {}".format(tmp_table_ddl))
         self.execute_sql(tmp_table_ddl)
-        self.partitions[self.new_table_name] = self.fetch_partitions(
-            self.new_table_name
-        )
+        self.copy_table_created(tmp_sql_obj)
+
+    def copy_table_created(self, tmp_sql_obj):
+        """
+        Register the copy table for cleanup, and verify its schema
+        """
+        # A table created without a partition clause can't have any partition,
+        # no need to ask information_schema about it
+        if tmp_sql_obj.partition is None:
+            self.partitions[self.new_table_name] = []
+        else:
+            self.partitions[self.new_table_name] = self.fetch_partitions(
+                self.new_table_name
+            )
         self.add_drop_table_entry(self.new_table_name)
 
         # Check whether the schema is consistent after execution to avoid
@@ -1533,13 +1789,12 @@ class CopyPayload(Payload):
                     {"diff": str(SchemaDiff(self._new_table, obj_after))},
                 )
 
-    @wrap_hook
-    def create_delta_table(self):
+    def delta_table_sqls(self):
         """
-        Create the table which will store changes made to existing table during
-        OSC. This can be considered as table level binlog
+        Statements creating the table which will store changes made to
+        existing table during OSC
         """
-        self.execute_sql(
+        statements = [
             sql.create_delta_table(
                 self.delta_table_name,
                 self.IDCOLNAME,
@@ -1547,65 +1802,92 @@ class CopyPayload(Payload):
                 self._old_table.engine,
                 self.old_column_list,
                 self._old_table.name,
+                old_cols_str=self._quoted_old_cols,
             )
-        )
-        self.add_drop_table_entry(self.delta_table_name)
+        ]
         # We will break table into chunks when calculate checksums using
         # old primary key. We need this index to skip verify the same row
         # for multiple time if it has been changed a lot
         if self._pk_for_filter_def and not self.is_full_table_dump:
-            self.execute_sql(
+            statements.append(
                 sql.create_idx_on_delta_table(
                     self.delta_table_name,
                     [col.name for col in self._pk_for_filter_def],
                 )
             )
+        return statements
 
-    def create_insert_trigger(self):
-        self.execute_sql(
-            sql.create_insert_trigger(
-                self.insert_trigger_name,
-                self.table_name,
-                self.delta_table_name,
-                self.DMLCOLNAME,
-                self.old_column_list,
-                self.DML_TYPE_INSERT,
-            )
+    @wrap_hook
+    def create_delta_table(self):
+        """
+        Create the table which will store changes made to existing table during
+        OSC. This can be considered as table level binlog
+        """
+        create_table_sql, *index_sqls = self.delta_table_sqls()
+        self.execute_sql(create_table_sql)
+        self.add_drop_table_entry(self.delta_table_name)
+        for stmt in index_sqls:
+            self.execute_sql(stmt)
+
+    @wrap_hook
+    def create_tables(self):
+        """
+        Create the delta table and the copy table
+        """
+        self.create_delta_table()
+        self.create_copy_table()
+
+    def insert_trigger_sql(self):
+        return sql.create_insert_trigger(
+            self.insert_trigger_name,
+            self.table_name,
+            self.delta_table_name,
+            self.DMLCOLNAME,
+            self.old_column_list,
+            self.DML_TYPE_INSERT,
+            old_cols_str=self._quoted_old_cols,
+        )
+
+    def delete_trigger_sql(self):
+        return sql.create_delete_trigger(
+            self.delete_trigger_name,
+            self.table_name,
+            self.delta_table_name,
+            self.DMLCOLNAME,
+            self.old_column_list,
+            self.DML_TYPE_DELETE,
+            old_cols_str=self._quoted_old_cols,
+        )
+
+    def update_trigger_sql(self):
+        return sql.create_update_trigger(
+            self.update_trigger_name,
+            self.table_name,
+            self.delta_table_name,
+            self.DMLCOLNAME,
+            self.old_column_list,
+            self.DML_TYPE_UPDATE,
+            self.DML_TYPE_DELETE,
+            self.DML_TYPE_INSERT,
+            self._pk_for_filter,
+            old_cols_str=self._quoted_old_cols,
         )
+
+    def create_insert_trigger(self):
+        self.execute_sql(self.insert_trigger_sql())
         self._cleanup_payload.add_drop_trigger_entry(
             self._current_db, self.insert_trigger_name
         )
 
     @wrap_hook
     def create_delete_trigger(self):
-        self.execute_sql(
-            sql.create_delete_trigger(
-                self.delete_trigger_name,
-                self.table_name,
-                self.delta_table_name,
-                self.DMLCOLNAME,
-                self.old_column_list,
-                self.DML_TYPE_DELETE,
-            )
-        )
+        self.execute_sql(self.delete_trigger_sql())
         self._cleanup_payload.add_drop_trigger_entry(
             self._current_db, self.delete_trigger_name
         )
 
     def create_update_trigger(self):
-        self.execute_sql(
-            sql.create_update_trigger(
-                self.update_trigger_name,
-                self.table_name,
-                self.delta_table_name,
-                self.DMLCOLNAME,
-                self.old_column_list,
-                self.DML_TYPE_UPDATE,
-                self.DML_TYPE_DELETE,
-                self.DML_TYPE_INSERT,
-                self._pk_for_filter,
-            )
-        )
+        self.execute_sql(self.update_trigger_sql())
         self._cleanup_payload.add_drop_trigger_entry(
             self._current_db, self.update_trigger_name
         )
@@ -1620,6 +1902,7 @@ class CopyPayload(Payload):
         if self.skip_long_trx_check:
             return False
         processes = self.query(sql.show_processlist)
+        table_name_pattern = self.table_name_pattern
         for proc in processes:
             if not proc["Info"]:
                 sql_statement = ""
@@ -1634,7 +1917,7 @@ class CopyPayload(Payload):
             if (
                 (proc.get("Time") or 0) > self.long_trx_time
                 and proc.get("db", "") == self._current_db
-                and self.table_name in "--" + sql_statement
+                and table_name_pattern.search(sql_statement)
                 and not proc.get("Command", "") == "Sleep"
             ):
                 return proc
@@ -1681,21 +1964,9 @@ class CopyPayload(Payload):
         #    without the performance schema
         # 2. Actually parse the SQL of the running queries, but this can be
         #    quite expensive
-        keyword_pattern = (
-            r"(\s|^)"  # whitespace or start
-            r"({})"  # keyword(s)
-            r"(\s|$)"  # whitespace or end
-        )
-        table_pattern = (
-            r"(\s|`)"  # whitespace or backtick
-            r"({})"  # table(s)
-            r"(\s|`|$)"  # whitespace, backtick or end
+        any_tables_pattern = re.compile(
+            KILL_TABLE_PATTERN.format("|".join(map(re.escape, table_names)))
         )
-        alter_or_select_pattern = re.compile(keyword_pattern.format("select|alter"))
-        information_schema_pattern = re.compile(
-            keyword_pattern.format("information_schema")
-        )
-        any_tables_pattern = re.compile(table_pattern.format("|".join(table_names)))
 
         processlist = conn.get_running_queries()
         for proc in processlist:
@@ -1705,24 +1976,51 @@ class CopyPayload(Payload):
             if (
                 proc["db"] == self._current_db
                 and sql_statement
-                and not information_schema_pattern.search(sql_statement)
+                and not KILL_INFORMATION_SCHEMA_RE.search(sql_statement)
                 and any_tables_pattern.search(sql_statement)
-                and alter_or_select_pattern.search(sql_statement)
+                and KILL_ALTER_OR_SELECT_RE.search(sql_statement)
             ):
-                try:
-                    conn.kill_query_by_id(int(proc["Id"]))
-                except MySQLdb.MySQLError as e:
-                    errcode, errmsg = e.args
-                    # 1094: Unknown thread id
-                    # This means the query we were trying to kill has finished
-                    # before we run kill %d
-                    if errcode == 1094:
-                        log.info(
-                            "Trying to kill query id: {}, but it has "
-                            "already finished".format(proc["Id"])
-                        )
-                    else:
-                        raise
+                self._kill_by_id(conn, int(proc["Id"]))
+
+    def kill_mdl_holders(self, table_names, conn):
+        """
+        Kill the sessions holding a metadata lock on any of the specified
+        tables in the working database, except our own. Unlike kill_selects,
+        this also finds transactions which are idle after having touched the
+        tables
+        """
+        holders = conn.query(
+            sql.get_metadata_lock_holders(),
+            (self._current_db, tuple(table_names), self.conn.connection_id),
+        )
+        for holder in holders:
+            log.info("Killing id: {} for holding a metadata lock".format(holder["id"]))
+            self._kill_by_id(conn, int(holder["id"]))
+
+    def kill_lock_blockers(self, table_names, conn):
+        """
+        Called when we could not lock the specified tables in time, to get
+        rid of whatever is in the way
+        """
+        self.kill_selects(table_names, conn)
+        if self.kill_metadata_lock_holders:
+            self.kill_mdl_holders(table_names, conn)
+
+    def _kill_by_id(self, conn, proc_id):
+        try:
+            conn.kill_query_by_id(proc_id)
+        except MySQLdb.MySQLError as e:
+            errcode, errmsg = e.args
+            # 1094: Unknown thread id
+            # This means the query we were trying to kill has finished
+            # before we run kill %d
+            if errcode == 1094:
+                log.info(
+                    "Trying to kill query id: {}, but it has "
+                    "already finished".format(proc_id)
+                )
+            else:
+                raise
 
     def start_transaction(self):
         """
@@ -1768,54 +2066,126 @@ class CopyPayload(Payload):
         )
         raise OSCError("DDL_GUARD_ATTEMPTS")
 
+    @contextmanager
+    def _borrow_conn(self):
+        """
+        Borrow an idle side connection from the pool, or open a new one if
+        there's none. The connection goes back to the pool afterwards, unless
+        an exception was raised while using it, in which case it's closed as
+        its state is unknown
+        """
+        try:
+            conn = self._conn_pool.get_nowait()
+        except queue.Empty:
+            conn = None
+        if conn is not None:
+            try:
+                conn.ping()
+            except MySQLdb.MySQLError:
+                log.warning("Discarding a pooled connection which is gone")
+                conn = None
+        if conn is None:
+            conn = self.get_conn(self._current_db)
+        try:
+            yield conn
+        except BaseException:
+            conn.close()
+            raise
+        try:
+            self._conn_pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close_conn_pool(self):
+        """
+        Close all the idle side connections in the pool
+        """
+        while True:
+            try:
+                conn = self._conn_pool.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+
     @wrap_hook
     def lock_tables(self, tables):
         for _ in range(self.lock_max_attempts):
             # We use a threading.Timer with a second connection in order to
             # kill any selects on top of the tables being altered if we could
             # not lock the tables in time
-            another_conn = self.get_conn(self._current_db)
-            kill_timer = Timer(
-                self.lock_max_wait_before_kill_seconds,
-                self.kill_selects,
-                args=(tables, another_conn),
-            )
-            # keeping a reference to kill timer helps on tests
-            self._last_kill_timer = kill_timer
-            kill_timer.start()
-
-            try:
-                self.execute_sql(sql.lock_tables(tables))
-                # It is best to cancel the timer as soon as possible
-                kill_timer.cancel()
-                log.info(
-                    "Successfully lock table(s) for write: {}".format(", ".join(tables))
+            with self._borrow_conn() as another_conn:
+                kill_timer = Timer(
+                    self.lock_max_wait_before_kill_seconds,
+                    self.kill_lock_blockers,
+                    args=(tables, another_conn),
                 )
-                break
-            except MySQLdb.MySQLError as e:
-                errcode, errmsg = e.args
-                # 1205 is timeout and 1213 is deadlock
-                if errcode in (1205, 1213):
-                    log.warning("Retry locking because of error: {}".format(e))
-                else:
-                    raise
-            finally:
-                # guarantee that we dont leave a stray kill timer running
-                # or any open resources
-                kill_timer.cancel()
-                kill_timer.join()
-                another_conn.close()
-
-        else:
-            # Cannot lock write after max lock attempts
-            raise OSCError("FAILED_TO_LOCK_TABLE", {"tables": ", ".join(tables)})
+                # keeping a reference to kill timer helps on tests
+                self._last_kill_timer = kill_timer
+                kill_timer.start()
 
-    def unlock_tables(self):
-        self.execute_sql(sql.unlock_tables)
+                try:
+                    self.execute_sql(sql.lock_tables(tables))
+                    # It is best to cancel the timer as soon as possible
+                    kill_timer.cancel()
+                    log.info(
+                        "Successfully lock table(s) for write: {}".format(
+                            ", ".join(tables)
+                        )
+                    )
+                    break
+                except MySQLdb.MySQLError as e:
+                    errcode, errmsg = e.args
+                    # 1205 is timeout and 1213 is deadlock
+                    if errcode in (1205, 1213):
+                        log.warning("Retry locking because of error: {}".format(e))
+                    else:
+                        raise
+                finally:
+                    # guarantee that we dont leave a stray kill timer running
+                    kill_timer.cancel()
+                    kill_timer.join()
+
+        else:
+            # Cannot lock write after max lock attempts
+            raise OSCError("FAILED_TO_LOCK_TABLE", {"tables": ", ".join(tables)})
+
+    def unlock_tables(self):
+        self.execute_sql(sql.unlock_tables)
         log.info("Table(s) unlocked")
 
+    def check_no_writes(self):
+        """
+        Without triggers, nothing captures the writes to the table after the
+        snapshot for the dump has been taken. Compare both tables while they
+        are locked for the swap, so that such a write aborts the swap instead
+        of being lost
+        """
+        checksums = self.query(
+            sql.checksum_full_table_pair(
+                self.table_name,
+                self.new_table_name,
+                self.checksum_column_list(exclude_pk=False),
+            )
+        )
+        old_checksum, new_checksum = (
+            {col: value for col, value in row.items() if col != "_osc_table"}
+            for row in checksums
+        )
+        if old_checksum != new_checksum:
+            log.error(
+                "Checksum mismatch under the table lock: OLD={}, NEW={}".format(
+                    old_checksum, new_checksum
+                )
+            )
+            raise OSCError("WRITES_WITHOUT_TRIGGERS", {"table": self.table_name})
+
     @wrap_hook
     def create_triggers(self):
+        if self.skip_triggers:
+            # Any write missed by the dump will be caught by check_no_writes
+            # at the swap
+            log.info("Skip creating triggers, because --skip-triggers is specified")
+            return
         self.stop_slave_sql()
         self.ddl_guard()
         log.debug("Locking table: {} before creating trigger".format(self.table_name))
@@ -1893,34 +2263,34 @@ class CopyPayload(Payload):
             self.query(snapshot_with_gtid_set_query)
         )
         log.info("Start snapshot with GTID set: {}".format(self.current_gtid_set))
+        # Changes committed after this point are invisible to the dump, even
+        # for rows the dump hasn't reached yet. So unlike a copier reading
+        # the latest data, we can't skip delta rows above the dump position,
+        # every change after the snapshot has to be replayed
         current_max = self.get_max_delta_id()
         log.info(
             "Changes with id <= {} committed before dump snapshot, "
             "and should be ignored.".format(current_max)
         )
         # Only replay changes in the range (last_replayed_id, max_id_now]
-        new_changes = self.query(
-            sql.get_replay_row_ids(
-                self.IDCOLNAME,
-                self.DMLCOLNAME,
-                self.delta_table_name,
-                self.new_pk_list,
-                None,
-                self.mysql_version.is_mysql8,
-            ),
+        # We only need the ids here, stream them into the range chain instead
+        # of holding the whole result set in memory
+        new_change_ids = self.query_stream(
+            sql.get_replay_ids(self.IDCOLNAME, self.delta_table_name),
             (
                 self.last_replayed_id,
                 current_max,
             ),
         )
-        self._replayed_chg_ids.extend([r[self.IDCOLNAME] for r in new_changes])
+        self._replayed_chg_ids.extend(row[0] for row in new_change_ids)
         self.last_replayed_id = current_max
 
     def affected_rows(self):
         return self._conn.conn.affected_rows()
 
-    def refresh_range_start(self):
-        self.execute_sql(sql.select_into(self.range_end_vars, self.range_start_vars))
+    def refresh_range_start(self, conn=None):
+        execute = self.execute_sql if conn is None else conn.execute
+        execute(sql.select_into(self.range_end_vars, self.range_start_vars))
 
     def select_full_table_into_outfile(self):
         stage_start_time = time.time()
@@ -1979,8 +2349,12 @@ class CopyPayload(Payload):
                 self.where,
                 self._idx_name_for_filter,
                 enable_outfile_compression=self.enable_outfile_compression,
+                pk_cols_str=self._quoted_pk,
+                non_pk_cols_str=self._quoted_old_non_pk_cols,
             )
+            time_start = time.monotonic()
             affected_rows = self.execute_sql(sql_string, (outfile,))
+            time_spent = time.monotonic() - time_start
         except MySQLdb.OperationalError as e:
             errnum, errmsg = e.args
             # 1086: File exists
@@ -1993,18 +2367,42 @@ class CopyPayload(Payload):
         outfile = self._outfile_name(chunk_id=self.outfile_suffix_end)
 
         log.debug("{} affected".format(affected_rows))
-        self.stats["outfile_lines"] = affected_rows + self.stats.setdefault(
-            "outfile_lines", 0
-        )
-        self.stats["outfile_cnt"] = 1 + self.stats.setdefault("outfile_cnt", 0)
-        self.stats["outfile_size"] = (
-            os.path.getsize(outfile) + self.stats.setdefault("outfile_size", 0)
-            if not self.use_sql_wsenv
-            else 0
-        )
+        self.stats["outfile_lines"] += affected_rows
+        self.stats["outfile_cnt"] += 1
+        if self.use_sql_wsenv:
+            self.stats["outfile_size"] = 0
+        else:
+            self.stats["outfile_size"] += os.path.getsize(outfile)
         self._cleanup_payload.add_file_entry(outfile)
+        if self.dump_chunk_target_time and affected_rows == self.select_chunk_size:
+            self.adjust_select_chunk_size(time_spent)
         return affected_rows
 
+    def adjust_select_chunk_size(self, time_spent):
+        """
+        Scale select_chunk_size towards the size that can be dumped within
+        dump_chunk_target_time. Narrow tables get bigger chunks so that
+        we don't waste round trips, while wide tables get smaller ones so
+        that a single chunk doesn't run for too long.
+        Each adjustment is limited to halving or doubling the current size
+
+        @param time_spent:  seconds spent on dumping the last chunk
+        @type  time_spent:  float
+        """
+        factor = self.dump_chunk_target_time / max(time_spent, 0.001)
+        factor = min(max(factor, 0.5), 2.0)
+        new_chunk_size = max(1, int(self.select_chunk_size * factor))
+        if self.max_select_chunk_size:
+            new_chunk_size = min(self.max_select_chunk_size, new_chunk_size)
+        if new_chunk_size != self.select_chunk_size:
+            log.debug(
+                "Chunk took {:.3f}s, adjusting chunk size from {} to {} rows".format(
+                    time_spent, self.select_chunk_size, new_chunk_size
+                )
+            )
+            self.select_chunk_size = new_chunk_size
+            self.make_chunk_size_odd()
+
     @wrap_hook
     def log_dump_progress(self, outfile_suffix):
         progress = "Dump progress: {}/{}(ETA) chunks".format(
@@ -2076,6 +2474,22 @@ class CopyPayload(Payload):
         if self.is_full_table_dump:
             log.info("Dumping full table in one go.")
             return self.select_full_table_into_outfile()
+        if self.can_load_while_dump():
+            self.start_chunk_loader()
+        try:
+            self.dump_chunks()
+        finally:
+            self.stop_chunk_loader()
+        self.commit()
+        if self._load_error is not None:
+            raise self._load_error
+        self._loaded_while_dump = self.can_load_while_dump()
+
+    def dump_chunks(self):
+        """
+        Dump the table chunk by chunk, handing every dumped chunk over to the
+        loader if it's running
+        """
         outfile_suffix = 1
         self.outfile_suffix_start = 1
         # To let the loop run at least once
@@ -2085,6 +2499,10 @@ class CopyPayload(Payload):
         while affected_rows:
             self.outfile_suffix_end = outfile_suffix
             affected_rows = self.select_chunk_into_outfile(use_where)
+            if self._load_queue is not None:
+                if self._load_error is not None:
+                    raise self._load_error
+                self._load_queue.put(outfile_suffix)
             # Refresh where condition range for next select
             if affected_rows:
                 self.refresh_range_start()
@@ -2097,7 +2515,83 @@ class CopyPayload(Payload):
             if progress_chunk > printed_chunk and self.eta_chunks > 10:
                 self.log_dump_progress(outfile_suffix)
                 printed_chunk = progress_chunk
-        self.commit()
+
+    def can_load_while_dump(self):
+        """
+        Loading on a second connection while dumping is only done for chunked
+        SELECT INTO OUTFILE dumps. MyRocks bulk load settings and wsenv are
+        tied to the main connection
+        """
+        return (
+            self.load_while_dump
+            and not self.use_dump_table_stmt
+            and not self.is_full_table_dump
+            and not self.is_myrocks_table
+            and not self.use_sql_wsenv
+        )
+
+    def get_load_conn(self):
+        """
+        A new connection with the same session settings as the main one, that
+        matter to loading data into the new table
+        """
+        conn = self.get_conn(self._current_db)
+        conn.set_no_binlog()
+        session_vars = [("sql_mode", "STRICT_ALL_TABLES,NO_AUTO_VALUE_ON_ZERO")]
+        session_vars.extend(self.session_overrides)
+        conn.execute(
+            sql.set_session_variables([var_name for var_name, _ in session_vars]),
+            tuple(var_value for _, var_value in session_vars),
+        )
+        return conn
+
+    def start_chunk_loader(self):
+        """
+        Start a background thread which loads the outfile chunks on its own
+        connection, while the main connection keeps dumping the next ones
+        """
+        log.info("Loading outfile chunks while dumping")
+        column_list = self.load_column_list()
+        # Render the statement before the loader thread needs it
+        self.load_data_sql(column_list)
+        self._load_queue = queue.Queue()
+        self._load_error = None
+        self._chunk_loader = Thread(
+            target=self.load_dumped_chunks,
+            args=(self.get_load_conn(), column_list),
+            daemon=True,
+        )
+        self._chunk_loader.start()
+
+    def load_dumped_chunks(self, conn, column_list):
+        try:
+            while True:
+                chunk_id = self._load_queue.get()
+                if chunk_id is None:
+                    return
+                # Leave the rest of the files to cleanup if we failed once
+                if self._load_error is not None:
+                    continue
+                try:
+                    self.load_chunk(column_list, chunk_id, conn=conn)
+                except Exception as e:
+                    self._load_error = e
+        finally:
+            conn.close()
+
+    def stop_chunk_loader(self):
+        """
+        Wait for all the dumped chunks to be loaded
+        """
+        if self._load_queue is None:
+            return
+        wait_start = time.time()
+        self._load_queue.put(None)
+        self._chunk_loader.join()
+        self._load_queue = None
+        self._chunk_loader = None
+        # Only the time spent after the dump is not overlapped with it
+        self.stats["time_in_load"] = time.time() - wait_start
 
     @stop_if_table_timestamp_changed
     @wrap_hook
@@ -2106,33 +2600,97 @@ class CopyPayload(Payload):
         Drop non-unique indexes from the new table to speed up the load
         process
         """
+        if not self.droppable_indexes:
+            return
         for idx in self.droppable_indexes:
             log.info("Dropping index '{}' on intermediate table".format(idx.name))
-            self.ddl_guard()
-            self.execute_sql(sql.drop_index(idx.name, self.new_table_name))
+        # Drop all of them in a single ALTER, so the table is only altered once
+        self.ddl_guard()
+        self.execute_sql(
+            sql.drop_indexes(
+                self.new_table_name, [idx.name for idx in self.droppable_indexes]
+            )
+        )
+
+    def load_data_sql(self, column_list):
+        """
+        LOAD DATA statement for loading an outfile chunk into the new table.
+        Only the file name differs between chunks, so the statement is
+        rendered once and reused for all of them
+        """
+        if self._load_sql is None:
+            self._load_sql = sql.load_data_infile(
+                self.new_table_name,
+                column_list,
+                ignore=self.eliminate_dups,
+                enable_outfile_compression=self.enable_outfile_compression,
+            )
+            log.debug(self._load_sql)
+        return self._load_sql
 
     @wrap_hook
-    def load_chunk(self, column_list, chunk_id):
-        sql_string = sql.load_data_infile(
-            self.new_table_name,
-            column_list,
-            ignore=self.eliminate_dups,
-            enable_outfile_compression=self.enable_outfile_compression,
-        )
-        log.debug(sql_string)
+    def load_chunk(self, column_list, chunk_id, conn=None):
+        """
+        Load an outfile chunk into the new table, on the given side connection
+        if there's one, or on the main one otherwise
+        """
+        sql_string = self.load_data_sql(column_list)
         filepath = self._outfile_name(chunk_id)
-        self.load_chunk_file(filepath, sql_string, chunk_id)
+        self.load_chunk_file(filepath, sql_string, chunk_id, conn=conn)
         # Delete the outfile once we have the data in new table to free
         # up space as soon as possible
-        if not (self.skip_chunk_cleanup or self.use_sql_wsenv) and self.rm_file(
-            filepath
-        ):
+        if not (self.skip_chunk_cleanup or self.use_sql_wsenv):
+            if self._delete_queue is not None:
+                self._delete_queue.put(filepath)
+            else:
+                self.rm_loaded_chunk(filepath)
+
+    def rm_loaded_chunk(self, filepath):
+        if self.rm_file(filepath):
             util.sync_dir(self.outfile_dir)
             self._cleanup_payload.remove_file_entry(filepath)
 
+    def start_chunk_deleter(self):
+        """
+        Start a background thread which removes the outfile chunks that have
+        been loaded, so that the load loop doesn't have to wait for rm and
+        the fsync on the outfile directory
+        """
+        self._delete_queue = queue.Queue()
+        self._delete_error = None
+        self._chunk_deleter = Thread(target=self.delete_loaded_chunks, daemon=True)
+        self._chunk_deleter.start()
+
+    def delete_loaded_chunks(self):
+        while True:
+            filepath = self._delete_queue.get()
+            if filepath is None:
+                return
+            # Leave the rest of the files to cleanup if we failed once
+            if self._delete_error is not None:
+                continue
+            try:
+                self.rm_loaded_chunk(filepath)
+            except Exception as e:
+                self._delete_error = e
+
+    def stop_chunk_deleter(self):
+        """
+        Wait for all the queued outfile chunks to be removed
+        """
+        if self._delete_queue is None:
+            return
+        self._delete_queue.put(None)
+        self._chunk_deleter.join()
+        self._delete_queue = None
+        self._chunk_deleter = None
+
     # chunk_id can be used for tracking by hooks etc.
-    def load_chunk_file(self, filepath, sql_string: str, chunk_id: int) -> None:
-        affected_rows = self.execute_sql(sql_string, (filepath,))
+    def load_chunk_file(
+        self, filepath, sql_string: str, chunk_id: int, conn=None
+    ) -> None:
+        execute = self.execute_sql if conn is None else conn.execute
+        affected_rows = execute(sql_string, (filepath,))
         log.debug(
             f"Loaded {affected_rows} rows from file {filepath} (chunk {chunk_id})"
         )
@@ -2287,32 +2845,39 @@ class CopyPayload(Payload):
         self.stats["load_progress"] = progress
         log.info(progress)
 
+    def load_column_list(self):
+        """
+        Generate the column name list string for load data infile
+        The column sequence is not exact the same as the original table.
+        It's pk_col_names + non_pk_col_name instead
+        """
+        if self._pk_for_filter:
+            if self.old_non_pk_column_list:
+                return self._pk_for_filter + self.old_non_pk_column_list
+            return self._pk_for_filter
+        elif self.old_non_pk_column_list:
+            return self.old_non_pk_column_list
+        # It's impossible to reach here, otherwise it means there's zero
+        # column in old table which MySQL doesn't support. Something is
+        # totally wrong if we get to this point
+        raise OSCError(
+            "OSC_INTERNAL_ERROR",
+            {
+                "msg": "Unexpected scenario. Both _pk_for_filter "
+                "and old_non_pk_column_list are empty"
+            },
+        )
+
     @stop_if_table_timestamp_changed
     @wrap_hook
     def load_data(self):
         stage_start_time = time.time()
         log.info("== Stage 3: Load data ==")
-        # Generate the column name list string for load data infile
-        # The column sequence is not exact the same as the original table.
-        # It's pk_col_names + non_pk_col_name instead
-        if self._pk_for_filter:
-            if self.old_non_pk_column_list:
-                column_list = self._pk_for_filter + self.old_non_pk_column_list
-            else:
-                column_list = self._pk_for_filter
-        elif self.old_non_pk_column_list:
-            column_list = self.old_non_pk_column_list
-        else:
-            # It's impossible to reach here, otherwise it means there's zero
-            # column in old table which MySQL doesn't support. Something is
-            # totally wrong if we get to this point
-            raise OSCError(
-                "OSC_INTERNAL_ERROR",
-                {
-                    "msg": "Unexpected scenario. Both _pk_for_filter "
-                    "and old_non_pk_column_list are empty"
-                },
-            )
+        if self._loaded_while_dump:
+            log.info("All chunks have been loaded while dumping")
+            self._load_finished_at = time.time()
+            return
+        column_list = self.load_column_list()
         if self.is_myrocks_table:
             # Enable rocksdb bulk load before loading data
             self.change_rocksdb_bulk_load(enable=True)
@@ -2322,19 +2887,41 @@ class CopyPayload(Payload):
         # Print out information after every 5% chunks have been loaded
         chunk_pct_for_progress = 5
         progress_freq = int(self.outfile_suffix_end * chunk_pct_for_progress / 100.0)
-        for suffix in range(self.outfile_suffix_start, self.outfile_suffix_end + 1):
-            self.load_chunk(column_list, suffix)
-            self.perform_gc_collection()
-            # We won't show progress if the number of chunks is less than 100
-            if suffix % max(5, progress_freq) == 0:
-                self.log_load_progress(suffix)
+        if not (self.skip_chunk_cleanup or self.use_sql_wsenv):
+            self.start_chunk_deleter()
+        # Outfiles don't live on local disk with wsenv
+        prefetch = self.prefetch_outfile and not self.use_sql_wsenv
+        try:
+            for suffix in range(self.outfile_suffix_start, self.outfile_suffix_end + 1):
+                if prefetch and suffix < self.outfile_suffix_end:
+                    prefetch = util.prefetch_file(self._outfile_name(suffix + 1))
+                    if not prefetch:
+                        # The outfiles are all written by mysqld, if we can't
+                        # open one of them we can't open the rest either
+                        log.warning(
+                            "Unable to prefetch outfile {}, skip prefetching "
+                            "the remaining ones. The outfiles need to be "
+                            "readable by the user running OSC".format(
+                                self._outfile_name(suffix + 1)
+                            )
+                        )
+                self.load_chunk(column_list, suffix)
+                self.perform_gc_collection()
+                # We won't show progress if the number of chunks is less than 100
+                if suffix % max(5, progress_freq) == 0:
+                    self.log_load_progress(suffix)
+        finally:
+            self.stop_chunk_deleter()
+        if self._delete_error is not None:
+            raise self._delete_error
 
         if self.is_myrocks_table:
             # Disable rocksdb bulk load after loading data
             self.change_rocksdb_bulk_load(enable=False)
             # Disable rocksdb explicit commit after loading data
             self.change_explicit_commit(enable=False)
-        self.stats["time_in_load"] = time.time() - stage_start_time
+        self._load_finished_at = time.time()
+        self.stats["time_in_load"] = self._load_finished_at - stage_start_time
 
     def check_max_statement_time_exists(self):
         """
@@ -2354,21 +2941,6 @@ class CopyPayload(Payload):
                 log.warning("MAX_STATEMENT_TIME doesn't support in this MySQL")
                 return False
 
-    def append_to_exclude_id(self):
-        """
-        Add all replayed IDs into tmp_table_exclude_id so that we won't replay
-        again later
-        """
-        self.execute_sql(
-            sql.insert_into_select_from(
-                into_table=self.tmp_table_exclude_id,
-                into_col_list=(self.IDCOLNAME, self.DMLCOLNAME),
-                from_table=self.tmp_table_include_id,
-                from_col_list=(self.IDCOLNAME, self.DMLCOLNAME),
-                enable_outfile_compression=self.enable_outfile_compression,
-            )
-        )
-
     def get_max_delta_id(self):
         """
         Get current maximum delta table ID.
@@ -2394,12 +2966,29 @@ class CopyPayload(Payload):
         @type  ids:  list
         """
         affected_row = self.execute_sql(replay_sql, ids)
+        self.check_replay_affected_rows(self.DML_TYPE_DELETE, affected_row, ids)
+
+    def check_replay_affected_rows(self, dml_type, affected_row, ids):
+        """
+        Replaying a group of deletes or inserts should always change some
+        rows in the new table, unless we are expecting some of them to be
+        skipped
+
+        @param dml_type:  type of the changes replayed
+        @type  dml_type:  int
+        @param affected_row:  number of rows affected by the replay statement
+        @type  affected_row:  int
+        @param ids:  arguments of the replay statement
+        @type  ids:  tuple
+        """
+        if dml_type == self.DML_TYPE_UPDATE or affected_row != 0:
+            return
         if (
             not self.eliminate_dups
             and not self.where
             and not self.skip_affected_rows_check
         ):
-            if not affected_row != 0:
+            if dml_type == self.DML_TYPE_DELETE:
                 log.error(f"failed to replay {ids}")
                 outfile = self._outfile_name(
                     suffix=".failed_replay",
@@ -2419,7 +3008,7 @@ class CopyPayload(Payload):
                         self.max_id_now,
                     ),
                 )
-                raise OSCError("REPLAY_WRONG_AFFECTED", {"num": affected_row})
+            raise OSCError("REPLAY_WRONG_AFFECTED", {"num": affected_row})
 
     @wrap_hook
     def replay_insert_row(self, sql, last_id, *ids):
@@ -2432,13 +3021,20 @@ class CopyPayload(Payload):
         @type  ids:  list
         """
         affected_row = self.execute_sql(sql, ids)
-        if (
-            not self.eliminate_dups
-            and not self.where
-            and not self.skip_affected_rows_check
-        ):
-            if not affected_row != 0:
-                raise OSCError("REPLAY_WRONG_AFFECTED", {"num": affected_row})
+        self.check_replay_affected_rows(self.DML_TYPE_INSERT, affected_row, ids)
+
+    @wrap_hook
+    def replay_insert_range(self, sql, ids):
+        """
+        Replay insert type changes for a contiguous range of IDs
+
+        @param sql:  SQL statement to replay the changes stored in chg table
+        @type  sql:  string
+        @param ids:  values of ID column from self.delta_table_name
+        @type  ids:  range
+        """
+        affected_row = self.execute_sql(sql, (ids[0], ids[-1]))
+        self.check_replay_affected_rows(self.DML_TYPE_INSERT, affected_row, ids)
 
     @wrap_hook
     def replay_update_row(self, sql, last_id, *ids):
@@ -2452,25 +3048,127 @@ class CopyPayload(Payload):
         """
         self.execute_sql(sql, ids)
 
+    def is_replay_commit_due(self, replayed, last_commit):
+        """
+        Whether the replay transaction should be committed before replaying
+        the next group of changes. By default this happens after every
+        replay_batch_size changes. With replay_commit_interval, it happens
+        once the transaction has been open for that many seconds instead, so
+        the commit rate follows how fast the storage can flush them
+
+        @param replayed:  number of changes replayed since the last commit
+        @type  replayed:  int
+        @param last_commit:  timestamp of the last commit
+        @type  last_commit:  float
+        """
+        if self.replay_commit_interval:
+            return (
+                replayed > 0
+                and time.time() - last_commit >= self.replay_commit_interval
+            )
+        if self.replay_batch_target_time and self._replay_commit_size:
+            return replayed > self._replay_commit_size
+        return replayed > self.replay_batch_size
+
+    def adjust_replay_commit_size(self, time_spent):
+        """
+        Scale the number of changes replayed between commits towards the
+        size that can be replayed within replay_batch_target_time. The time
+        is smoothed with an exponentially weighted moving average, so that a
+        single slow commit doesn't shrink the batch right away. The size is
+        doubled when replay is well under the target, halved when it's over,
+        and never grows beyond REPLAY_BATCH_MAX_GROWTH times replay_batch_size
+
+        @param time_spent:  seconds the last replay transaction was open for
+        @type  time_spent:  float
+        """
+        if self._replay_batch_time is None:
+            self._replay_batch_time = time_spent
+        else:
+            self._replay_batch_time += constant.REPLAY_BATCH_EWMA_WEIGHT * (
+                time_spent - self._replay_batch_time
+            )
+        current_size = self._replay_commit_size or self.replay_batch_size
+        if self._replay_batch_time < self.replay_batch_target_time / 2:
+            new_size = min(
+                current_size * 2,
+                self.replay_batch_size * constant.REPLAY_BATCH_MAX_GROWTH,
+            )
+        elif self._replay_batch_time > self.replay_batch_target_time:
+            new_size = max(current_size // 2, 1)
+        else:
+            new_size = current_size
+        if new_size != current_size:
+            log.debug(
+                "Replay batch took {:.3f}s, adjusting commit size from {} to {} "
+                "changes".format(self._replay_batch_time, current_size, new_size)
+            )
+        self._replay_commit_size = new_size
+
+    def replay_group(self, chg_type, replay_sql, ids):
+        """
+        Replay a single group of changes of the same type
+        """
+        if chg_type == self.DML_TYPE_DELETE:
+            self.replay_delete_row(replay_sql, ids[-1], ids)
+        elif isinstance(ids, range):
+            self.replay_insert_range(replay_sql, ids)
+        elif chg_type == self.DML_TYPE_UPDATE:
+            self.replay_update_row(replay_sql, ids[-1], ids)
+        else:
+            self.replay_insert_row(replay_sql, ids[-1], ids)
+
+    @wrap_hook
+    def replay_multi_groups(self, chg_type, replay_sql, id_groups):
+        """
+        Replay consecutive groups of the same type of changes with a single
+        multi-statement query, saving a round trip for each group
+
+        @param chg_type:  type of the changes to replay
+        @type  chg_type:  int
+        @param replay_sql:  SQL statement to replay a group of changes
+        @type  replay_sql:  string
+        @param id_groups:  values of ID column of each group
+        @type  id_groups:  list[list]
+        """
+        affected_rows = self.execute_sql_multi(
+            [(replay_sql, (ids,)) for ids in id_groups]
+        )
+        for ids, affected_row in zip(id_groups, affected_rows):
+            self.check_replay_affected_rows(chg_type, affected_row, (ids,))
+
+    def flush_replay_batch(self, replay_sqls, batch):
+        """
+        Replay the groups of changes queued up in batch, and empty it
+        """
+        if not batch:
+            return
+        chg_type = batch[0][0]
+        if len(batch) == 1:
+            self.replay_group(chg_type, replay_sqls[chg_type], batch[0][1])
+        else:
+            self.replay_multi_groups(
+                chg_type, replay_sqls[chg_type], [ids for _, ids in batch]
+            )
+        batch.clear()
+
     def get_gap_changes(self):
         # See if there're some gaps we need to cover. Because there're some
         # transactions that may started before last replay snapshot but
         # committed afterwards, which will cause __OSC_ID_ smaller than
         # self.last_replayed_id
         delta = []
-        log.info(
-            "Checking {} gap ids".format(len(self._replayed_chg_ids.missing_points()))
+        missing_points = self._replayed_chg_ids.missing_points()
+        log.info("Checking {} gap ids".format(len(missing_points)))
+        # Same statement for every gap, only the change ID differs
+        chg_row_sql = sql.get_chg_row(
+            self.IDCOLNAME,
+            self.DMLCOLNAME,
+            self.delta_table_name,
+            self.new_pk_list,
         )
-        for chg_id in self._replayed_chg_ids.missing_points():
-            row = self.query(
-                sql.get_chg_row(
-                    self.IDCOLNAME,
-                    self.DMLCOLNAME,
-                    self.delta_table_name,
-                    self.new_pk_list,
-                ),
-                (chg_id,),
-            )
+        for chg_id in missing_points:
+            row = self.query(chg_row_sql, (chg_id,))
             if bool(row):
                 log.debug("Change {} appears now!".format(chg_id))
                 delta.append(row[0])
@@ -2482,91 +3180,180 @@ class CopyPayload(Payload):
         return delta
 
     def enable_batch_updates(self):
-        return False
+        """
+        A batched UPDATE ... JOIN matches the new table by the primary key
+        used for filtering, while the groups are only kept free of duplicate
+        new primary keys. If the two differ, one row could be matched twice
+        within a group and get either of the updates
+        """
+        return self.batch_updates and self._pk_for_filter == self.new_pk_list
+
+    def can_replay_deletes_by_pk(self):
+        """
+        Deleting by primary key values is only equivalent to joining the
+        delta table, when the new table is filtered by the same single
+        column primary key without any charset conversion
+        """
+        return (
+            self.replay_deletes_by_pk
+            and not self.mismatch_pk_charset
+            and len(self._pk_for_filter) == 1
+            and self._pk_for_filter == self.new_pk_list
+        )
+
+    def can_skip_superseded_updates(self):
+        """
+        Updates are captured with the values of all the columns, and can't
+        change the primary key used for filtering, as that is captured as a
+        delete plus an insert. So a later update of the same row overwrites
+        everything an earlier one did, as long as the rows are told apart by
+        that same primary key
+        """
+        return (
+            self.skip_superseded_updates
+            and not self.mismatch_pk_charset
+            and self._pk_for_filter == self.new_pk_list
+        )
 
-    def divide_changes_to_group(self, chg_rows):
+    def drop_superseded_updates(self, chg_rows, pk_cols):
+        """
+        Keep only the last update of each row in a run of consecutive updates
+
+        @param chg_rows:  consecutive update rows from _chg table
+        @type  chg_rows:  iterable
+        @param pk_cols:  keys of the primary key columns in each row
+        @type  pk_cols:  list
+        """
+        chg_rows = list(chg_rows)
+        row_pks = [tuple(chg[col] for col in pk_cols) for chg in chg_rows]
+        last_update = {pk: idx for idx, pk in enumerate(row_pks)}
+        if len(last_update) == len(chg_rows):
+            return chg_rows
+        self.stats["superseded_updates_skipped"] += len(chg_rows) - len(last_update)
+        return [
+            chg
+            for idx, (chg, pk) in enumerate(zip(chg_rows, row_pks))
+            if last_update[pk] == idx
+        ]
+
+    def divide_changes_to_group(self, chg_rows, row_keys=None):
         """
         Put consecutive changes with the same type into a group so that we can
         execute them in a single query to speed up replay
 
         @param chg_rows:  list of rows returned from _chg select query
         @type  chg_rows:  list[dict]
+        @param row_keys:  keys of the ID column, the DML type column and the
+        new table's primary key columns in each row. By default rows are
+        dicts keyed by column names
+        @type  row_keys:  tuple
         """
-        id_group = []
-        type_now = None
-        tracked_primary_keys = set()
-        for idx, chg in enumerate(chg_rows):
-            # Start of the current group
-            if type_now is None:
-                type_now = chg[self.DMLCOLNAME]
-            id_group.append(chg[self.IDCOLNAME])
-
-            # Dump when we are at the end of the changes
-            if idx == len(chg_rows) - 1:
-                yield type_now, id_group
-                tracked_primary_keys = set()
-                return
-
-            if self.use_batch_updates:
-                if (
-                    idx + 1 <= len(chg_rows) - 1
-                    and chg_rows[idx + 1][self.DMLCOLNAME] == self.DML_TYPE_UPDATE
-                ):
-                    primary_key_value = ""
-                    if type_now == self.DML_TYPE_UPDATE:
-                        for col in self.new_pk_list:
-                            primary_key_value += str(chg[col])
-                            # __osc__ is the delimiter
-                            primary_key_value += ";__osc__;"
-                    future_key_value = ""
-                    for col in self.new_pk_list:
-                        future_key_value += str(chg_rows[idx + 1][col])
-                        # __osc__ is the delimiter
-                        future_key_value += ";__osc__;"
-                    # If we have an existing update in the tracked primary keys,
-                    # end the batch right now.
-                    if (
-                        future_key_value in tracked_primary_keys
-                        or future_key_value == primary_key_value
-                    ):
-                        yield type_now, id_group
-                        type_now = None
-                        id_group = []
-                        tracked_primary_keys = set()
-                        continue
-
-            # The next change is a different type, dump what we have now
-            if chg_rows[idx + 1][self.DMLCOLNAME] != type_now:
-                yield type_now, id_group
-                type_now = None
-                id_group = []
-                tracked_primary_keys = set()
-            # Reach the max group size, let's submit the query for now
-            elif len(id_group) >= self.replay_group_size:
-                yield type_now, id_group
-                type_now = None
-                id_group = []
-                tracked_primary_keys = set()
+        id_col, type_col, pk_cols = row_keys or (
+            self.IDCOLNAME,
+            self.DMLCOLNAME,
+            None,
+        )
+        group_size = max(self.replay_group_size, 1)
+        delete_by_pk = self.can_replay_deletes_by_pk()
+        if delete_by_pk:
+            pk_col = (pk_cols or self.new_pk_list)[0]
+        skip_superseded = self.can_skip_superseded_updates()
+        for chg_type, run in groupby(chg_rows, key=itemgetter(type_col)):
             # update type cannot be grouped unless these are
             # consecutive updates on different new table
             # primary keys
-            elif type_now == self.DML_TYPE_UPDATE:
-                primary_key_value = ""
+            if chg_type == self.DML_TYPE_UPDATE:
+                if skip_superseded:
+                    run = self.drop_superseded_updates(
+                        run, pk_cols or self.new_pk_list
+                    )
                 if self.use_batch_updates:
-                    for col in self.new_pk_list:
-                        primary_key_value += str(chg[col])
-                        # __osc__ is the delimiter
-                        primary_key_value += ";__osc__;"
-                    if primary_key_value not in tracked_primary_keys:
-                        tracked_primary_keys.add(primary_key_value)
-                        continue
-                yield type_now, id_group
-                type_now = None
+                    yield from self.divide_updates_to_group(
+                        run, group_size, id_col, pk_cols or self.new_pk_list
+                    )
+                else:
+                    for chg in run:
+                        yield chg_type, [chg[id_col]]
+                continue
+            if chg_type == self.DML_TYPE_INSERT and self.bulk_replay_threshold:
+                yield from self.divide_inserts_to_group(run, group_size, id_col)
+                continue
+            # Split the run of the same type into groups of at most
+            # replay_group_size changes
+            while True:
+                chunk = list(islice(run, group_size))
+                if not chunk:
+                    break
+                # Deletes are replayed by primary key values directly
+                if delete_by_pk and chg_type == self.DML_TYPE_DELETE:
+                    yield chg_type, [chg[pk_col] for chg in chunk]
+                else:
+                    yield chg_type, [chg[id_col] for chg in chunk]
+
+    def divide_updates_to_group(self, chg_rows, group_size, id_col, pk_list):
+        """
+        Put consecutive updates into groups, in which no primary key appears
+        more than once, so that each group can be replayed with a single
+        UPDATE ... JOIN
+
+        @param chg_rows:  consecutive update rows from _chg table
+        @type  chg_rows:  iterable
+        @param group_size:  maximum number of changes in a group
+        @type  group_size:  int
+        @param id_col:  key of the ID column in each row
+        @param pk_list:  keys of the primary key columns in each row
+        """
+        id_group = []
+        tracked_primary_keys = set()
+        for chg in chg_rows:
+            primary_key_value = tuple(chg[col] for col in pk_list)
+            if primary_key_value in tracked_primary_keys or len(id_group) >= group_size:
+                yield self.DML_TYPE_UPDATE, id_group
                 id_group = []
                 tracked_primary_keys = set()
-            # The next element will be the same as what we are now
+            id_group.append(chg[id_col])
+            tracked_primary_keys.add(primary_key_value)
+        if id_group:
+            yield self.DML_TYPE_UPDATE, id_group
+
+    def divide_inserts_to_group(self, chg_rows, group_size, id_col):
+        """
+        Put consecutive inserts into groups of at most group_size IDs, except
+        for contiguous runs of at least bulk_replay_threshold IDs, which are
+        put into ranges of replay_batch_size IDs instead
+
+        @param chg_rows:  consecutive insert rows from _chg table
+        @type  chg_rows:  iterable
+        @param group_size:  maximum number of changes in a group
+        @type  group_size:  int
+        @param id_col:  key of the ID column in each row
+        """
+        range_size = max(self.replay_batch_size, 1)
+        pending = []
+        segment = []
+
+        def flush_pending():
+            for start in range(0, len(pending), group_size):
+                yield self.DML_TYPE_INSERT, pending[start : start + group_size]
+            pending.clear()
+
+        def flush_segment():
+            if len(segment) < self.bulk_replay_threshold:
+                pending.extend(segment)
             else:
-                continue
+                yield from flush_pending()
+                for start in range(segment[0], segment[-1] + 1, range_size):
+                    yield self.DML_TYPE_INSERT, range(
+                        start, min(start + range_size, segment[-1] + 1)
+                    )
+            segment.clear()
+
+        for chg in chg_rows:
+            if segment and chg[id_col] != segment[-1] + 1:
+                yield from flush_segment()
+            segment.append(chg[id_col])
+        yield from flush_segment()
+        yield from flush_pending()
 
     def perform_gc_collection(self):
         if time.time() - self.last_gc_collected > constant.GC_COLLECT_TIME_INTERVAL:
@@ -2574,6 +3361,68 @@ class CopyPayload(Payload):
             self.last_gc_collected = time.time()
             log.debug("GC collected {} objects".format(gc_count))
 
+    def _ensure_replay_sql(self):
+        """
+        Build the delete/update/insert replay SQL on first use and reuse them
+        for every later replay round. They only depend on the table schema,
+        which doesn't change once init_table_obj has run
+
+        @return:  replay SQL keyed by DML type
+        @rtype :  dict
+        """
+        if self._replay_sqls is not None:
+            return self._replay_sqls
+        if self.can_replay_deletes_by_pk():
+            delete_sql = sql.replay_delete_by_pk(
+                self.new_table_name, self._pk_for_filter[0]
+            )
+        else:
+            delete_sql = sql.replay_delete_row(
+                self.new_table_name,
+                self.delta_table_name,
+                self.IDCOLNAME,
+                self._pk_for_filter,
+                self.mismatch_pk_charset,
+            )
+        # Updates will only be grouped if batch updates are enabled, in which
+        # case a derived table join saves us from joining the whole delta table
+        replay_update_func = (
+            sql.replay_updates_by_ids
+            if self.use_batch_updates
+            else sql.replay_update_row
+        )
+        update_sql = replay_update_func(
+            self.old_non_pk_column_list,
+            self.new_table_name,
+            self.delta_table_name,
+            self.eliminate_dups,
+            self.IDCOLNAME,
+            self._pk_for_filter,
+            self.mismatch_pk_charset,
+        )
+        insert_sql = sql.replay_insert_row(
+            self.old_column_list,
+            self.new_table_name,
+            self.delta_table_name,
+            self.IDCOLNAME,
+            self.eliminate_dups,
+        )
+        self._replay_sqls = {
+            self.DML_TYPE_DELETE: delete_sql,
+            self.DML_TYPE_UPDATE: update_sql,
+            self.DML_TYPE_INSERT: insert_sql,
+        }
+        # Contiguous ranges of inserted IDs are replayed with a BETWEEN instead
+        # of an IN list. Kept apart, as it's not keyed by a DML type
+        self._replay_insert_range_sql = sql.replay_insert_range(
+            self.old_column_list,
+            self.new_table_name,
+            self.delta_table_name,
+            self.IDCOLNAME,
+            self.eliminate_dups,
+        )
+        return self._replay_sqls
+
     def replay_changes_internal_with_delta_table(
         self, single_trx, holding_locks, delta_id_limit, stage_start_time, replay_ms
     ) -> int:
@@ -2607,56 +3456,52 @@ class CopyPayload(Payload):
             log.info(
                 "Replaying changes happened before change ID: {}".format(max_id_now)
             )
-        delta = self.get_gap_changes()
-
-        # Only replay changes in this range (last_replayed_id, max_id_now]
-        new_changes = self.query(
-            sql.get_replay_row_ids(
-                self.IDCOLNAME,
-                self.DMLCOLNAME,
-                self.delta_table_name,
-                self.new_pk_list,
-                replay_ms,
-                self.mysql_version.is_mysql8,
-            ),
-            (
-                self.last_replayed_id,
-                max_id_now,
-            ),
-        )
-        self._replayed_chg_ids.extend([r[self.IDCOLNAME] for r in new_changes])
-        delta.extend(new_changes)
+        # Changes are kept as (id, dml_type, *new_pk) tuples, which take much
+        # less memory than dicts when there's a large backlog to replay
+        pk_list = self.new_pk_list
+        # None of these tuples become garbage while the list is being built
+        with util.gc_paused():
+            delta = [
+                (row[self.IDCOLNAME], row[self.DMLCOLNAME], *(row[c] for c in pk_list))
+                for row in self.get_gap_changes()
+            ]
+            gap_count = len(delta)
+
+            # Only replay changes in this range (last_replayed_id, max_id_now].
+            # Skip the query if the range is empty, which is common for a quiet
+            # table and saves a round trip in the final replay under the lock
+            if max_id_now > self.last_replayed_id:
+                delta.extend(
+                    self.query_stream(
+                        sql.get_replay_row_ids(
+                            self.IDCOLNAME,
+                            self.DMLCOLNAME,
+                            self.delta_table_name,
+                            pk_list,
+                            replay_ms,
+                            self.mysql_version.is_mysql8,
+                        ),
+                        (
+                            self.last_replayed_id,
+                            max_id_now,
+                        ),
+                    )
+                )
+        self._replayed_chg_ids.extend(row[0] for row in islice(delta, gap_count, None))
+        row_keys = (0, 1, range(2, 2 + len(pk_list)))
 
         log.info("Total {} changes to replay".format(len(delta)))
-        # Generate all three possible replay SQL here, so that we don't waste
-        # CPU time regenerating them for each replay event
-        delete_sql = sql.replay_delete_row(
-            self.new_table_name,
-            self.delta_table_name,
-            self.IDCOLNAME,
-            self._pk_for_filter,
-            self.mismatch_pk_charset,
-        )
-        update_sql = sql.replay_update_row(
-            self.old_non_pk_column_list,
-            self.new_table_name,
-            self.delta_table_name,
-            self.eliminate_dups,
-            self.IDCOLNAME,
-            self._pk_for_filter,
-            self.mismatch_pk_charset,
-        )
-        insert_sql = sql.replay_insert_row(
-            self.old_column_list,
-            self.new_table_name,
-            self.delta_table_name,
-            self.IDCOLNAME,
-            self.eliminate_dups,
-        )
+        replay_sqls = self._ensure_replay_sql()
+        # Groups of the same type waiting to be sent in a single round trip
+        batch = []
+        batch_size = 0
+        last_commit = time.time()
         replayed = 0
         replayed_total = 0
-        showed_pct = 0
-        for chg_type, ids in self.divide_changes_to_group(delta):
+        total = len(delta)
+        progress_step = max(total // 10, 1)
+        next_progress = progress_step
+        for chg_type, ids in self.divide_changes_to_group(delta, row_keys):
             # We only care about replay time when we are holding a write lock
             if (
                 holding_locks
@@ -2666,37 +3511,53 @@ class CopyPayload(Payload):
                 raise OSCError("REPLAY_TIMEOUT")
             replayed_total += len(ids)
             # Commit transaction after every replay_batch_size number of
-            # changes have been replayed
-            if not single_trx and replayed > self.replay_batch_size:
+            # changes have been replayed, or replay_commit_interval seconds
+            if not single_trx and self.is_replay_commit_due(replayed, last_commit):
+                self.flush_replay_batch(replay_sqls, batch)
+                batch_size = 0
                 self.commit()
+                if self.replay_batch_target_time:
+                    self.adjust_replay_commit_size(time.time() - last_commit)
                 self.start_transaction()
+                last_commit = time.time()
                 replayed = 0
             else:
                 replayed += len(ids)
 
             # Use corresponding SQL to replay each type of changes
             if chg_type == self.DML_TYPE_DELETE:
-                self.replay_delete_row(delete_sql, ids[-1], ids)
                 deleted += len(ids)
             elif chg_type == self.DML_TYPE_UPDATE:
-                self.replay_update_row(update_sql, ids[-1], ids)
                 updated += len(ids)
             elif chg_type == self.DML_TYPE_INSERT:
-                self.replay_insert_row(insert_sql, ids[-1], ids)
                 inserted += len(ids)
             else:
                 # We are not supposed to reach here, unless someone explicitly
                 # insert a row with unknown type into _chg table during OSC
                 raise OSCError("UNKOWN_REPLAY_TYPE", {"type_value": chg_type})
+            if self.replay_multi_statements and not isinstance(ids, range):
+                if batch and batch[0][0] != chg_type:
+                    self.flush_replay_batch(replay_sqls, batch)
+                    batch_size = 0
+                batch.append((chg_type, ids))
+                batch_size += len(ids)
+                if batch_size >= self.replay_batch_size:
+                    self.flush_replay_batch(replay_sqls, batch)
+                    batch_size = 0
+            else:
+                # Ranges of IDs are always replayed on their own
+                self.flush_replay_batch(replay_sqls, batch)
+                batch_size = 0
+                if isinstance(ids, range):
+                    self.replay_group(chg_type, self._replay_insert_range_sql, ids)
+                else:
+                    self.replay_group(chg_type, replay_sqls[chg_type], ids)
             # Print progress information after every 10% changes have been
-            # replayed. If there're no more than 100 changes to replay then
-            # there'll be no such progress information
-            progress_pct = int(replayed_total / len(delta) * 100)
-            if progress_pct > showed_pct:
-                log.info(
-                    "Replay progress: {}/{} changes".format(replayed_total, len(delta))
-                )
-                showed_pct += 10
+            # replayed
+            if replayed_total >= next_progress:
+                log.info("Replay progress: {}/{} changes".format(replayed_total, total))
+                next_progress = replayed_total + progress_step
+        self.flush_replay_batch(replay_sqls, batch)
         # Commit for last batch
         if not single_trx:
             self.commit()
@@ -2761,9 +3622,7 @@ class CopyPayload(Payload):
         end_time = time.time()
         self.current_catchup_end_time = int(end_time)
         time_spent = end_time - stage_start_time
-        self.stats["time_in_replay"] = (
-            self.stats.setdefault("time_in_replay", 0) + time_spent
-        )
+        self.stats["time_in_replay"] += time_spent
         log.info("Replayed in {:.2f} Seconds".format(time_spent))
         if time_spent > 0.0:
             self.stats["last_catchup_speed"] = delta_updates_count / time_spent
@@ -2831,10 +3690,51 @@ class CopyPayload(Payload):
         made
         """
 
-        # Analyze table has a query result, we have to use query here.
-        # Otherwise we'll get a out of sync error
-        self.query(sql.analyze_table(self.new_table_name))
-        self.query(sql.analyze_table(self.delta_table_name))
+        tables = [self.delta_table_name]
+        if self.new_table_stats_refreshed():
+            log.info(
+                "Skip analyzing {}, its statistics have been refreshed while "
+                "recreating indexes".format(self.new_table_name)
+            )
+        else:
+            tables.insert(0, self.new_table_name)
+        # Analyze table has a query result, which execute_sql_multi reads
+        # and discards. Otherwise we'll get a out of sync error
+        self.execute_sql_multi([(sql.analyze_table(table), ()) for table in tables])
+
+    def new_table_stats_refreshed(self):
+        """
+        Whether InnoDB has already refreshed the statistics of the new table.
+        Indexes recreated in place get persistent statistics computed right
+        away, and the load changes far more rows than it takes to get the
+        rest recalculated automatically. But the recalculation runs in the
+        background, so only trust the statistics if they have been saved
+        after the load and their row count matches what has been loaded
+        """
+        if not (
+            self.droppable_indexes
+            and not self.is_myrocks_table
+            and self.is_var_enabled("innodb_stats_persistent")
+            and self.is_var_enabled("innodb_stats_auto_recalc")
+            and self._load_finished_at is not None
+        ):
+            return False
+        # There's no row if the table has STATS_PERSISTENT=0 itself
+        result = self.query(
+            sql.innodb_table_stats_age, (self._current_db, self.new_table_name)
+        )
+        if not result or result[0]["stats_age"] is None:
+            return False
+        # Compare ages rather than timestamps, so that the clocks of the two
+        # hosts don't matter. Both are truncated to seconds, which can only
+        # make the statistics look older than they are
+        if result[0]["stats_age"] >= int(time.time() - self._load_finished_at):
+            return False
+        loaded_rows = self.stats["outfile_lines"]
+        return (
+            abs(result[0]["n_rows"] - loaded_rows)
+            <= loaded_rows * constant.STATS_ROWS_TOLERANCE
+        )
 
     def compare_checksum(
         self,
@@ -2862,23 +3762,32 @@ class CopyPayload(Payload):
 
         checksum_xor = 0
         # Also, generate an xor of all the checksum entries for a quick sanity test
-        for idx, checksum_entry in enumerate(old_table_checksum):
-            for col in checksum_entry:
-                if not old_table_checksum[idx][col] == new_table_checksum[idx][col]:
+        for idx, (old_entry, new_entry) in enumerate(
+            zip(old_table_checksum, new_table_checksum)
+        ):
+            # Compare the whole chunk at once, and only look into each column
+            # when there's a mismatch
+            if old_entry == new_entry:
+                for value in old_entry.values():
+                    checksum_xor ^= value
+                continue
+            for col, old_value in old_entry.items():
+                new_value = new_entry[col]
+                if not old_value == new_value:
                     log.error(
                         "checksum/count mismatch for chunk {} "
                         "column `{}`: OLD={}, NEW={}".format(
                             idx,
                             col,
-                            old_table_checksum[idx][col],
-                            new_table_checksum[idx][col],
+                            old_value,
+                            new_value,
                         )
                     )
                     log.error(
                         "Number of rows for the chunk that cause the "
                         "mismatch: OLD={}, NEW={}".format(
-                            old_table_checksum[idx]["cnt"],
-                            new_table_checksum[idx]["cnt"],
+                            old_entry["cnt"],
+                            new_entry["cnt"],
                         )
                     )
                     log.error(
@@ -2891,7 +3800,7 @@ class CopyPayload(Payload):
                     )
                     self.detailed_checksum()
                 else:
-                    checksum_xor ^= old_table_checksum[idx][col]
+                    checksum_xor ^= old_value
 
         self.current_checksum_record = checksum_xor
 
@@ -2901,22 +3810,23 @@ class CopyPayload(Payload):
         which don't have primary in the old schema. See checksum_by_chunk
         for more detail
         """
-        # Calculate checksum for old table
-        old_checksum = self.query(
-            sql.checksum_full_table(
-                self.table_name, self.checksum_column_list(exclude_pk=False)
-            )
-        )
-
-        # Calculate checksum for new table
-        new_checksum = self.query(
-            sql.checksum_full_table(
-                self.new_table_name, self.checksum_column_list(exclude_pk=False)
+        # Calculate checksum for both old and new table in one round trip
+        checksums = self.query(
+            sql.checksum_full_table_pair(
+                self.table_name,
+                self.new_table_name,
+                self.checksum_column_list(exclude_pk=False),
             )
         )
         self.commit()
 
         # Compare checksum
+        old_checksum, new_checksum = [], []
+        for row in checksums:
+            if row.pop("_osc_table") == 0:
+                old_checksum.append(row)
+            else:
+                new_checksum.append(row)
         if old_checksum and new_checksum:
             self.compare_checksum(old_checksum, new_checksum)
 
@@ -2936,8 +3846,11 @@ class CopyPayload(Payload):
                 # Take the first row only as only one is expected.
                 self.query(sql_query)[0]
             )
-
-        self.commit()
+            # Only the old table needs the snapshot. The data in new table is
+            # static without replaying changes, so release the snapshot
+            # before scanning it
+            if table == self.table_name:
+                self.commit()
 
         checksum_old = checksums[0]["Checksum"]
         checksum_new = checksums[1]["Checksum"]
@@ -2977,35 +3890,27 @@ class CopyPayload(Payload):
         @type use_where: bool
         """
         log.info("Dumping raw data onto local disk for further investigation")
+        non_pk_columns = self.checksum_column_list(exclude_pk=True)
         log.info("Columns will be dumped in following order: ")
-        log.info(
-            ", ".join(self._pk_for_filter + self.checksum_column_list(exclude_pk=True))
+        log.info(", ".join(self._pk_for_filter + non_pk_columns))
+        # index for old schema should always be PK, while index for new schema
+        # can be any indexes that provides uniqueness and covering old PK lookup
+        jobs = (
+            (self.table_name, "PRIMARY", ".old"),
+            (self.new_table_name, self.find_coverage_index(), ".new"),
         )
-        for table_name in [self.table_name, self.new_table_name]:
-            if table_name == self.new_table_name:
-                # index for new schema can be any indexes that provides
-                # uniqueness and covering old PK lookup
-                idx_for_checksum = self.find_coverage_index()
-                outfile = self._outfile_name(
-                    suffix=".new",
-                    chunk_id=0,
-                    # MySQL does create the file with the extension itself
-                    skip_compressed_extension=True,
-                )
-            else:
-                # index for old schema should always be PK
-                idx_for_checksum = "PRIMARY"
-                outfile = self._outfile_name(
-                    suffix=".old",
-                    chunk_id=0,
-                    # MySQL does create the file with the extension itself
-                    skip_compressed_extension=True,
-                )
+        for table_name, idx_for_checksum, suffix in jobs:
+            outfile = self._outfile_name(
+                suffix=suffix,
+                chunk_id=0,
+                # MySQL does create the file with the extension itself
+                skip_compressed_extension=True,
+            )
             log.info("Dump offending chunk from {} into {}".format(table_name, outfile))
             self.execute_sql(
                 sql.dump_current_chunk(
                     table_name,
-                    self.checksum_column_list(exclude_pk=True),
+                    non_pk_columns,
                     self._pk_for_filter,
                     self.range_start_vars_array,
                     self.select_chunk_size,
@@ -3037,14 +3942,15 @@ class CopyPayload(Payload):
                 self.new_table_name, use_where, new_idx_for_checksum
             )
             affected_rows = old_checksum["_osc_chunk_cnt"]
-            # Need to convert to List here because dict_values type will always
-            # claim two sides as different
-            if list(old_checksum.values()) != list(new_checksum.values()):
+            # Both sides use the same column aliases, so the rows can be
+            # compared as dicts directly
+            if old_checksum != new_checksum:
                 log.info("Checksum mismatch detected for chunk {}: ".format(chunk_id))
                 log.info("OLD: {}".format(str(old_checksum)))
                 log.info("NEW: {}".format(str(new_checksum)))
                 self.dump_current_chunk(use_where)
                 raise OSCError("CHECKSUM_MISMATCH")
+            log.debug("Checksum matches for chunk {}".format(chunk_id))
 
             # Refresh where condition range for next select
             if affected_rows:
@@ -3053,13 +3959,18 @@ class CopyPayload(Payload):
 
     @wrap_hook
     def checksum_by_chunk(
-        self, table_name: str, dump_after_checksum: bool = False
+        self, table_name: str, dump_after_checksum: bool = False, conn=None
     ) -> list[dict[str, int]]:
         """
         Run checksum-by-chunk algorithm for the given table. This is to
         make sure there's no data corruption after load and first round of
         replay
+
+        @param conn:  side connection to run the checksum on, instead of the
+            main one
         """
+        query = self.query if conn is None else conn.query
+        execute = self.execute_sql if conn is None else conn.execute
         checksum_result: list[dict[str, int]] = []
         # Checksum by chunk. This is pretty much the same logic as we've used
         # in select_table_into_outfile
@@ -3072,15 +3983,17 @@ class CopyPayload(Payload):
         else:
             idx_for_checksum = self._idx_name_for_filter
             outfile_prefix = "{}.old".format(self.outfile)
+        # The columns don't change from chunk to chunk
+        non_pk_columns = self.checksum_column_list(exclude_pk=True)
         while affected_rows:
             # TODO: consider using self.query_array method which calls
             # self._conn.query_array for memory efficiency. self.query uses
             # a DictCursor under the hood, which stores column names for each
             # row, which may be costly.
-            checksum: list[dict[str, int], ...] = self.query(
+            checksum: list[dict[str, int], ...] = query(
                 sql.checksum_by_chunk(
                     table_name,
-                    self.checksum_column_list(exclude_pk=True),
+                    non_pk_columns,
                     self._pk_for_filter,
                     self.range_start_vars_array,
                     self.range_end_vars_array,
@@ -3094,10 +4007,10 @@ class CopyPayload(Payload):
             # This will be very helpful when there's a reproducible checksum
             # mismatch issue
             if dump_after_checksum:
-                self.execute_sql(
+                execute(
                     sql.dump_current_chunk(
                         table_name,
-                        self.checksum_column_list(exclude_pk=True),
+                        non_pk_columns,
                         self._pk_for_filter,
                         self.range_start_vars_array,
                         self.select_checksum_chunk_size,
@@ -3111,7 +4024,7 @@ class CopyPayload(Payload):
 
             # Refresh where condition range for next select
             if checksum:
-                self.refresh_range_start()
+                self.refresh_range_start(conn)
                 affected_rows = checksum[0]["cnt"]
                 checksum_result.append(checksum[0])
                 use_where = True
@@ -3120,6 +4033,109 @@ class CopyPayload(Payload):
                 self.perform_gc_collection()
         return checksum_result
 
+    def checksum_by_chunk_interleaved(self) -> None:
+        """
+        Checksum the old and new table one chunk pair at a time, and compare
+        each pair right away. Unlike checksum_by_chunk, a mismatch in an early
+        chunk is reported without scanning the rest of both tables. Both
+        tables are read within the current transaction, which is committed
+        once done.
+
+        Raises OSCError upon mismatch.
+        """
+        affected_rows = 1
+        use_where = False
+        chunk_id = 0
+        checksum_xor = 0
+        idx_for_checksum = {
+            self.table_name: self._idx_name_for_filter,
+            self.new_table_name: self.find_coverage_index(),
+        }
+        non_pk_columns = self.checksum_column_list(exclude_pk=True)
+        try:
+            while affected_rows:
+                # Both tables start from the same range start, which is only
+                # refreshed once the pair has been compared
+                old_checksum, new_checksum = (
+                    self.query(
+                        sql.checksum_by_chunk(
+                            table_name,
+                            non_pk_columns,
+                            self._pk_for_filter,
+                            self.range_start_vars_array,
+                            self.range_end_vars_array,
+                            self.select_checksum_chunk_size,
+                            use_where,
+                            idx_for_checksum[table_name],
+                        )
+                    )[0]
+                    for table_name in (self.table_name, self.new_table_name)
+                )
+                if old_checksum != new_checksum:
+                    log.error(
+                        "Checksum mismatch for chunk {}: OLD={}, NEW={}".format(
+                            chunk_id, old_checksum, new_checksum
+                        )
+                    )
+                    log.error(
+                        "Current replayed max(__OSC_ID) of chg table {}".format(
+                            self.last_replayed_id
+                        )
+                    )
+                    log.info(
+                        "Running detailed checksum to get more detailed diagnostics"
+                    )
+                    self.detailed_checksum()
+                    raise OSCError("CHECKSUM_MISMATCH")
+                for value in old_checksum.values():
+                    checksum_xor ^= value
+                affected_rows = old_checksum["cnt"]
+                if affected_rows:
+                    self.refresh_range_start()
+                    use_where = True
+                    chunk_id += 1
+                    self.perform_gc_collection()
+        finally:
+            # Both tables have been read, nothing else needs the snapshot
+            self.commit()
+        log.debug("{} checksum chunks in total".format(chunk_id + 1))
+        self.current_checksum_record = checksum_xor
+
+    def checksum_by_chunk_in_parallel(self):
+        """
+        Checksum the old table within the current transaction, while checksum
+        for the new table runs on a second connection at the same time. The
+        data in new table is static without replaying changes, so it doesn't
+        need the transaction.
+        Session variables are per connection, so the two checksums won't
+        step on each other's chunk boundaries. The second connection is not
+        borrowed from the pool, as the session overrides would stay on it, and
+        is closed afterwards
+
+        @return:  checksum results of the old table and the new table
+        @rtype :  tuple
+        """
+        conn = self.get_conn(self._current_db)
+        try:
+            self.skip_cache_fill_for_myrocks(conn)
+            self.override_session_vars(conn)
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                log.info("1. Checksumming data from old and new table in parallel")
+                new_table_future = executor.submit(
+                    self.checksum_by_chunk,
+                    self.new_table_name,
+                    dump_after_checksum=self.dump_after_checksum,
+                    conn=conn,
+                )
+                old_table_checksum = self.checksum_by_chunk(
+                    self.table_name, dump_after_checksum=self.dump_after_checksum
+                )
+                self.commit()
+                new_table_checksum = new_table_future.result()
+        finally:
+            conn.close()
+        return old_table_checksum, new_table_checksum
+
     def need_checksum(self):
         """
         Check whether we should checksum or not
@@ -3135,17 +4151,11 @@ class CopyPayload(Payload):
         # it's high possible that the checksum will mis-match, because
         # the returning sequence after order by primary key may be vary
         # for different collations
+        old_columns = {col.name: col for col in self._old_table.column_list}
+        new_columns = {col.name: col for col in self._new_table.column_list}
         for pri_column in self._pk_for_filter:
-            old_column_tmp = [
-                col for col in self._old_table.column_list if col.name == pri_column
-            ]
-            if old_column_tmp:
-                old_column = old_column_tmp[0]
-            new_column_tmp = [
-                col for col in self._new_table.column_list if col.name == pri_column
-            ]
-            if new_column_tmp:
-                new_column = new_column_tmp[0]
+            old_column = old_columns.get(pri_column)
+            new_column = new_columns.get(pri_column)
             if old_column and new_column:
                 if not is_equal(old_column.collate, new_column.collate):
                     log.warning(
@@ -3160,7 +4170,7 @@ class CopyPayload(Payload):
                 log.warning(
                     "Skipping checksuming because there's no unique index "
                     "in new table schema can perfectly cover old primary key "
-                    "combination for search".format(old_column.name)
+                    "combination for search"
                 )
                 return False
         else:
@@ -3171,7 +4181,7 @@ class CopyPayload(Payload):
                 log.warning(
                     "Skipping checksuming because there's no unique index "
                     "in new table schema can perfectly cover old primary key "
-                    "combination for search".format(old_column.name)
+                    "combination for search"
                 )
                 return False
         return True
@@ -3240,23 +4250,34 @@ class CopyPayload(Payload):
             # Chunk-based checksumming using SQL queries to run column-wise
             # aggregates over batches of rows.
             log.info("Doing chunk-based checksum of old and new tables.")
-            log.info("1. Checksumming data from old table")
-            old_table_checksum = self.checksum_by_chunk(
-                self.table_name, dump_after_checksum=self.dump_after_checksum
-            )
+            if self.parallel_checksum:
+                (
+                    old_table_checksum,
+                    new_table_checksum,
+                ) = self.checksum_by_chunk_in_parallel()
+            elif self.fail_fast_checksum and not self.dump_after_checksum:
+                log.info("1. Checksumming old and new tables chunk by chunk")
+                self.checksum_by_chunk_interleaved()
+                old_table_checksum = new_table_checksum = None
+            else:
+                log.info("1. Checksumming data from old table")
+                old_table_checksum = self.checksum_by_chunk(
+                    self.table_name, dump_after_checksum=self.dump_after_checksum
+                )
 
-            # We can calculate the checksum for new table outside the
-            # transaction, because the data in new table is static without
-            # replaying changes.
-            self.commit()
+                # We can calculate the checksum for new table outside the
+                # transaction, because the data in new table is static without
+                # replaying changes.
+                self.commit()
 
-            log.info("2. Checksuming data from new table")
-            new_table_checksum = self.checksum_by_chunk(
-                self.new_table_name, dump_after_checksum=self.dump_after_checksum
-            )
+                log.info("2. Checksuming data from new table")
+                new_table_checksum = self.checksum_by_chunk(
+                    self.new_table_name, dump_after_checksum=self.dump_after_checksum
+                )
 
-            log.info("3. Comparing old and new checksums")
-            self.compare_checksum(old_table_checksum, new_table_checksum)
+            if old_table_checksum is not None:
+                log.info("3. Comparing old and new checksums")
+                self.compare_checksum(old_table_checksum, new_table_checksum)
 
         self.last_checksumed_id = self.last_replayed_id
         self.record_checksum()
@@ -3290,6 +4311,9 @@ class CopyPayload(Payload):
         @type  checksum:  bool
 
         """
+        if self.skip_triggers:
+            log.info("No changes to catch up, because --skip-triggers is specified")
+            return
         log.info(
             "Replay at most {} more round(s) until we can finish in {} "
             "seconds".format(self.replay_max_attempt, self.replay_timeout)
@@ -3382,25 +4406,31 @@ class CopyPayload(Payload):
         # Generate a column string which contains all non-changed columns
         # wrapped with checksum function.
         checksum_result = []
-        id_limit = self.last_checksumed_id
+        # This query only uses PK for the join condition, so don't exclude
+        # them from the checksum itself.
+        column_list = self.checksum_column_list(exclude_pk=False)
         # Using the same batch size for checksum as we used for replaying
-        while id_limit < self.last_replayed_id:
+        id_limits = range(
+            self.last_checksumed_id, self.last_replayed_id, self.replay_batch_size
+        )
+        # Checksum several windows in a single query to save round trips
+        per_query = constant.CHECKSUM_REPLAY_WINDOWS_PER_QUERY
+        for batch_start in range(0, len(id_limits), per_query):
             result = self.query(
-                sql.checksum_by_replay_chunk(
+                sql.checksum_by_replay_chunk_batch(
                     table_name,
                     self.delta_table_name,
-                    # This query only uses PK for the join condition, so don't
-                    # exclude them from the checksum itself.
-                    self.checksum_column_list(exclude_pk=False),
+                    column_list,
                     self._pk_for_filter,
                     self.IDCOLNAME,
-                    id_limit,
+                    id_limits[batch_start : batch_start + per_query],
                     self.last_replayed_id,
                     self.replay_batch_size,
                 )
             )
-            checksum_result.append(result[0])
-            id_limit += self.replay_batch_size
+            for row in result:
+                row.pop("_osc_window")
+                checksum_result.append(row)
         return checksum_result
 
     @wrap_hook
@@ -3427,6 +4457,16 @@ class CopyPayload(Payload):
         # have to skip here
         elif self.is_full_table_dump:
             return
+        # Rows which haven't been touched since last round still have the
+        # checksum we've compared back then
+        elif self.last_checksumed_id == self.last_replayed_id:
+            log.info(
+                "No change has been replayed since last checksum at change "
+                "ID: {}, skip".format(self.last_checksumed_id)
+            )
+            if not single_trx:
+                self.commit()
+            return
         else:
             log.info(
                 "Running checksum for rows have been changed since "
@@ -3444,9 +4484,7 @@ class CopyPayload(Payload):
             self.commit()
         self.compare_checksum(old_table_checksum, new_table_checksum)
         self.last_checksumed_id = self.last_replayed_id
-        self.stats["time_in_delta_checksum"] = self.stats.setdefault(
-            "time_in_delta_checksum", 0
-        ) + (time.time() - start_time)
+        self.stats["time_in_delta_checksum"] += time.time() - start_time
 
         self.record_checksum()
 
@@ -3576,55 +4614,109 @@ class CopyPayload(Payload):
             return True
         log.info("== Stage 6: Swap table ==")
         self.stop_slave_sql()
-        self.execute_sql(sql.set_session_variable("autocommit"), (0,))
-        self.start_transaction()
-        stage_start_time = time.time()
-        self.lock_tables((self.new_table_name, self.table_name, self.delta_table_name))
-        log.info("Final round of replay before swap table")
-        self.checksum_required_for_replay = False
-        self.replay_changes(single_trx=True, holding_locks=True)
-        # We will not run delta checksum here, because there will be an error
-        # like this, if we run a nested query using `NOT EXISTS`:
-        # SQL execution error: [1100] Table 't' was not locked with LOCK TABLES
-        if self.mysql_version.is_mysql8:
-            # mysql 8.0 supports atomic rename inside WRITE locks
-            self.execute_sql(
-                sql.rename_all_tables(
-                    orig_name=self.table_name,
-                    old_name=self.renamed_table_name,
-                    new_name=self.new_table_name,
-                )
-            )
-            self.table_swapped = True
-            self.add_drop_table_entry(self.renamed_table_name)
-            log.info(
-                "Renamed {} TO {}, {} TO {}".format(
-                    self.table_name,
-                    self.renamed_table_name,
-                    self.new_table_name,
-                    self.table_name,
+        # Save a round trip for each statement around the table lock. LOCK
+        # TABLES is still sent on its own, as it needs the kill timer
+        statements = [(sql.set_session_variable("autocommit"), (0,))]
+        if self.cut_over_lock_wait_timeout is not None:
+            statements.append(
+                (
+                    sql.set_session_variable("lock_wait_timeout"),
+                    (self.cut_over_lock_wait_timeout,),
                 )
             )
-        else:
-            self.execute_sql(sql.rename_table(self.table_name, self.renamed_table_name))
-            log.info(
-                "Renamed {} TO {}".format(self.table_name, self.renamed_table_name)
+        statements.append((sql.start_transaction, ()))
+        # The shortened lock_wait_timeout must not outlive the swap, even if
+        # it fails half way
+        lock_wait_timeout_restored = self.cut_over_lock_wait_timeout is None
+        try:
+            self.execute_sql_multi(statements)
+            self.under_transaction = True
+            stage_start_time = time.time()
+            self.lock_tables(
+                (self.new_table_name, self.table_name, self.delta_table_name)
             )
-            self.table_swapped = True
-            self.add_drop_table_entry(self.renamed_table_name)
-            self.execute_sql(sql.rename_table(self.new_table_name, self.table_name))
-            log.info("Renamed {} TO {}".format(self.new_table_name, self.table_name))
+            if self.skip_triggers:
+                self.check_no_writes()
+            log.info("Final round of replay before swap table")
+            self.checksum_required_for_replay = False
+            self.replay_changes(single_trx=True, holding_locks=True)
+            # We will not run delta checksum here, because there will be an error
+            # like this, if we run a nested query using `NOT EXISTS`:
+            # SQL execution error: [1100] Table 't' was not locked with LOCK TABLES
+            if self.mysql_version.is_mysql8:
+                # mysql 8.0 supports atomic rename inside WRITE locks
+                self.execute_sql(
+                    sql.rename_all_tables(
+                        orig_name=self.table_name,
+                        old_name=self.renamed_table_name,
+                        new_name=self.new_table_name,
+                    )
+                )
+                self.table_swapped = True
+                self.add_drop_table_entry(self.renamed_table_name)
+                log.info(
+                    "Renamed {} TO {}, {} TO {}".format(
+                        self.table_name,
+                        self.renamed_table_name,
+                        self.new_table_name,
+                        self.table_name,
+                    )
+                )
+            else:
+                # RENAME TABLE is not allowed under LOCK TABLES before 8.0. Send
+                # both renames in a single round trip instead, so that the
+                # original table name is only missing for as long as the server
+                # takes to execute them. If the second one fails, rename_back
+                # finds out from the tables that exist whether the first one
+                # needs to be reverted
+                self.table_swapped = True
+                self.add_drop_table_entry(self.renamed_table_name)
+                self.execute_sql_multi(
+                    [
+                        (
+                            sql.rename_table(self.table_name, self.renamed_table_name),
+                            (),
+                        ),
+                        (sql.rename_table(self.new_table_name, self.table_name), ()),
+                    ]
+                )
+                log.info(
+                    "Renamed {} TO {}, {} TO {}".format(
+                        self.table_name,
+                        self.renamed_table_name,
+                        self.new_table_name,
+                        self.table_name,
+                    )
+                )
 
-        log.info("Table has successfully swapped, new schema takes effect now")
-        self._cleanup_payload.remove_drop_table_entry(
-            self._current_db, self.new_table_name
-        )
-        self.commit()
-        self.unlock_tables()
-        self.stats["time_in_lock"] = self.stats.setdefault("time_in_lock", 0) + (
-            time.time() - stage_start_time
-        )
-        self.execute_sql(sql.set_session_variable("autocommit"), (1,))
+            log.info("Table has successfully swapped, new schema takes effect now")
+            self._cleanup_payload.remove_drop_table_entry(
+                self._current_db, self.new_table_name
+            )
+            self.execute_sql_multi([(sql.commit, ()), (sql.unlock_tables, ())])
+            self.under_transaction = False
+            log.info("Table(s) unlocked")
+            self.stats["time_in_lock"] += time.time() - stage_start_time
+            if not lock_wait_timeout_restored:
+                self.execute_sql(
+                    sql.set_session_variables(["autocommit", "lock_wait_timeout"]),
+                    (1, self.mysql_vars["lock_wait_timeout"]),
+                )
+                lock_wait_timeout_restored = True
+            else:
+                self.execute_sql(sql.set_session_variable("autocommit"), (1,))
+        finally:
+            if not lock_wait_timeout_restored:
+                # Don't let a failed restore hide the error of the swap itself
+                try:
+                    self.execute_sql(
+                        sql.set_session_variable("lock_wait_timeout"),
+                        (self.mysql_vars["lock_wait_timeout"],),
+                    )
+                except MySQLdb.MySQLError as e:
+                    log.error(
+                        "Failed to restore lock_wait_timeout after swap: {}".format(e)
+                    )
         self.start_slave_sql()
         self.stats["swap_table_progress"] = "Swap table finishes"
 
@@ -3657,6 +4749,7 @@ class CopyPayload(Payload):
                 self.enable_ttl_for_myrocks()
             self.release_osc_lock()
             self.stop_tracking_table_timestamp()
+            self.close_conn_pool()
             self.close_conn()
         except Exception:
             log.exception(
@@ -3670,6 +4763,13 @@ class CopyPayload(Payload):
         self._cleanup_payload.cleanup(self._current_db)
         # clean the gaps in the range chain because we might be in a loop.
         self._replayed_chg_ids = util.RangeChain()
+        # Statements rendered for this table can't be used for the next one
+        self._replay_sqls = None
+        self._replay_insert_range_sql = None
+        self._load_sql = None
+        self._table_stats = None
+        self._loaded_while_dump = False
+        self._load_finished_at = None
         self.last_replayed_id = 0
         self.last_checksumed_id = 0
         self.current_checksum_record = -1
@@ -3711,6 +4811,31 @@ class CopyPayload(Payload):
         self.swap_tables()
         self.reset_no_pk_creation()
 
+    def cleanup_after_failure(self, errnum=None):
+        """
+        Clean up what OSC has left behind after run_ddl failed. `errnum` is
+        the MySQL error number if the failure came from a SQL execution
+        """
+        # We want keep the temporary table for further investigation
+        if self.keep_tmp_table:
+            return
+        # 2013 stands for lost connection to MySQL
+        # 2006 stands for MySQL has gone away
+        # Both means we have been killed
+        if errnum in (2006, 2013) and self.skip_cleanup_after_kill:
+            # We can skip dropping table, and removing files.
+            # However leaving trigger around may break
+            # replication which is really bad. So trigger is the only
+            # thing we need to clean up in this case
+            self._cleanup_payload.remove_drop_table_entry(
+                self._current_db, self.new_table_name
+            )
+            self._cleanup_payload.remove_drop_table_entry(
+                self._current_db, self.delta_table_name
+            )
+            self._cleanup_payload.remove_all_file_entries()
+        self.cleanup()
+
     @wrap_hook
     def run_ddl(self, db, sql):
         try:
@@ -3729,13 +4854,21 @@ class CopyPayload(Payload):
                 return
             self.unblock_no_pk_creation()
             self.pre_osc_check()
-            self.create_delta_table()
-            self.create_copy_table()
+            if self.can_use_native_alter() and self.native_alter():
+                self.release_osc_lock()
+                self.stats["wall_time"] = time.time() - time_started
+                return
+            self.create_tables()
             self.create_triggers()
             self.record_table_timestamp()
+            if self.can_load_while_dump():
+                # Loading starts along with the dump, and the snapshot
+                # transaction can't be interrupted by DDL
+                self.drop_non_unique_indexes()
             self.start_snapshot()
             self.dump_table()
-            self.drop_non_unique_indexes()
+            if not self.can_load_while_dump():
+                self.drop_non_unique_indexes()
             self.load_data()
             self.recreate_non_unique_indexes()
             self.analyze_table()
@@ -3755,29 +4888,13 @@ class CopyPayload(Payload):
         ) as e:
             errnum, errmsg = e.args
             log.error(
-                "SQL execution error: [{}] {}\n"
-                "When executing: {}\n"
-                "With args: {}".format(
-                    errnum, errmsg, self._sql_now, self._sql_args_now
-                )
+                "SQL execution error: [%s] %s\nWhen executing: %s\nWith args: %s",
+                errnum,
+                errmsg,
+                self._sql_now,
+                self.sql_args_for_log(),
             )
-            # 2013 stands for lost connection to MySQL
-            # 2006 stands for MySQL has gone away
-            # Both means we have been killed
-            if errnum in (2006, 2013) and self.skip_cleanup_after_kill:
-                # We can skip dropping table, and removing files.
-                # However leaving trigger around may break
-                # replication which is really bad. So trigger is the only
-                # thing we need to clean up in this case
-                self._cleanup_payload.remove_drop_table_entry(
-                    self._current_db, self.new_table_name
-                )
-                self._cleanup_payload.remove_drop_table_entry(
-                    self._current_db, self.delta_table_name
-                )
-                self._cleanup_payload.remove_all_file_entries()
-            if not self.keep_tmp_table:
-                self.cleanup()
+            self.cleanup_after_failure(errnum)
             raise OSCError(
                 "GENERIC_MYSQL_ERROR",
                 {
@@ -3793,9 +4910,7 @@ class CopyPayload(Payload):
                     "-" * 10
                 )
             )
-            # We want keep the temporary table for further investigation
-            if not self.keep_tmp_table:
-                self.cleanup()
+            self.cleanup_after_failure()
             if not isinstance(e, OSCError):
                 # It's a python exception
                 raise OSCError("OSC_INTERNAL_ERROR", {"msg": str(e)})
@@ -39,11 +39,11 @@ class DirectPayload(Payload):
         except (MySQLdb.OperationalError, MySQLdb.ProgrammingError) as e:
             errnum, errmsg = e.args
             log.error(
-                "SQL execution error: [{}] {}\n"
-                "When executing: {}\n"
-                "With args: {}".format(
-                    errnum, errmsg, self._sql_now, self._sql_args_now
-                )
+                "SQL execution error: [%s] %s\nWhen executing: %s\nWith args: %s",
+                errnum,
+                errmsg,
+                self._sql_now,
+                self.sql_args_for_log(),
             )
             raise OSCError(
                 "GENERIC_MYSQL_ERROR",
@@ -31,6 +31,9 @@ show_processlist = "SHOW FULL PROCESSLIST"
 show_slave_status = "SHOW SLAVE STATUS"
 show_status = "SHOW STATUS LIKE %s "
 select_max_statement_time = "SELECT MAX_STATEMENT_TIME=1000 1"
+select_outfile_dirs = (
+    "SELECT @@secure_file_priv AS secure_file_priv, @@datadir AS datadir"
+)
 
 table_existence = (
     " SELECT 1 "
@@ -39,6 +42,13 @@ table_existence = (
     "   c1.TABLE_SCHEMA = %s "
 )
 
+existing_tables = (
+    " SELECT DISTINCT c1.TABLE_NAME "
+    " FROM information_schema.COLUMNS c1 "
+    " WHERE c1.TABLE_NAME IN %s AND "
+    "   c1.TABLE_SCHEMA = %s "
+)
+
 trigger_existence = (
     "SELECT TRIGGER_NAME, ACTION_TIMING, EVENT_MANIPULATION "
     "FROM information_schema.TRIGGERS "
@@ -47,9 +57,11 @@ trigger_existence = (
     "EVENT_OBJECT_SCHEMA = %s "
 )
 
+# A table without partitions still has one row, with a NULL PARTITION_NAME
 fetch_partition = (
     "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
-    "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s"
+    "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s "
+    "AND PARTITION_NAME IS NOT NULL AND PARTITION_NAME != 'None'"
 )
 
 fetch_partition_value = (
@@ -80,6 +92,12 @@ table_avg_row_len = (
     "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s"
 )
 
+innodb_table_stats_age = (
+    "SELECT n_rows, TIMESTAMPDIFF(SECOND, last_update, NOW()) AS stats_age "
+    "FROM mysql.innodb_table_stats "
+    "WHERE database_name = %s AND table_name = %s"
+)
+
 partition_method = (
     "SELECT MIN(PARTITION_METHOD) pm "
     "FROM information_schema.PARTITIONS "
@@ -283,10 +301,6 @@ def show_create_table(table_name) -> str:
     return "SHOW CREATE TABLE `{}`".format(escape(table_name))
 
 
-def show_table_stats(db_name) -> str:
-    return "SHOW TABLE STATUS IN `{}` LIKE %s".format(escape(db_name))
-
-
 def get_myrocks_table_dump_size() -> str:
     """
     Return raw table data size without indexes as it would be dumped without
@@ -315,6 +329,7 @@ def create_delta_table(
     mysql_engine,
     old_column_list,
     old_table_name,
+    old_cols_str: Optional[str] = None,
 ) -> str:
     return (
         "CREATE TABLE `{}` "
@@ -327,7 +342,7 @@ def create_delta_table(
         escape(dml_col_name),
         escape(id_col_name),
         mysql_engine,
-        list_to_col_str(old_column_list),
+        old_cols_str or list_to_col_str(old_column_list),
         escape(old_table_name),
     )
 
@@ -346,6 +361,7 @@ def create_insert_trigger(
     dml_col_name,
     old_column_list,
     dml_type_insert,
+    old_cols_str: Optional[str] = None,
 ) -> str:
     return (
         "CREATE TRIGGER `{}` AFTER INSERT ON `{}` FOR EACH ROW "
@@ -355,7 +371,7 @@ def create_insert_trigger(
             escape(table_name),
             escape(delta_table_name),
             escape(dml_col_name),
-            list_to_col_str(old_column_list),
+            old_cols_str or list_to_col_str(old_column_list),
             dml_type_insert,
             column_name_with_tbl_prefix(old_column_list, "NEW"),
         )
@@ -369,6 +385,7 @@ def create_delete_trigger(
     dml_col_name,
     old_column_list,
     dml_type_delete,
+    old_cols_str: Optional[str] = None,
 ) -> str:
     return (
         "CREATE TRIGGER `{}` AFTER DELETE ON `{}` FOR EACH ROW "
@@ -378,7 +395,7 @@ def create_delete_trigger(
             escape(table_name),
             escape(delta_table_name),
             escape(dml_col_name),
-            list_to_col_str(old_column_list),
+            old_cols_str or list_to_col_str(old_column_list),
             dml_type_delete,
             column_name_with_tbl_prefix(old_column_list, "OLD"),
         )
@@ -395,7 +412,9 @@ def create_update_trigger(
     dml_type_delete,
     dml_type_insert,
     pk_list,
+    old_cols_str: Optional[str] = None,
 ) -> str:
+    old_cols_str = old_cols_str or list_to_col_str(old_column_list)
     return (
         "CREATE TRIGGER `{}` AFTER UPDATE ON `{}` FOR EACH ROW "
         "IF ({}) THEN "
@@ -411,12 +430,12 @@ def create_update_trigger(
             get_match_clause("OLD", "NEW", pk_list, separator=" AND "),
             escape(delta_table_name),
             escape(dml_col_name),
-            list_to_col_str(old_column_list),
+            old_cols_str,
             dml_type_update,
             column_name_with_tbl_prefix(old_column_list, "NEW"),
             escape(delta_table_name),
             escape(dml_col_name),
-            list_to_col_str(old_column_list),
+            old_cols_str,
             dml_type_delete,
             column_name_with_tbl_prefix(old_column_list, "OLD"),
             dml_type_insert,
@@ -425,6 +444,27 @@ def create_update_trigger(
     )
 
 
+def get_metadata_lock_holders() -> str:
+    """
+    Processlist ids of sessions, other than this one and the one given, which
+    hold a metadata lock on any of the given tables. Needs the
+    wait/lock/metadata/sql/mdl instrument in performance_schema, which is
+    only enabled by default since 8.0
+    """
+    return (
+        "SELECT DISTINCT t.PROCESSLIST_ID AS id "
+        "FROM performance_schema.metadata_locks m "
+        "JOIN performance_schema.threads t "
+        "ON t.THREAD_ID = m.OWNER_THREAD_ID "
+        "WHERE m.OBJECT_TYPE = 'TABLE' "
+        "AND m.OBJECT_SCHEMA = %s "
+        "AND m.OBJECT_NAME IN %s "
+        "AND m.LOCK_STATUS = 'GRANTED' "
+        "AND t.PROCESSLIST_ID != CONNECTION_ID() "
+        "AND t.PROCESSLIST_ID != %s"
+    )
+
+
 def lock_tables(tables) -> str:
     lock_sql = "LOCK TABLE "
     lock_sql += ", ".join(
@@ -488,6 +528,8 @@ def select_full_table_into_file_by_chunk(
     where_filter,
     idx_name: str = "PRIMARY",
     enable_outfile_compression: bool = False,
+    pk_cols_str: Optional[str] = None,
+    non_pk_cols_str: Optional[str] = None,
 ) -> str:
     assign = ", ".join(assign_range_end_vars(old_pk_list, range_end_vars_array))
     if use_where:
@@ -503,7 +545,9 @@ def select_full_table_into_file_by_chunk(
             where_clause = ""
 
     if old_non_pk_list:
-        column_name_list = "{}, {}".format(assign, list_to_col_str(old_non_pk_list))
+        column_name_list = "{}, {}".format(
+            assign, non_pk_cols_str or list_to_col_str(old_non_pk_list)
+        )
     else:
         column_name_list = assign
 
@@ -516,7 +560,7 @@ def select_full_table_into_file_by_chunk(
             escape(table_name),
             idx_name,
             where_clause,
-            list_to_col_str(old_pk_list),
+            pk_cols_str or list_to_col_str(old_pk_list),
             select_chunk_size,
             # NOTE: Do not use chunk size in compression
             #       This is intentional because we want to be able to predictably
@@ -549,7 +593,10 @@ def dump_table_stmt(
 
 
 def load_data_infile(
-    table_name, col_list, ignore: bool = False, enable_outfile_compression: bool = False
+    table_name,
+    col_list,
+    ignore: bool = False,
+    enable_outfile_compression: bool = False,
 ) -> str:
     ignore_str = "IGNORE" if ignore else ""
     return "LOAD DATA INFILE %s {} INTO TABLE `{}`{} CHARACTER SET BINARY ({})".format(
@@ -565,8 +612,20 @@ def load_data_infile(
     )
 
 
-def drop_index(idx_name, table_name) -> str:
-    return "DROP INDEX `{}` ON `{}`".format(escape(idx_name), escape(table_name))
+def drop_indexes(table_name, idx_names) -> str:
+    """Generate sql to drop indexes using a single ALTER TABLE
+
+    @param param:  a list of index names to drop
+    @type  param:  [string]
+
+    @return:  sql to drop indexes
+    @rtype :  string
+
+    """
+    return "ALTER TABLE `{}` {}".format(
+        escape(table_name),
+        ", ".join("DROP INDEX `{}`".format(escape(name)) for name in idx_names),
+    )
 
 
 def insert_into_select_from(
@@ -608,6 +667,16 @@ def replay_delete_row(
     )
 
 
+def replay_delete_by_pk(new_table_name, pk_name) -> str:
+    """
+    Delete rows from the new table by the values of its single column
+    primary key, which saves joining the delta table
+    """
+    return "DELETE FROM `{}` WHERE `{}` IN %s".format(
+        escape(new_table_name), escape(pk_name)
+    )
+
+
 def replay_insert_row(
     old_column_list, new_table_name, delta_table_name, id_col_name, ignore: str = False
 ) -> str:
@@ -627,6 +696,29 @@ def replay_insert_row(
     )
 
 
+def replay_insert_range(
+    old_column_list, new_table_name, delta_table_name, id_col_name, ignore: str = False
+) -> str:
+    """
+    Same as replay_insert_row, but for a contiguous range of IDs, which
+    doesn't need to be shipped to MySQL one by one
+    """
+    ignore = "IGNORE" if ignore else ""
+    return (
+        "INSERT {ignore} INTO `{new}` ({cols})"
+        "SELECT {cols} FROM `{delta}` FORCE INDEX (PRIMARY) WHERE "
+        "`{delta}`.`{id_col}` BETWEEN %s AND %s "
+    ).format(
+        **{
+            "ignore": ignore,
+            "cols": list_to_col_str(old_column_list),
+            "new": escape(new_table_name),
+            "delta": escape(delta_table_name),
+            "id_col": escape(id_col_name),
+        }
+    )
+
+
 def replay_update_row(
     old_non_pk_column_list,
     new_table_name,
@@ -661,6 +753,51 @@ def replay_update_row(
     )
 
 
+def replay_updates_by_ids(
+    old_non_pk_column_list,
+    new_table_name,
+    delta_table_name,
+    ignore: str,
+    id_col_name,
+    pk_list,
+    mismatch_pk_charset,
+) -> str:
+    """
+    Same as replay_update_row, but joins the new table against a derived
+    table of the given delta rows, so that a whole group of updates on
+    different primary keys can be replayed in one statement
+    """
+    ignore = "IGNORE" if ignore else ""
+    select_cols = list(pk_list) + [
+        col for col in old_non_pk_column_list if col not in pk_list
+    ]
+    return (
+        "UPDATE {ignore} `{new}` JOIN ("
+        "SELECT {cols} FROM `{delta}` FORCE INDEX (PRIMARY) "
+        "WHERE `{delta}`.`{id_col}` IN %s"
+        ") AS `{delta}` ON {join_clause} "
+        "SET {set} "
+    ).format(
+        **{
+            "ignore": ignore,
+            "new": escape(new_table_name),
+            "delta": escape(delta_table_name),
+            "cols": list_to_col_str(select_cols),
+            "id_col": escape(id_col_name),
+            "join_clause": get_match_clause(
+                new_table_name,
+                delta_table_name,
+                pk_list,
+                separator=" AND ",
+                mismatch_pk_charset=mismatch_pk_charset,
+            ),
+            "set": get_match_clause(
+                new_table_name, delta_table_name, old_non_pk_column_list, separator=", "
+            ),
+        }
+    )
+
+
 def get_chg_row(
     id_col_name, dml_col_name, tmp_table_include_id, primary_key_list
 ) -> str:
@@ -724,6 +861,32 @@ def get_replay_row_ids(
     )
 
 
+def online_alter(table_name, alter_sql) -> str:
+    """
+    Ask MySQL to run the given ALTER TABLE in place without blocking
+    writes, or fail immediately if it can't.
+    The options go right after the table name, because nothing is allowed
+    to follow a partition clause
+    """
+    prefix = "ALTER TABLE `{}` ".format(escape(table_name))
+    return "{}ALGORITHM=INPLACE, LOCK=NONE, {}".format(
+        prefix, alter_sql[len(prefix) :]
+    )
+
+
+def get_replay_ids(id_col_name, tmp_table_include_id) -> str:
+    return (
+        "SELECT `{id}` FROM `{table}` "
+        "WHERE `{id}` > %s AND `{id}` <= %s "
+        "ORDER BY `{id}`"
+    ).format(
+        **{
+            "id": escape(id_col_name),
+            "table": escape(tmp_table_include_id),
+        }
+    )
+
+
 def drop_tmp_table(table_name) -> str:
     return "DROP TEMPORARY TABLE `{}`".format(escape(table_name))
 
@@ -736,6 +899,16 @@ def set_session_variable(variable) -> str:
     return "SET SESSION {} = %s".format(variable)
 
 
+def set_session_variables(variables) -> str:
+    """
+    Set several session variables in a single statement, taking one value
+    argument for each of them in order
+    """
+    return "SET SESSION {}".format(
+        ", ".join("{} = %s".format(variable) for variable in variables)
+    )
+
+
 def get_global_variable(variable) -> str:
     return "SHOW GLOBAL VARIABLES LIKE '{}'".format(variable)
 
@@ -778,6 +951,23 @@ def checksum_full_table(table_name, columns) -> str:
     return checksum_sql
 
 
+def checksum_full_table_pair(old_table_name, new_table_name, columns) -> str:
+    """
+    Generate SQL for checksumming data from given columns in both tables in a
+    single query. The checksum row of the old table comes first, followed by
+    the one of the new table, told apart by the `_osc_table` column.
+    """
+    return (
+        "SELECT 0 AS `_osc_table`, `o`.* FROM ({}) AS `o` "
+        "UNION ALL "
+        "SELECT 1 AS `_osc_table`, `n`.* FROM ({}) AS `n` "
+        "ORDER BY `_osc_table`".format(
+            checksum_full_table(old_table_name, columns),
+            checksum_full_table(new_table_name, columns),
+        )
+    )
+
+
 def checksum_full_table_native(table_name, columns) -> str:
     """
     Generate SQL for checksumming data from given columns in table using
@@ -998,6 +1188,41 @@ def checksum_by_replay_chunk(
     )
 
 
+def checksum_by_replay_chunk_batch(
+    table_name,
+    delta_table_name,
+    old_column_list,
+    pk_list,
+    id_col_name,
+    id_limits,
+    max_replayed,
+    chunk_size,
+) -> str:
+    """
+    Run checksum_by_replay_chunk for several windows of the delta table in a
+    single query. Each window is numbered, so that the result rows can be
+    returned in the same order as id_limits
+    """
+    windows = []
+    for idx, id_limit in enumerate(id_limits):
+        windows.append(
+            "SELECT {idx} AS `_osc_window`, `w`.* FROM ({window}) AS `w`".format(
+                idx=idx,
+                window=checksum_by_replay_chunk(
+                    table_name,
+                    delta_table_name,
+                    old_column_list,
+                    pk_list,
+                    id_col_name,
+                    id_limit,
+                    max_replayed,
+                    chunk_size,
+                ),
+            )
+        )
+    return "{} ORDER BY `_osc_window`".format(" UNION ALL ".join(windows))
+
+
 def rename_table(from_name, to_name) -> str:
     return "ALTER TABLE `{}` rename `{}`".format(escape(from_name), escape(to_name))
 
@@ -1043,6 +1268,7 @@ def get_table_timestamp(table_name: str) -> str:
         "SELECT CREATE_TIME AS LATEST_TIME "
         "FROM INFORMATION_SCHEMA.TABLES "
         "WHERE TABLE_CATALOG = 'def' AND "
+        "TABLE_SCHEMA = DATABASE() AND "
         "TABLE_TYPE = 'BASE TABLE' AND "
         "TABLE_NAME = '{}'"
     )
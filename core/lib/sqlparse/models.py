@@ -753,14 +753,15 @@ class Column:
                 mdt = ds_thrift_types.MySQLDataType(
                     generic_type=ds_thrift_types.MySQLDataTypeGeneric.kDatetime
                 )
-        col = ds_thrift_types.MySQLTableColumn(
+        # The struct is built fresh for every call and shares nothing with
+        # this column, so there's no need to copy it before handing it out
+        return ds_thrift_types.MySQLTableColumn(
             name=self.name,
             col_type=mdt,
             index_in_table=col_index_in_table,
             comment=self.comment,
             nullable=self.nullable,
         )
-        return copy.deepcopy(col)
 
 
 class TimestampColumn(Column):
@@ -1193,6 +1194,18 @@ class Table:
     def __ne__(self, other):
         return not self == other
 
+    def clone_with(self, **overrides):
+        """
+        Make a shallow copy of this table object with the given attributes
+        overridden. Child nodes such as columns and indexes are shared with
+        the original object, so only top level attributes should be changed
+        on the returned copy
+        """
+        new_obj = copy.copy(self)
+        for attr, value in overrides.items():
+            setattr(new_obj, attr, value)
+        return new_obj
+
     def to_sql(self):
         """
         A standardize CREATE TABLE statement for creating the table
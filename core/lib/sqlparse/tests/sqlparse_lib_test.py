@@ -91,6 +91,15 @@ class SQLParserTest(BaseSQLParserTest):
         diff = SchemaDiff(tbl1, tbl2).to_sql()
         self.assertFalse(diff)
 
+    def test_clone_with(self):
+        sql = "Create table foo\n" "( column1 int primary key)"
+        tbl = self.parse_function(sql)
+        cloned = tbl.clone_with(name="bar")
+        self.assertEqual(cloned.name, "bar")
+        self.assertEqual(tbl.name, "foo")
+        self.assertEqual(cloned.column_list, tbl.column_list)
+        self.assertIn("CREATE TABLE `bar`", cloned.to_sql())
+
 
 class ModelTableTestCase(BaseModelTableTestCase):
     def setUp(self):
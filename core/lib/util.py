@@ -9,11 +9,15 @@ This source code is licensed under the BSD-style license found in the
 LICENSE file in the root directory of this source tree.
 """
 
+import gc
 import logging
 import os
 import re
 import stat
 import subprocess
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
 
 from .error import OSCError
 
@@ -51,6 +55,27 @@ def sync_dir(dirname):
     os.close(dirfd)
 
 
+def prefetch_file(filepath):
+    """
+    Ask the kernel to start reading the whole file into page cache in the
+    background. Returns whether the hint has been given, as it's only
+    available on some platforms and the file may not be readable by us
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    try:
+        fd = os.open(filepath, os.O_RDONLY)
+    except OSError:
+        return False
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        return True
+    except OSError:
+        return False
+    finally:
+        os.close(fd)
+
+
 def is_file_readable(filepath):
     """
     Check if the file given is readable to the user we are currently running
@@ -143,27 +168,31 @@ class RangeChain:
     A memory efficient class for memorize all the points that we've filled
     within a range containing consecutive natural values.
     Knowing that the missing points are much less than the number of filling
-    points, we only store missing points and record a end point of the range
+    points, we only store missing points and record a end point of the range.
+    Missing points are kept in an unsigned 64-bit array rather than a list of
+    ints, as a single large gap can otherwise take a lot of memory. They are
+    only ever appended in ascending order, so the array stays sorted
     """
 
     def __init__(self):
         self._stop = 0
-        self._gap = []
+        self._gap = array("Q")
 
     def extend(self, points):
         last_point = self._stop
         for current_point in points:
             # If it's consecutive then we should just extend the stop point
             if current_point != last_point + 1:
-                for gap_point in range(last_point + 1, current_point):
-                    self._gap.append(gap_point)
+                self._gap.extend(range(last_point + 1, current_point))
 
             self._stop = current_point
             last_point = current_point
 
     def fill(self, point):
-        if point in self._gap:
-            self._gap.remove(point)
+        # Binary search the sorted gaps rather than scanning them twice
+        idx = bisect_left(self._gap, point)
+        if idx < len(self._gap) and self._gap[idx] == point:
+            del self._gap[idx]
         else:
             if point > self._stop:
                 raise Exception(
@@ -177,7 +206,25 @@ class RangeChain:
                 )
 
     def missing_points(self):
-        return self._gap
+        return self._gap.tolist()
+
+
+@contextmanager
+def gc_paused():
+    """
+    Keep the cyclic garbage collector from running while building a large
+    number of objects that won't become garbage, such as a list of millions
+    of tuples. Otherwise every full collection triggered along the way
+    traverses everything built so far. Reference counting still frees
+    memory as usual
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
 
 
 def dirname_for_db(db_name):
@@ -12,6 +12,7 @@ LICENSE file in the root directory of this source tree.
 import unittest
 from unittest.mock import Mock
 
+from ..lib import constant, sql
 from ..lib.error import OSCError
 from ..lib.payload.base import Payload
 
@@ -42,3 +43,33 @@ class BasePayloadTestCase(unittest.TestCase):
         # Nothing should happen if we skip named lock
         payload.query = Mock(return_value=None)
         self.assertFalse(payload.query.called)
+
+    def test_slave_status_cached_until_sql_thread_stopped(self):
+        payload = Payload()
+        payload.query = Mock(return_value=[{"Slave_SQL_Running": "Yes"}])
+        payload.execute_sql = Mock()
+        self.assertTrue(payload.is_sql_thread_running())
+        payload.check_replication_type()
+        self.assertEqual(payload.query.call_count, 1)
+
+        # The sql_thread state is always read from the server, as it may
+        # have been changed by someone else
+        payload.query = Mock(return_value=[{"Slave_SQL_Running": "No"}])
+        self.assertFalse(payload.is_sql_thread_running())
+        payload.query.assert_called_once_with(sql.show_slave_status)
+
+        # Stopping sql_thread ourselves should invalidate the cache
+        payload.query = Mock(return_value=[{"Slave_SQL_Running": "Yes"}])
+        payload.stop_slave_sql()
+        payload.check_replication_type()
+        self.assertEqual(payload.query.call_count, 2)
+
+    def test_sql_args_for_log_truncated(self):
+        payload = Payload()
+        payload._sql_args_now = ([1, 2],)
+        self.assertEqual(payload.sql_args_for_log(), "([1, 2],)")
+
+        payload._sql_args_now = (list(range(10000)),)
+        args_log = payload.sql_args_for_log()
+        self.assertTrue(args_log.startswith("([0, 1, 2, "))
+        self.assertLess(len(args_log), constant.SQL_ARGS_LOG_MAX_CHARS + 32)
@@ -27,3 +27,15 @@ class CleanupPayloadTestCase(unittest.TestCase):
         path = "/this/is/a/path/"
         payload.add_file_entry(path)
         self.assertEqual(payload.files_to_clean, [path])
+
+    def test_remove_drop_table_entry(self):
+        payload = CleanupPayload()
+        payload.add_drop_table_entry("db", "a")
+        payload.add_drop_table_entry("db", "a")
+        payload.add_drop_trigger_entry("db", "a")
+        payload.add_drop_table_entry("db", "b")
+        payload.remove_drop_table_entry("db", "a")
+        self.assertEqual(
+            [(entry["type"], entry["name"]) for entry in payload.to_drop],
+            [("trigger", "a"), ("table", "b")],
+        )
@@ -11,12 +11,12 @@ LICENSE file in the root directory of this source tree.
 
 import time
 import unittest
-from unittest.mock import MagicMock, Mock
+from unittest.mock import call, MagicMock, Mock, patch
 
 import MySQLdb
 from osc.lib import sql
 
-from ..lib import constant
+from ..lib import constant, util
 from ..lib.error import OSCError
 from ..lib.payload.cleanup import CleanupPayload
 from ..lib.payload.copy import CopyPayload
@@ -34,6 +34,159 @@ class CopyPayloadTestCase(unittest.TestCase):
         payload.range_end_vars_array = ["@ID"]
         return payload
 
+    def test_kill_selects(self):
+        payload = self.payload_setup()
+        conn = Mock()
+        i_s_query = b"SELECT `a$b` FROM information_schema t"
+        conn.get_running_queries = Mock(
+            return_value=[
+                {"Id": 1, "db": "test", "Info": b"SELECT * FROM `a$b`"},
+                {"Id": 2, "db": "test", "Info": b"SELECT * FROM `ab`"},
+                {"Id": 3, "db": "test", "Info": i_s_query},
+                {"Id": 4, "db": "other", "Info": b"SELECT * FROM `a$b`"},
+                {"Id": 5, "db": "test", "Info": None},
+            ]
+        )
+        payload.kill_selects(["a$b"], conn)
+        conn.kill_query_by_id.assert_called_once_with(1)
+
+    def test_kill_lock_blockers_mdl_holders(self):
+        payload = self.payload_setup()
+        payload._current_db = "test"
+        payload._conn = Mock(connection_id=10)
+        conn = Mock()
+        conn.get_running_queries = Mock(return_value=[])
+        conn.query = Mock(return_value=({"id": 11}, {"id": 12}))
+        payload.kill_lock_blockers(["a"], conn)
+        conn.query.assert_not_called()
+
+        payload.kill_metadata_lock_holders = True
+        payload.kill_lock_blockers(["a"], conn)
+        conn.query.assert_called_once_with(
+            sql.get_metadata_lock_holders(), ("test", ("a",), 10)
+        )
+        self.assertEqual(conn.kill_query_by_id.call_args_list, [call(11), call(12)])
+
+    def test_collations_fetched_once(self):
+        payload = self.payload_setup()
+        payload.query = Mock(
+            side_effect=[
+                ({"COLLATION_NAME": "latin1_bin", "CHARACTER_SET_NAME": "latin1"},),
+                ({"COLLATION_NAME": "latin1_bin", "CHARACTER_SET_NAME": "latin1"},),
+                (),
+            ]
+        )
+        for _ in range(2):
+            self.assertEqual(payload.get_collations(), {"latin1_bin": "latin1"})
+            self.assertEqual(
+                payload.get_default_collations(), {"latin1": "latin1_bin"}
+            )
+        self.assertEqual(payload.query.call_count, 3)
+
+    def test_determine_outfile_dir(self):
+        payload = self.payload_setup()
+        payload._current_db_dir = "test"
+        payload.query = Mock(
+            return_value=({"secure_file_priv": "/tmp/", "datadir": "/data/"},)
+        )
+        payload.determine_outfile_dir()
+        self.assertEqual(payload.outfile_dir, "/tmp/")
+        payload.query.assert_called_once_with(sql.select_outfile_dirs)
+
+        payload.outfile_dir = ""
+        payload.query = Mock(
+            return_value=({"secure_file_priv": None, "datadir": "/data/"},)
+        )
+        payload.determine_outfile_dir()
+        self.assertEqual(payload.outfile_dir, "/data/test")
+
+    def test_table_check_single_query(self):
+        payload = self.payload_setup()
+        payload._current_db = "test"
+        payload.query = Mock(return_value=())
+        payload._new_table = parse_create("CREATE TABLE a (ID int primary key)")
+        payload.table_check()
+        payload.query.assert_called_once_with(
+            sql.existing_tables,
+            (
+                (
+                    payload.new_table_name,
+                    payload.delta_table_name,
+                    payload.renamed_table_name,
+                ),
+                "test",
+            ),
+        )
+
+        payload.query = Mock(
+            return_value=({"TABLE_NAME": payload.delta_table_name.upper()},)
+        )
+        with self.assertRaises(OSCError) as err_context:
+            payload.table_check()
+        self.assertEqual(err_context.exception.err_key, "TABLE_ALREADY_EXIST")
+
+    def test_check_disk_size_reads_table_size_once(self):
+        payload = self.payload_setup()
+        payload.outfile_dir = "/tmp"
+        payload.get_table_size = Mock(return_value=100)
+        payload.get_table_size_for_myrocks = Mock(return_value=300)
+        with patch.object(util, "disk_partition_free", return_value=1000):
+            payload.check_disk_size()
+            payload.get_table_size.assert_called_once()
+            payload.get_table_size_for_myrocks.assert_not_called()
+
+            payload._new_table.engine = "ROCKSDB"
+            self.assertEqual(payload.get_expected_dump_size(payload.table_name), 300)
+            payload.get_table_size.assert_called_once()
+
+    def test_table_stats_queried_once(self):
+        payload = self.payload_setup()
+        payload.query = Mock(
+            return_value=(
+                {
+                    "AVG_ROW_LENGTH": 100,
+                    "TABLE_ROWS": 1000,
+                    "DATA_LENGTH": 100000,
+                    "INDEX_LENGTH": 5000,
+                },
+            )
+        )
+        self.assertEqual(payload.get_table_size(payload.table_name), 105000)
+        payload.get_table_chunk_size()
+        self.assertEqual(payload.table_rows, 1000)
+        payload.query.assert_called_once()
+
+    def test_is_var_enabled(self):
+        payload = self.payload_setup()
+        payload.mysql_vars = {"a": "ON", "b": "OFF", "c": "0", "d": "30"}
+        self.assertTrue(payload.is_var_enabled("a"))
+        self.assertFalse(payload.is_var_enabled("b"))
+        self.assertFalse(payload.is_var_enabled("c"))
+        self.assertTrue(payload.is_var_enabled("d"))
+        self.assertFalse(payload.is_var_enabled("missing"))
+
+    def test_prefixed_table_names(self):
+        payload = self.payload_setup()
+        self.assertEqual(payload.new_table_name, constant.NEW_TABLE_PREFIX + "a")
+        self.assertEqual(
+            payload.delete_trigger_name, constant.DELETE_TRIGGER_PREFIX + "a"
+        )
+
+        long_name = "t" * (constant.MAX_TABLE_LENGTH - 5)
+        payload._old_table.name = long_name
+        self.assertEqual(
+            payload.delta_table_name, constant.SHORT_DELTA_TABLE_PREFIX + long_name
+        )
+        self.assertEqual(
+            payload.new_table_name, constant.SHORT_NEW_TABLE_PREFIX + long_name
+        )
+
+        payload._old_table.name = "t" * constant.MAX_TABLE_LENGTH
+        self.assertEqual(
+            payload.renamed_table_name,
+            constant.RENAMED_TABLE_PREFIX + constant.GENERIC_TABLE_NAME,
+        )
+
     def test_init_table_obj_populate_charset_collation(self):
         payload = CopyPayload()
         payload.table_exists = Mock(return_value=True)
@@ -155,6 +308,98 @@ class CopyPayloadTestCase(unittest.TestCase):
         payload.get_collations = Mock(return_value={"latin1_bin": "latin1"})
         payload.create_copy_table()
 
+    def test_add_drop_table_entry_copies_partitions(self):
+        payload = self.payload_setup()
+        payload._cleanup_payload = CleanupPayload()
+        payload.partitions[payload.table_name] = ["p1", "p2"]
+        payload.add_drop_table_entry(payload.table_name)
+        payload._cleanup_payload.to_drop[0]["partitions"].pop()
+        self.assertEqual(payload.partitions[payload.table_name], ["p1", "p2"])
+
+    def test_init_table_obj_table_not_exist(self):
+        payload = CopyPayload()
+        payload.table_exists = Mock()
+        payload.fetch_table_schema = Mock(
+            side_effect=MySQLdb.ProgrammingError(1146, "Table 'test.a' doesn't exist")
+        )
+        payload._new_table = parse_create("CREATE TABLE a (ID int primary key)")
+        with self.assertRaises(OSCError) as err_context:
+            payload.init_table_obj()
+        self.assertEqual(err_context.exception.err_key, "TABLE_NOT_EXIST")
+        payload.table_exists.assert_not_called()
+
+    def test_init_table_obj_skip_partition_fetch(self):
+        payload = CopyPayload()
+        payload.table_exists = Mock(return_value=True)
+        payload.fetch_partitions = Mock(return_value=["p1"])
+        payload._new_table = parse_create("CREATE TABLE a (ID int primary key)")
+        payload.get_default_collations = Mock(return_value={})
+        payload.get_collations = Mock(return_value={})
+
+        payload.fetch_table_schema = Mock(
+            return_value=parse_create("CREATE TABLE a (ID int primary key)")
+        )
+        payload.init_table_obj()
+        self.assertFalse(payload.fetch_partitions.called)
+        self.assertEqual(payload.partitions["a"], [])
+
+        payload.fetch_table_schema = Mock(
+            return_value=parse_create(
+                "CREATE TABLE a (ID int primary key) "
+                "PARTITION BY RANGE (ID) (PARTITION p1 VALUES LESS THAN (10))"
+            )
+        )
+        payload.init_table_obj()
+        payload.fetch_partitions.assert_called_once_with("a")
+        self.assertEqual(payload.partitions["a"], ["p1"])
+
+    def test_create_copy_table_skip_partition_fetch(self):
+        # There's no need to fetch partitions for a table created without
+        # a partition clause
+        payload = self.payload_setup()
+        payload.execute_sql = Mock()
+        payload.fetch_partitions = Mock(return_value=["p1"])
+        payload.add_drop_table_entry = Mock()
+        payload.create_copy_table()
+        self.assertFalse(payload.fetch_partitions.called)
+        self.assertEqual(payload.partitions[payload.new_table_name], [])
+
+    def test_create_tables(self):
+        payload = self.payload_setup()
+        payload._pk_for_filter = ["ID"]
+        payload._pk_for_filter_def = list(payload._old_table.column_list)
+        payload.render_column_lists()
+        calls = Mock()
+        payload.execute_sql = calls.execute_sql
+        payload.add_drop_table_entry = calls.add_drop_table_entry
+        payload.execute_hook = Mock()
+        payload.create_tables()
+        # Each table is registered for cleanup right after it's created
+        self.assertEqual(
+            [name for name, _, _ in calls.mock_calls],
+            [
+                "execute_sql",
+                "add_drop_table_entry",
+                "execute_sql",
+                "execute_sql",
+                "add_drop_table_entry",
+            ],
+        )
+        self.assertIn(payload.delta_table_name, calls.mock_calls[0][1][0])
+        self.assertIn(payload.new_table_name, calls.mock_calls[3][1][0])
+        self.assertEqual(
+            [c[0][0] for c in payload.add_drop_table_entry.call_args_list],
+            [payload.delta_table_name, payload.new_table_name],
+        )
+        hooks = [c[0][0] for c in payload.execute_hook.call_args_list]
+        for hook in (
+            "before_create_delta_table",
+            "after_create_delta_table",
+            "before_create_copy_table",
+            "after_create_copy_table",
+        ):
+            self.assertIn(hook, hooks)
+
     def test_populate_charset_collation_utf8_alias_default_collate(self) -> None:
         payload = CopyPayload()
         payload.get_default_collations = Mock(return_value={"utf8": "utf8_general_ci"})
@@ -796,6 +1041,9 @@ class CopyPayloadTestCase(unittest.TestCase):
 
         payload._new_table = table_obj_both_dropped
         self.assertEqual(payload.dropped_column_name_list, ["id2", "col2"])
+        self.assertEqual(payload.old_column_list, ["id1", "col1"])
+        payload._pk_for_filter = ["id1", "id2"]
+        self.assertEqual(payload.old_non_pk_column_list, ["col1"])
 
     def test_checksum_column_list(self):
         """
@@ -923,6 +1171,15 @@ class CopyPayloadTestCase(unittest.TestCase):
         payload.override_session_vars()
         self.assertFalse(payload.execute_sql.called)
 
+    def test_override_session_vars_in_one_statement(self):
+        payload = self.payload_setup()
+        payload.execute_sql = Mock()
+        payload.session_overrides_str = "var1=v;var2=1"
+        payload.override_session_vars()
+        payload.execute_sql.assert_called_once_with(
+            "SET SESSION var1 = %s, var2 = %s", ("v", "1")
+        )
+
     def test_not_skip_affected_rows_check(self):
         # Exception should be raised if we do not skip affected_rows check
         # and 0 is returned
@@ -942,6 +1199,273 @@ class CopyPayloadTestCase(unittest.TestCase):
         row = {payload.IDCOLNAME: 1}
         payload.replay_insert_row(row, 1)
 
+    def test_load_while_dump(self):
+        payload = self.payload_setup(load_while_dump=True)
+        payload._pk_for_filter = ["ID"]
+        payload.outfile_dir = "/tmp"
+        payload.eta_chunks = 1
+        payload.select_chunk_into_outfile = Mock(side_effect=[3, 2, 0])
+        payload.refresh_range_start = Mock()
+        payload.check_disk_free_space_reserved = Mock()
+        payload.commit = Mock()
+        payload.rm_loaded_chunk = Mock()
+        payload.execute_sql = Mock()
+        payload.execute_hook = Mock()
+        load_conn = Mock()
+        payload.get_load_conn = Mock(return_value=load_conn)
+        payload.select_table_into_outfile()
+        # Every dumped chunk, including the last empty one, has been loaded
+        # on the other connection, through the hooked load_chunk
+        load_sql = payload.load_data_sql(payload.load_column_list())
+        load_conn.execute.assert_has_calls(
+            [call(load_sql, (payload._outfile_name(i),)) for i in (1, 2, 3)]
+        )
+        self.assertEqual(load_conn.execute.call_count, 3)
+        self.assertFalse(payload.execute_sql.called)
+        payload.execute_hook.assert_has_calls(
+            [call("before_load_chunk"), call("after_load_chunk")] * 3
+        )
+        load_conn.close.assert_called_once()
+        self.assertEqual(payload.rm_loaded_chunk.call_count, 3)
+        self.assertTrue(payload._loaded_while_dump)
+
+        payload.load_chunk = Mock()
+        payload.load_data()
+        self.assertFalse(payload.load_chunk.called)
+
+    def test_load_while_dump_error(self):
+        payload = self.payload_setup(load_while_dump=True)
+        payload._pk_for_filter = ["ID"]
+        payload.outfile_dir = "/tmp"
+        payload.eta_chunks = 1
+        payload.select_chunk_into_outfile = Mock(side_effect=[3, 0])
+        payload.refresh_range_start = Mock()
+        payload.check_disk_free_space_reserved = Mock()
+        payload.commit = Mock()
+        load_conn = Mock()
+        load_conn.execute = Mock(side_effect=MySQLdb.OperationalError(1062, "dup"))
+        payload.get_load_conn = Mock(return_value=load_conn)
+        with self.assertRaises(MySQLdb.OperationalError):
+            payload.select_table_into_outfile()
+        self.assertFalse(payload._loaded_while_dump)
+
+    def test_cleanup_resets_rendered_statements(self):
+        # A payload may run several DDLs, statements rendered for one table
+        # must not be reused for the next one
+        payload = self.payload_setup()
+        payload._replay_sqls = {}
+        payload._load_sql = "LOAD DATA ..."
+        payload._cleanup_payload = Mock()
+        payload.close_conn = Mock()
+        payload.rename_back = Mock()
+        payload.start_slave_sql = Mock()
+        payload.release_osc_lock = Mock()
+        payload.stop_tracking_table_timestamp = Mock()
+        payload.cleanup()
+        self.assertIsNone(payload._replay_sqls)
+        self.assertIsNone(payload._load_sql)
+
+    def test_replay_multi_groups(self):
+        # Consecutive groups are sent in one round trip, and each of them is
+        # still checked for affected rows
+        payload = self.payload_setup(replay_multi_statements=True)
+        payload.replay_batch_size = 4
+        payload.execute_sql_multi = Mock(return_value=[2, 2])
+        payload.replay_group = Mock()
+        replay_sqls = {payload.DML_TYPE_INSERT: "INSERT ... IN %s"}
+        batch = [
+            (payload.DML_TYPE_INSERT, [1, 2]),
+            (payload.DML_TYPE_INSERT, [3, 4]),
+        ]
+        payload.flush_replay_batch(replay_sqls, batch)
+        payload.execute_sql_multi.assert_called_once_with(
+            [("INSERT ... IN %s", ([1, 2],)), ("INSERT ... IN %s", ([3, 4],))]
+        )
+        self.assertFalse(payload.replay_group.called)
+        self.assertEqual(batch, [])
+
+        payload.execute_sql_multi = Mock(return_value=[2, 0])
+        with self.assertRaises(OSCError) as err_context:
+            payload.replay_multi_groups(
+                payload.DML_TYPE_INSERT, "INSERT ... IN %s", [[1, 2], [3, 4]]
+            )
+        self.assertEqual(err_context.exception.err_key, "REPLAY_WRONG_AFFECTED")
+
+        # A single group goes through the normal replay path
+        payload.flush_replay_batch(replay_sqls, [(payload.DML_TYPE_INSERT, [5])])
+        payload.replay_group.assert_called_once_with(
+            payload.DML_TYPE_INSERT, "INSERT ... IN %s", [5]
+        )
+
+    def test_adjust_replay_commit_size(self):
+        payload = self.payload_setup(replay_batch_target_time=1)
+        payload.replay_batch_size = 10
+        # Fast commits grow the batch, up to REPLAY_BATCH_MAX_GROWTH times
+        for _ in range(5):
+            payload.adjust_replay_commit_size(0.1)
+        self.assertEqual(
+            payload._replay_commit_size, 10 * constant.REPLAY_BATCH_MAX_GROWTH
+        )
+        self.assertFalse(payload.is_replay_commit_due(20, time.time()))
+        self.assertTrue(payload.is_replay_commit_due(41, time.time()))
+        # A single slow commit is smoothed out, but slow ones keep shrinking it
+        payload.adjust_replay_commit_size(2)
+        self.assertEqual(payload._replay_commit_size, 40)
+        payload.adjust_replay_commit_size(5)
+        self.assertEqual(payload._replay_commit_size, 20)
+
+        # Without a target time the configured batch size is used
+        payload.replay_batch_target_time = 0
+        self.assertTrue(payload.is_replay_commit_due(11, time.time()))
+
+    def swap_payload_setup(self, is_mysql8=True, **payload_kwargs):
+        """
+        Payload with everything around the statements sent by swap_tables
+        mocked out
+        """
+        payload = self.payload_setup(**payload_kwargs)
+        payload.mysql_version = Mock(is_mysql8=is_mysql8)
+        payload.mysql_vars = {"lock_wait_timeout": "31536000"}
+        payload.stop_slave_sql = Mock()
+        payload.start_slave_sql = Mock()
+        payload.lock_tables = Mock()
+        payload.replay_changes = Mock()
+        payload.add_drop_table_entry = Mock()
+        payload._cleanup_payload = Mock()
+        payload.execute_sql = Mock()
+        payload.execute_sql_multi = Mock()
+        return payload
+
+    def test_swap_tables_batches_statements_around_lock(self):
+        payload = self.swap_payload_setup()
+        payload.swap_tables()
+        self.assertEqual(
+            payload.execute_sql_multi.call_args_list,
+            [
+                call(
+                    [
+                        (sql.set_session_variable("autocommit"), (0,)),
+                        (sql.start_transaction, ()),
+                    ]
+                ),
+                call([(sql.commit, ()), (sql.unlock_tables, ())]),
+            ],
+        )
+        self.assertEqual(
+            payload.execute_sql.call_args_list,
+            [
+                call(
+                    sql.rename_all_tables(
+                        orig_name=payload.table_name,
+                        old_name=payload.renamed_table_name,
+                        new_name=payload.new_table_name,
+                    )
+                ),
+                call(sql.set_session_variable("autocommit"), (1,)),
+            ],
+        )
+        self.assertFalse(payload.under_transaction)
+        payload.lock_tables.assert_called_once_with(
+            (payload.new_table_name, payload.table_name, payload.delta_table_name)
+        )
+
+    def test_swap_tables_cut_over_lock_wait_timeout(self):
+        payload = self.swap_payload_setup(cut_over_lock_wait_timeout=2)
+        payload.swap_tables()
+        payload.execute_sql_multi.assert_any_call(
+            [
+                (sql.set_session_variable("autocommit"), (0,)),
+                (sql.set_session_variable("lock_wait_timeout"), (2,)),
+                (sql.start_transaction, ()),
+            ]
+        )
+        payload.execute_sql.assert_called_with(
+            sql.set_session_variables(["autocommit", "lock_wait_timeout"]),
+            (1, "31536000"),
+        )
+
+        # The original lock_wait_timeout is restored even if the swap fails
+        payload.execute_sql = Mock()
+        payload.replay_changes = Mock(side_effect=OSCError("REPLAY_TIMEOUT"))
+        with self.assertRaises(OSCError):
+            payload.swap_tables()
+        payload.execute_sql.assert_called_once_with(
+            sql.set_session_variable("lock_wait_timeout"), ("31536000",)
+        )
+
+        # A failed restore doesn't hide the error of the swap
+        payload.execute_sql = Mock(side_effect=MySQLdb.OperationalError(2006, "gone"))
+        with self.assertRaises(OSCError) as err_context:
+            payload.swap_tables()
+        self.assertEqual(err_context.exception.err_key, "REPLAY_TIMEOUT")
+
+    def test_swap_tables_renames_in_one_round_trip_before_8_0(self):
+        payload = self.swap_payload_setup(is_mysql8=False)
+        payload.swap_tables()
+        renames = [
+            (sql.rename_table(payload.table_name, payload.renamed_table_name), ()),
+            (sql.rename_table(payload.new_table_name, payload.table_name), ()),
+        ]
+        self.assertEqual(
+            payload.execute_sql_multi.call_args_list,
+            [
+                call(
+                    [
+                        (sql.set_session_variable("autocommit"), (0,)),
+                        (sql.start_transaction, ()),
+                    ]
+                ),
+                call(renames),
+                call([(sql.commit, ()), (sql.unlock_tables, ())]),
+            ],
+        )
+        payload.execute_sql.assert_called_once_with(
+            sql.set_session_variable("autocommit"), (1,)
+        )
+        self.assertTrue(payload.table_swapped)
+        payload.add_drop_table_entry.assert_called_once_with(
+            payload.renamed_table_name
+        )
+
+    def test_is_replay_commit_due(self):
+        payload = self.payload_setup()
+        payload.replay_batch_size = 10
+        now = time.time()
+        self.assertFalse(payload.is_replay_commit_due(10, now - 100))
+        self.assertTrue(payload.is_replay_commit_due(11, now))
+
+        payload = self.payload_setup(replay_commit_interval=1)
+        payload.replay_batch_size = 10
+        self.assertFalse(payload.is_replay_commit_due(100, now + 100))
+        self.assertTrue(payload.is_replay_commit_due(1, now - 2))
+        # Nothing to commit yet
+        self.assertFalse(payload.is_replay_commit_due(0, now - 2))
+
+    def test_replay_sql_built_once(self):
+        payload = self.payload_setup()
+        sql_table = """
+        CREATE TABLE a (
+            ID int primary key,
+            data varchar(10)
+        )
+        """
+        payload._old_table = parse_create(sql_table)
+        payload._new_table = parse_create(sql_table)
+        payload._pk_for_filter = ["ID"]
+        with patch.object(sql, "replay_delete_row", wraps=sql.replay_delete_row) as m:
+            first = payload._ensure_replay_sql()
+            second = payload._ensure_replay_sql()
+        m.assert_called_once()
+        self.assertIs(first, second)
+        self.assertEqual(
+            set(first),
+            {
+                payload.DML_TYPE_DELETE,
+                payload.DML_TYPE_UPDATE,
+                payload.DML_TYPE_INSERT,
+            },
+        )
+
     def test_is_rbr_safe_stmt(self):
         # is_trigger_rbr_safe should be True if STATEMENT binlog_format
         # is being used
@@ -965,6 +1489,656 @@ class CopyPayloadTestCase(unittest.TestCase):
         payload.mysql_vars["sql_log_bin_triggers"] = "ON"
         self.assertFalse(payload.is_trigger_rbr_safe)
 
+    def test_adjust_select_chunk_size(self):
+        payload = self.payload_setup(dump_chunk_target_time=0.5)
+        payload.select_chunk_size = 1000
+        payload.max_select_chunk_size = 3000
+
+        # Fast chunks will be doubled at most, but never beyond the max size
+        # The adjusted size is always kept odd for the checksum to work
+        payload.adjust_select_chunk_size(0.01)
+        self.assertEqual(payload.select_chunk_size, 2001)
+        payload.adjust_select_chunk_size(0.01)
+        self.assertEqual(payload.select_chunk_size, 3001)
+
+        # Slow chunks will be halved at most
+        payload.adjust_select_chunk_size(10)
+        self.assertEqual(payload.select_chunk_size, 1501)
+        payload.adjust_select_chunk_size(0.6)
+        self.assertEqual(payload.select_chunk_size, 1251)
+
+    def test_can_use_native_alter(self):
+        payload = self.payload_setup()
+        payload.table_rows = 10
+        # Disabled by default
+        self.assertFalse(payload.can_use_native_alter())
+
+        payload = self.payload_setup(native_alter_below_rows=100)
+        payload.table_rows = 10
+        self.assertTrue(payload.can_use_native_alter())
+        payload.table_rows = 1000
+        self.assertFalse(payload.can_use_native_alter())
+
+        payload = self.payload_setup(native_alter_below_rows=100, rebuild=True)
+        payload.table_rows = 10
+        self.assertFalse(payload.can_use_native_alter())
+
+    def test_native_alter(self):
+        payload = self.payload_setup(native_alter_below_rows=100)
+        payload._new_table = parse_create(
+            "CREATE TABLE a (ID int primary key, foo int)"
+        )
+        payload.execute_sql = Mock()
+        payload.ddl_guard = Mock()
+        payload.wait_until_slow_query_finish = Mock()
+        self.assertTrue(payload.native_alter())
+        payload.ddl_guard.assert_called_once()
+        alter_sql = payload.execute_sql.call_args[0][0]
+        self.assertTrue(
+            alter_sql.startswith("ALTER TABLE `a` ALGORITHM=INPLACE, LOCK=NONE, ")
+        )
+
+        # Fall back to the copy process if it can't be done online
+        payload.execute_sql = Mock(
+            side_effect=MySQLdb.OperationalError(1846, "LOCK=NONE is not supported")
+        )
+        self.assertFalse(payload.native_alter())
+
+        payload.execute_sql = Mock(side_effect=MySQLdb.OperationalError(1105, "abc"))
+        with self.assertRaises(MySQLdb.OperationalError):
+            payload.native_alter()
+
+    def test_native_alter_with_partition_clause(self):
+        payload = self.payload_setup(native_alter_below_rows=100)
+        payload._new_table = parse_create(
+            "CREATE TABLE a (ID int primary key, foo int) "
+            "PARTITION BY HASH(ID) PARTITIONS 4"
+        )
+        payload.execute_sql = Mock()
+        payload.ddl_guard = Mock()
+        payload.wait_until_slow_query_finish = Mock()
+        self.assertTrue(payload.native_alter())
+        alter_sql = payload.execute_sql.call_args[0][0]
+        self.assertTrue(
+            alter_sql.startswith("ALTER TABLE `a` ALGORITHM=INPLACE, LOCK=NONE, ")
+        )
+        self.assertNotIn("LOCK=NONE", alter_sql[alter_sql.find("PARTITION") :])
+
+    def test_load_chunk_reuses_load_sql(self):
+        payload = self.payload_setup()
+        payload.skip_chunk_cleanup = True
+        payload.load_chunk_file = Mock()
+        payload.load_chunk(["ID"], 1)
+        payload.load_chunk(["ID"], 2)
+
+        self.assertEqual(payload.load_chunk_file.call_count, 2)
+        first_sql = payload.load_chunk_file.call_args_list[0][0][1]
+        second_sql = payload.load_chunk_file.call_args_list[1][0][1]
+        self.assertIs(first_sql, second_sql)
+        self.assertIn("(`ID`)", first_sql)
+        self.assertTrue(payload.load_chunk_file.call_args_list[1][0][0].endswith(".2"))
+
+    def test_load_data_deletes_chunks_in_background(self):
+        payload = self.payload_setup()
+        payload._pk_for_filter = ["ID"]
+        payload.outfile_suffix_start = 1
+        payload.outfile_suffix_end = 3
+        payload.load_chunk_file = Mock()
+        payload.log_load_progress = Mock()
+        payload.rm_file = Mock(return_value=True)
+        payload._cleanup_payload = Mock()
+        with patch.object(util, "sync_dir"):
+            payload.load_data()
+
+        self.assertEqual(payload.rm_file.call_count, 3)
+        self.assertEqual(payload._cleanup_payload.remove_file_entry.call_count, 3)
+        self.assertIsNone(payload._delete_queue)
+
+        # A failed deletion is raised once all the chunks are loaded
+        payload.rm_file = Mock(side_effect=OSCError("SHELL_TIMEOUT", {"cmd": "rm"}))
+        payload.load_chunk_file = Mock()
+        with self.assertRaises(OSCError):
+            payload.load_data()
+        self.assertEqual(payload.load_chunk_file.call_count, 3)
+        self.assertEqual(payload.rm_file.call_count, 1)
+
+    def test_load_data_stops_prefetch_when_unreadable(self):
+        payload = self.payload_setup(prefetch_outfile=True)
+        payload._pk_for_filter = ["ID"]
+        payload.outfile_suffix_start = 1
+        payload.outfile_suffix_end = 3
+        payload.skip_chunk_cleanup = True
+        payload.load_chunk_file = Mock()
+        payload.log_load_progress = Mock()
+        with patch.object(util, "prefetch_file", return_value=False) as prefetch:
+            payload.load_data()
+
+        # Only tried once for the second chunk, and all chunks are loaded
+        prefetch.assert_called_once_with(payload._outfile_name(2))
+        self.assertEqual(payload.load_chunk_file.call_count, 3)
+
+    def test_start_snapshot_streams_replay_ids(self):
+        payload = self.payload_setup()
+        payload.query = Mock(return_value=[])
+        payload.extract_gtid_set_from_snapshot_query_result = Mock(return_value="")
+        payload.get_max_delta_id = Mock(return_value=5)
+        payload.last_replayed_id = 0
+        payload.query_stream = Mock(return_value=iter([(1,), (2,), (4,)]))
+        payload.start_snapshot()
+
+        payload.query_stream.assert_called_once()
+        self.assertEqual(payload.query_stream.call_args[0][1], (0, 5))
+        self.assertEqual(payload.last_replayed_id, 5)
+        self.assertEqual(payload._replayed_chg_ids.missing_points(), [3])
+
+    def test_checksum_by_chunk_interleaved(self):
+        payload = self.payload_setup()
+        payload._old_table = parse_create(
+            "CREATE TABLE a (ID int primary key, data varchar(10))"
+        )
+        payload._new_table = payload._old_table
+        payload._pk_for_filter = ["ID"]
+        payload._idx_name_for_filter = "PRIMARY"
+        new_idx = payload.find_coverage_index()
+        payload.refresh_range_start = Mock()
+        payload.detailed_checksum = Mock()
+        payload.commit = Mock()
+        payload.query = Mock(
+            side_effect=[
+                [{"cnt": 2, "data": 3}],
+                [{"cnt": 2, "data": 3}],
+                [{"cnt": 0, "data": 0}],
+                [{"cnt": 0, "data": 0}],
+            ]
+        )
+        payload.checksum_by_chunk_interleaved()
+        # Both tables are read from the same range start for each chunk
+        self.assertEqual(
+            payload.query.call_args_list,
+            [
+                call(
+                    sql.checksum_by_chunk(
+                        table_name,
+                        ["data"],
+                        ["ID"],
+                        payload.range_start_vars_array,
+                        payload.range_end_vars_array,
+                        payload.select_checksum_chunk_size,
+                        use_where,
+                        "PRIMARY" if table_name == payload.table_name else new_idx,
+                    )
+                )
+                for use_where in (False, True)
+                for table_name in (payload.table_name, payload.new_table_name)
+            ],
+        )
+        self.assertEqual(payload.refresh_range_start.call_count, 1)
+        self.assertEqual(payload.current_checksum_record, 2 ^ 3)
+        self.assertFalse(payload.detailed_checksum.called)
+        payload.commit.assert_called_once()
+
+        # A mismatch in the first chunk stops the scan right away
+        payload.query = Mock(
+            side_effect=[
+                [{"cnt": 2, "data": 3}],
+                [{"cnt": 2, "data": 4}],
+                [{"cnt": 2, "data": 5}],
+                [{"cnt": 2, "data": 5}],
+            ]
+        )
+        with self.assertRaises(OSCError) as err_context:
+            payload.checksum_by_chunk_interleaved()
+        self.assertEqual(err_context.exception.err_key, "CHECKSUM_MISMATCH")
+        self.assertEqual(payload.query.call_count, 2)
+        payload.detailed_checksum.assert_called_once()
+        # The transaction is still ended after a mismatch
+        self.assertEqual(payload.commit.call_count, 2)
+
+    def test_dump_current_chunk(self):
+        payload = self.payload_setup()
+        payload._old_table = payload._new_table = parse_create(
+            "CREATE TABLE a (ID int primary key, data varchar(10))"
+        )
+        payload._pk_for_filter = ["ID"]
+        payload.find_coverage_index = Mock(return_value="new_idx")
+        payload.execute_sql = Mock()
+        payload.dump_current_chunk(use_where=True)
+        payload.find_coverage_index.assert_called_once()
+        self.assertEqual(
+            payload.execute_sql.call_args_list,
+            [
+                call(
+                    sql.dump_current_chunk(
+                        table_name,
+                        ["data"],
+                        ["ID"],
+                        payload.range_start_vars_array,
+                        payload.select_chunk_size,
+                        idx,
+                        True,
+                        enable_outfile_compression=False,
+                    ),
+                    (
+                        payload._outfile_name(
+                            suffix=suffix, chunk_id=0, skip_compressed_extension=True
+                        ),
+                    ),
+                )
+                for table_name, idx, suffix in (
+                    (payload.table_name, "PRIMARY", ".old"),
+                    (payload.new_table_name, "new_idx", ".new"),
+                )
+            ],
+        )
+
+    def test_checksum_full_table(self):
+        payload = self.payload_setup()
+        payload._old_table = payload._new_table = parse_create(
+            "CREATE TABLE a (ID int, data int)"
+        )
+        payload.commit = Mock()
+        payload.compare_checksum = Mock()
+        payload.query = Mock(
+            return_value=[
+                {"_osc_table": 0, "cnt": 2, "data": 7},
+                {"_osc_table": 1, "cnt": 2, "data": 7},
+            ]
+        )
+        payload.checksum_full_table()
+        payload.query.assert_called_once_with(
+            sql.checksum_full_table_pair(
+                payload.table_name, payload.new_table_name, ["ID", "data"]
+            )
+        )
+        payload.compare_checksum.assert_called_once_with(
+            [{"cnt": 2, "data": 7}], [{"cnt": 2, "data": 7}]
+        )
+
+    def test_checksum_full_table_native_releases_snapshot_early(self):
+        payload = self.payload_setup()
+        calls = []
+        payload.commit = Mock(side_effect=lambda: calls.append("commit"))
+        payload.detailed_checksum = Mock()
+
+        def query(sql_query):
+            calls.append(sql_query)
+            return [{"Checksum": 123}]
+
+        payload.query = Mock(side_effect=query)
+        payload.checksum_full_table_native()
+        self.assertEqual(
+            calls,
+            [
+                sql.checksum_full_table_native(payload.table_name, ["ID"]),
+                "commit",
+                sql.checksum_full_table_native(payload.new_table_name, ["ID"]),
+            ],
+        )
+        self.assertFalse(payload.detailed_checksum.called)
+
+    def test_checksum_by_chunk_refreshes_range_start(self):
+        payload = self.payload_setup()
+        payload._old_table = payload._new_table = parse_create(
+            "CREATE TABLE a (ID int primary key, data varchar(10))"
+        )
+        payload._pk_for_filter = ["ID"]
+        payload._idx_name_for_filter = "PRIMARY"
+        payload.init_range_variables()
+        payload.execute_sql = Mock()
+        payload.query = Mock(side_effect=[[{"cnt": 1}], [{"cnt": 0}]])
+        payload.checksum_by_chunk(payload.table_name)
+
+        # The chunk query only assigns the range end, a range start assigned
+        # within the same statement couldn't be used for the range scan
+        payload.query.assert_has_calls(
+            [
+                call(
+                    sql.checksum_by_chunk(
+                        payload.table_name,
+                        ["data"],
+                        ["ID"],
+                        payload.range_start_vars_array,
+                        payload.range_end_vars_array,
+                        payload.select_checksum_chunk_size,
+                        use_where,
+                        "PRIMARY",
+                    )
+                )
+                for use_where in (False, True)
+            ]
+        )
+        payload.execute_sql.assert_has_calls(
+            [call(sql.select_into(payload.range_end_vars, payload.range_start_vars))]
+            * 2
+        )
+
+    def test_checksum_by_chunk_in_parallel(self):
+        payload = self.payload_setup(parallel_checksum=True)
+        payload._conn = Mock()
+        new_conn = Mock()
+        payload.get_conn = Mock(return_value=new_conn)
+        payload.commit = Mock()
+        payload.mysql_vars["rocksdb_skip_fill_cache"] = "OFF"
+        payload.checksum_by_chunk = Mock(
+            side_effect=lambda table_name, dump_after_checksum, conn=None: [
+                {"cnt": table_name, "conn": conn}
+            ]
+        )
+        old_checksum, new_checksum = payload.checksum_by_chunk_in_parallel()
+
+        self.assertEqual(old_checksum, [{"cnt": payload.table_name, "conn": None}])
+        self.assertEqual(
+            new_checksum, [{"cnt": payload.new_table_name, "conn": new_conn}]
+        )
+        payload.commit.assert_called_once()
+        # The session settings go onto the second connection only
+        new_conn.execute.assert_called_once_with(
+            sql.set_session_variable("rocksdb_skip_fill_cache"), (1,)
+        )
+        self.assertFalse(payload._conn.execute.called)
+        # The second connection is closed rather than pooled with the session
+        # settings still applied, the main one is kept
+        new_conn.close.assert_called_once()
+        self.assertTrue(payload._conn_pool.empty())
+        self.assertFalse(payload._conn.disconnect.called)
+
+    def test_create_triggers(self):
+        payload = self.payload_setup()
+        payload._old_table = parse_create(
+            "CREATE TABLE a (ID int primary key, data varchar(10))"
+        )
+        payload._pk_for_filter = ["ID"]
+        payload.render_column_lists()
+        payload.stop_slave_sql = Mock()
+        payload.start_slave_sql = Mock()
+        payload.ddl_guard = Mock()
+        payload.wait_until_slow_query_finish = Mock()
+        payload.lock_tables = Mock()
+        payload.unlock_tables = Mock()
+        payload._cleanup_payload = Mock()
+        payload.execute_sql = Mock()
+        payload.execute_hook = Mock()
+        payload.create_triggers()
+        # Each trigger goes on its own, so hooks can run in between
+        statements = [c[0][0] for c in payload.execute_sql.call_args_list]
+        self.assertEqual(len(statements), 3)
+        for trigger_name, stmt in zip(
+            (
+                payload.insert_trigger_name,
+                payload.delete_trigger_name,
+                payload.update_trigger_name,
+            ),
+            statements,
+        ):
+            self.assertIn(trigger_name, stmt)
+        self.assertEqual(
+            payload._cleanup_payload.add_drop_trigger_entry.call_args_list,
+            [
+                call(payload._current_db, payload.insert_trigger_name),
+                call(payload._current_db, payload.delete_trigger_name),
+                call(payload._current_db, payload.update_trigger_name),
+            ],
+        )
+        hooks = [c[0][0] for c in payload.execute_hook.call_args_list]
+        self.assertIn("before_create_delete_trigger", hooks)
+        self.assertIn("after_create_delete_trigger", hooks)
+
+    def test_skip_triggers(self):
+        payload = self.payload_setup(skip_triggers=True)
+        payload._old_table = payload._new_table = parse_create(
+            "CREATE TABLE a (ID int primary key, data varchar(10))"
+        )
+        payload.execute_sql = Mock()
+        payload.lock_tables = Mock()
+        payload.create_triggers()
+        self.assertFalse(payload.execute_sql.called)
+        self.assertFalse(payload.lock_tables.called)
+
+        # Nothing has been written
+        checksum = {"cnt": 2, "bit_xor(crc32(`ID`))": 3}
+        payload.query = Mock(
+            return_value=[{"_osc_table": 0, **checksum}, {"_osc_table": 1, **checksum}]
+        )
+        payload.check_no_writes()
+        payload.query.assert_called_once_with(
+            sql.checksum_full_table_pair(
+                payload.table_name, payload.new_table_name, ["ID", "data"]
+            )
+        )
+
+        # A row has been inserted after the snapshot
+        payload.query = Mock(
+            return_value=[
+                {"_osc_table": 0, **checksum, "cnt": 3},
+                {"_osc_table": 1, **checksum},
+            ]
+        )
+        with self.assertRaises(OSCError) as err_context:
+            payload.check_no_writes()
+        self.assertEqual(err_context.exception.err_key, "WRITES_WITHOUT_TRIGGERS")
+
+    def test_analyze_table_skips_refreshed_stats(self):
+        payload = self.payload_setup(idx_recreation=True)
+        payload._new_table = parse_create(
+            "CREATE TABLE a (ID int primary key, b int, KEY idx_b (b))"
+        )
+        payload.get_table_timestamp = Mock(return_value="")
+        payload.execute_sql_multi = Mock()
+        payload.mysql_vars = {
+            "innodb_stats_persistent": "ON",
+            "innodb_stats_auto_recalc": "ON",
+        }
+        payload.stats["outfile_lines"] = 1000
+        payload._load_finished_at = time.time() - 60
+        payload.query = Mock(return_value=[{"n_rows": 1050, "stats_age": 30}])
+        payload.analyze_table()
+        payload.query.assert_called_once_with(
+            sql.innodb_table_stats_age, ("test", payload.new_table_name)
+        )
+        payload.execute_sql_multi.assert_called_with(
+            [(sql.analyze_table(payload.delta_table_name), ())]
+        )
+
+        both_tables = [
+            (sql.analyze_table(payload.new_table_name), ()),
+            (sql.analyze_table(payload.delta_table_name), ()),
+        ]
+        for stats in (
+            # Saved before the load finished
+            [{"n_rows": 1000, "stats_age": 90}],
+            # Not recalculated since the load was only half done
+            [{"n_rows": 500, "stats_age": 30}],
+            # STATS_PERSISTENT=0 on the table itself
+            [],
+        ):
+            payload.query = Mock(return_value=stats)
+            payload.analyze_table()
+            payload.execute_sql_multi.assert_called_with(both_tables)
+
+        # No index has been recreated
+        payload.idx_recreation = False
+        payload.analyze_table()
+        payload.execute_sql_multi.assert_called_with(both_tables)
+
+    def test_borrow_conn(self):
+        payload = self.payload_setup()
+        conns = [Mock(), Mock()]
+        payload.get_conn = Mock(side_effect=conns)
+        with payload._borrow_conn() as conn:
+            self.assertIs(conn, conns[0])
+        # An idle connection is reused rather than opening a new one
+        with payload._borrow_conn() as conn:
+            self.assertIs(conn, conns[0])
+        conns[0].ping.assert_called_once()
+        # A connection is discarded if anything goes wrong while using it
+        with self.assertRaises(ValueError):
+            with payload._borrow_conn():
+                raise ValueError()
+        conns[0].close.assert_called_once()
+        with payload._borrow_conn() as conn:
+            self.assertIs(conn, conns[1])
+        self.assertEqual(payload.get_conn.call_count, 2)
+
+    def test_compare_checksum(self):
+        payload = self.payload_setup()
+        payload.detailed_checksum = Mock()
+        old = [{"cnt": 2, "col": 5}, {"cnt": 1, "col": 8}]
+        payload.compare_checksum(old, [dict(entry) for entry in old])
+        self.assertFalse(payload.detailed_checksum.called)
+        self.assertEqual(payload.current_checksum_record, 2 ^ 5 ^ 1 ^ 8)
+
+        payload.compare_checksum(old, [{"cnt": 2, "col": 5}, {"cnt": 1, "col": 9}])
+        payload.detailed_checksum.assert_called_once()
+
+    def test_detailed_checksum_compares_rows(self):
+        payload = self.payload_setup()
+        payload.find_coverage_index = Mock()
+        payload.refresh_range_start = Mock()
+        payload.dump_current_chunk = Mock()
+        payload.checksum_for_single_chunk = Mock(
+            side_effect=[
+                {"_osc_chunk_cnt": 2, "ID": 3},
+                {"_osc_chunk_cnt": 2, "ID": 3},
+                {"_osc_chunk_cnt": 0, "ID": None},
+                {"_osc_chunk_cnt": 0, "ID": None},
+            ]
+        )
+        payload.detailed_checksum()
+        self.assertFalse(payload.dump_current_chunk.called)
+
+        payload.checksum_for_single_chunk = Mock(
+            side_effect=[
+                {"_osc_chunk_cnt": 2, "ID": 3},
+                {"_osc_chunk_cnt": 2, "ID": 4},
+            ]
+        )
+        with self.assertRaises(OSCError) as err_context:
+            payload.detailed_checksum()
+        self.assertEqual(err_context.exception.err_key, "CHECKSUM_MISMATCH")
+        payload.dump_current_chunk.assert_called_once()
+
+    def test_need_checksum_pk_collation(self):
+        payload = self.payload_setup()
+        payload._old_table = parse_create(
+            "CREATE TABLE a (ID varchar(10) COLLATE latin1_bin primary key)"
+        )
+        payload._new_table = parse_create(
+            "CREATE TABLE a (ID varchar(10) COLLATE latin1_bin primary key)"
+        )
+        payload._pk_for_filter = ["ID"]
+        self.assertTrue(payload.need_checksum())
+
+        payload._new_table = parse_create(
+            "CREATE TABLE a (ID varchar(10) COLLATE latin1_general_ci primary key)"
+        )
+        self.assertFalse(payload.need_checksum())
+
+    def test_checksum_by_replay_chunk_batched(self):
+        payload = self.payload_setup()
+        payload._pk_for_filter = ["ID"]
+        payload.replay_batch_size = 10
+        payload.last_checksumed_id = 0
+        payload.last_replayed_id = 25
+        payload.query = Mock(
+            return_value=[
+                {"_osc_window": 0, "cnt": 10},
+                {"_osc_window": 1, "cnt": 10},
+                {"_osc_window": 2, "cnt": 5},
+            ]
+        )
+        result = payload.checksum_by_replay_chunk(payload.table_name)
+        # All three windows are checksummed in a single query
+        payload.query.assert_called_once_with(
+            sql.checksum_by_replay_chunk_batch(
+                payload.table_name,
+                payload.delta_table_name,
+                ["ID"],
+                ["ID"],
+                payload.IDCOLNAME,
+                range(0, 25, 10),
+                25,
+                10,
+            )
+        )
+        self.assertEqual(result, [{"cnt": 10}, {"cnt": 10}, {"cnt": 5}])
+
+    def test_checksum_for_changes_nothing_replayed(self):
+        payload = self.payload_setup()
+        payload.need_checksum_for_changes = Mock(return_value=True)
+        payload.last_checksumed_id = 25
+        payload.last_replayed_id = 25
+        payload.checksum_by_replay_chunk = Mock()
+        payload.commit = Mock()
+        payload.checksum_for_changes(single_trx=False)
+        self.assertFalse(payload.checksum_by_replay_chunk.called)
+        payload.commit.assert_called_once()
+
+    def test_divide_changes_tuple_rows(self):
+        # Replay keeps changes as (id, dml_type, *pk) tuples
+        payload = self.payload_setup(batch_updates=True)
+        payload.replay_group_size = 100
+        payload.use_batch_updates = True
+        chg_rows = [
+            (1, payload.DML_TYPE_INSERT, 1),
+            (2, payload.DML_TYPE_INSERT, 2),
+            (3, payload.DML_TYPE_UPDATE, 1),
+            (4, payload.DML_TYPE_UPDATE, 2),
+            (5, payload.DML_TYPE_UPDATE, 1),
+        ]
+        groups = list(payload.divide_changes_to_group(chg_rows, (0, 1, range(2, 3))))
+        self.assertEqual(
+            groups,
+            [
+                (payload.DML_TYPE_INSERT, [1, 2]),
+                (payload.DML_TYPE_UPDATE, [3, 4]),
+                (payload.DML_TYPE_UPDATE, [5]),
+            ],
+        )
+
+    def test_divide_changes_deletes_by_pk(self):
+        payload = self.payload_setup(replay_deletes_by_pk=True)
+        payload._pk_for_filter = ["ID"]
+        payload.replay_group_size = 100
+        chg_rows = [
+            (1, payload.DML_TYPE_DELETE, 10),
+            (2, payload.DML_TYPE_DELETE, 20),
+            (3, payload.DML_TYPE_INSERT, 10),
+        ]
+        groups = list(payload.divide_changes_to_group(chg_rows, (0, 1, range(2, 3))))
+        self.assertEqual(
+            groups,
+            [
+                (payload.DML_TYPE_DELETE, [10, 20]),
+                (payload.DML_TYPE_INSERT, [3]),
+            ],
+        )
+        self.assertTrue(
+            payload._ensure_replay_sql()[payload.DML_TYPE_DELETE].startswith(
+                "DELETE FROM `__osc_new_a` WHERE `ID` IN"
+            )
+        )
+
+        # Charset conversion has to go through the delta table join
+        payload.mismatch_pk_charset = {"ID": "utf8mb4"}
+        self.assertFalse(payload.can_replay_deletes_by_pk())
+
+    def test_divide_changes_insert_ranges(self):
+        payload = self.payload_setup(bulk_replay_threshold=4)
+        payload.replay_group_size = 2
+        payload.replay_batch_size = 3
+        ins = payload.DML_TYPE_INSERT
+        chg_rows = [(i, ins, i) for i in (1, 3, 4, 5, 6, 7, 9)]
+        groups = list(payload.divide_changes_to_group(chg_rows, (0, 1, range(2, 3))))
+        self.assertEqual(
+            groups,
+            [
+                (ins, [1]),
+                (ins, range(3, 6)),
+                (ins, range(6, 8)),
+                (ins, [9]),
+            ],
+        )
+
     def test_divide_changes_all_the_same_type(self):
         payload = CopyPayload()
         payload.replay_group_size = 100
@@ -1069,6 +2243,62 @@ class CopyPayloadTestCase(unittest.TestCase):
             ],
         )
 
+    def test_divide_changes_batch_updates(self):
+        """
+        With batch updates enabled, consecutive updates should be grouped
+        until the same primary key shows up again
+        """
+        payload = self.payload_setup(batch_updates=True)
+        payload._pk_for_filter = ["ID"]
+        payload.use_batch_updates = payload.enable_batch_updates()
+        self.assertTrue(payload.use_batch_updates)
+        payload.replay_group_size = 100
+        type_name = payload.DMLCOLNAME
+        id_name = payload.IDCOLNAME
+        chg_rows = [
+            {type_name: 3, id_name: 1, "ID": 1},
+            {type_name: 3, id_name: 2, "ID": 2},
+            {type_name: 3, id_name: 3, "ID": 1},
+            {type_name: 1, id_name: 4, "ID": 3},
+        ]
+        groups = list(payload.divide_changes_to_group(chg_rows))
+        self.assertEqual(
+            groups,
+            [
+                (3, [1, 2]),
+                (3, [3]),
+                (1, [4]),
+            ],
+        )
+
+        # The new table is matched by a different primary key than the one
+        # groups are checked against
+        payload._pk_for_filter = ["ID", "data"]
+        self.assertFalse(payload.enable_batch_updates())
+
+    def test_divide_changes_skip_superseded_updates(self):
+        payload = self.payload_setup(skip_superseded_updates=True)
+        payload._pk_for_filter = ["ID"]
+        payload.use_batch_updates = False
+        type_name = payload.DMLCOLNAME
+        id_name = payload.IDCOLNAME
+        chg_rows = [
+            {type_name: 3, id_name: 1, "ID": 1},
+            {type_name: 3, id_name: 2, "ID": 2},
+            {type_name: 3, id_name: 3, "ID": 1},
+            {type_name: 2, id_name: 4, "ID": 1},
+            {type_name: 3, id_name: 5, "ID": 2},
+        ]
+        groups = list(payload.divide_changes_to_group(chg_rows))
+        # The first update of ID 1 is overwritten by the third change, but
+        # the update of ID 2 after the delete is in a run of its own
+        self.assertEqual(groups, [(3, [2]), (3, [3]), (2, [4]), (3, [5])])
+        self.assertEqual(payload.stats["superseded_updates_skipped"], 1)
+
+        # Rows can't be told apart when the primary key changes
+        payload._pk_for_filter = ["ID", "data"]
+        self.assertEqual(len(list(payload.divide_changes_to_group(chg_rows))), 5)
+
     def test_divide_changes_group_size_reach_limit(self):
         """
         If group size has exceeded the limit, we should break them into two
@@ -1143,6 +2373,17 @@ class CopyPayloadTestCase(unittest.TestCase):
             payload.wait_until_slow_query_finish()
         self.assertEqual(err_context.exception.err_key, "LONG_RUNNING_TRX")
 
+    def test_long_trx_matches_whole_table_name(self):
+        payload = self.payload_setup()
+        payload.long_trx_time = 10
+        proc = {"Time": 100, "db": "test", "Id": 123, "Command": "Query"}
+        # Table `a` is only a part of another table name
+        payload.query = Mock(return_value=[dict(proc, Info=b"select * from a_v2")])
+        self.assertIsNone(payload.get_long_trx())
+
+        payload.query = Mock(return_value=[dict(proc, Info=b"select * from `a`")])
+        self.assertEqual(payload.get_long_trx()["Id"], 123)
+
     def test_auto_table_collation_population(self):
         payload = self.payload_setup()
         sql = """
@@ -1273,6 +2514,16 @@ class CopyPayloadTestCase(unittest.TestCase):
         self.assertTrue(payload.get_table_timestamp.called)
         self.assertFalse(payload.select_table_into_outfile.called)
 
+    def test_timestamp_on_truncate_probed_once(self):
+        payload = self.payload_setup()
+        payload.query_variable = Mock(return_value="OFF")
+        payload.execute_sql = Mock()
+        payload.get_table_timestamp = Mock(return_value=123)
+        payload.record_table_timestamp()
+        payload.stop_tracking_table_timestamp()
+        payload.query_variable.assert_called_once()
+        self.assertEqual(payload.execute_sql.call_count, 2)
+
 
 class CopyPayloadPKFilterTestCase(unittest.TestCase):
     def setUp(self) -> None:
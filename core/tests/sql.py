@@ -35,6 +35,30 @@ class SqlTestCase(unittest.TestCase):
             "( `a` > x ) OR ( `b` > 2 AND `a` = x ) OR ( `c` > z AND `a` = x AND `b` = 2 )",
         )
 
+    def test_drop_indexes(self) -> None:
+        self.assertEqual(
+            sql.drop_indexes("t", ["a"]),
+            "ALTER TABLE `t` DROP INDEX `a`",
+        )
+        self.assertEqual(
+            sql.drop_indexes("t", ["a", "b`c"]),
+            "ALTER TABLE `t` DROP INDEX `a`, DROP INDEX `b``c`",
+        )
+
+    def test_replay_delete_by_pk(self) -> None:
+        self.assertEqual(
+            sql.replay_delete_by_pk("__osc_new_t", "id"),
+            "DELETE FROM `__osc_new_t` WHERE `id` IN %s",
+        )
+
+    def test_replay_insert_range(self) -> None:
+        self.assertEqual(
+            sql.replay_insert_range(["id", "a"], "__osc_new_t", "__osc_chg_t", "_osc_ID_"),
+            "INSERT  INTO `__osc_new_t` (`id`, `a`)"
+            "SELECT `id`, `a` FROM `__osc_chg_t` FORCE INDEX (PRIMARY) WHERE "
+            "`__osc_chg_t`.`_osc_ID_` BETWEEN %s AND %s ",
+        )
+
     def test_get_match_clause(self) -> None:
         clause = sql.get_match_clause(
             "__osc_new_tbl",
@@ -101,3 +125,75 @@ class SqlTestCase(unittest.TestCase):
             clause,
             "DELETE __osc_new_tbl FROM `__osc_new_tbl`, `__osc_chg_tbl` WHERE `__osc_chg_tbl`.`_osc_ID` IN %s AND `__osc_new_tbl`.`col1` = CONVERT(`__osc_chg_tbl`.`col1` using `latin1`) AND `__osc_new_tbl`.`col2` = `__osc_chg_tbl`.`col2`",
         )
+
+    def test_replay_updates_by_ids(self) -> None:
+        clause = sql.replay_updates_by_ids(
+            ["col1", "col2"],
+            "__osc_new_tbl",
+            "__osc_chg_tbl",
+            False,
+            "_osc_ID",
+            ["id"],
+            {},
+        )
+
+        self.assertEqual(
+            clause,
+            "UPDATE  `__osc_new_tbl` JOIN (SELECT `id`, `col1`, `col2` FROM `__osc_chg_tbl` FORCE INDEX (PRIMARY) WHERE `__osc_chg_tbl`.`_osc_ID` IN %s) AS `__osc_chg_tbl` ON `__osc_new_tbl`.`id` = `__osc_chg_tbl`.`id` SET `__osc_new_tbl`.`col1` = `__osc_chg_tbl`.`col1`, `__osc_new_tbl`.`col2` = `__osc_chg_tbl`.`col2` ",
+        )
+
+    def test_checksum_full_table_pair(self) -> None:
+        query = sql.checksum_full_table_pair("a", "__osc_new_a", ["id", "data"])
+        self.assertIn(
+            "SELECT 0 AS `_osc_table`, `o`.* FROM ({}) AS `o` UNION ALL ".format(
+                sql.checksum_full_table("a", ["id", "data"])
+            ),
+            query,
+        )
+        self.assertIn(
+            "SELECT 1 AS `_osc_table`, `n`.* FROM ({}) AS `n` ".format(
+                sql.checksum_full_table("__osc_new_a", ["id", "data"])
+            ),
+            query,
+        )
+        self.assertTrue(query.endswith("ORDER BY `_osc_table`"))
+
+    def test_checksum_by_replay_chunk_batch(self) -> None:
+        args = ("a", "__osc_chg_a", ["ID"], ["ID"], "_osc_ID_")
+        single = sql.checksum_by_replay_chunk(*args, 0, 1000, 100)
+        batch = sql.checksum_by_replay_chunk_batch(*args, [0, 100], 1000, 100)
+        self.assertIn(
+            "SELECT 0 AS `_osc_window`, `w`.* FROM ({}) AS `w` UNION ALL ".format(
+                single
+            ),
+            batch,
+        )
+        self.assertIn("SELECT 1 AS `_osc_window`", batch)
+        self.assertTrue(batch.endswith("ORDER BY `_osc_window`"))
+
+    def test_get_replay_ids(self) -> None:
+        self.assertEqual(
+            sql.get_replay_ids("_osc_ID_", "__osc_chg_tbl"),
+            "SELECT `_osc_ID_` FROM `__osc_chg_tbl` "
+            "WHERE `_osc_ID_` > %s AND `_osc_ID_` <= %s ORDER BY `_osc_ID_`",
+        )
+
+    def test_set_session_variables(self) -> None:
+        self.assertEqual(
+            sql.set_session_variables(["sql_mode", "lock_wait_timeout"]),
+            "SET SESSION sql_mode = %s, lock_wait_timeout = %s",
+        )
+
+    def test_get_table_timestamp(self) -> None:
+        # The lookup must stay within the current schema, other databases on
+        # the instance may have a table with the same name
+        self.assertIn("TABLE_SCHEMA = DATABASE() AND ", sql.get_table_timestamp("a"))
+
+    def test_online_alter(self) -> None:
+        # Nothing can follow a partition clause, so the options have to go
+        # right after the table name
+        self.assertEqual(
+            sql.online_alter("a", "ALTER TABLE `a` ADD `foo` int, REMOVE PARTITIONING"),
+            "ALTER TABLE `a` ALGORITHM=INPLACE, LOCK=NONE, "
+            "ADD `foo` int, REMOVE PARTITIONING",
+        )
@@ -9,9 +9,12 @@ This source code is licensed under the BSD-style license found in the
 LICENSE file in the root directory of this source tree.
 """
 
+import gc
+import os
+import tempfile
 import unittest
 
-from ..lib.util import dirname_for_db, RangeChain
+from ..lib.util import dirname_for_db, gc_paused, prefetch_file, RangeChain
 
 
 class RangeChainTest(unittest.TestCase):
@@ -40,6 +43,16 @@ class RangeChainTest(unittest.TestCase):
         )
         self.assertEqual(chain.missing_points(), [4])
 
+    def test_range_chain_fill(self):
+        chain = RangeChain()
+        chain.extend([1, 4])
+        chain.fill(2)
+        self.assertEqual(chain.missing_points(), [3])
+        with self.assertRaises(Exception):
+            chain.fill(2)
+        with self.assertRaises(Exception):
+            chain.fill(5)
+
     def test_range_chain_with_large_gap(self):
         chain = RangeChain()
         long_list = list(range(1, 20))
@@ -150,6 +163,21 @@ class RangeChainTest(unittest.TestCase):
         with self.assertRaises(Exception):
             chain.fill(3)
 
+    def test_fill_large_gap(self):
+        chain = RangeChain()
+        chain.extend([1, 100000])
+        for point in (2, 50000, 99999):
+            chain.fill(point)
+        missing_points = chain.missing_points()
+        self.assertEqual(len(missing_points), 99998 - 3)
+        self.assertEqual(missing_points[0], 3)
+        self.assertEqual(missing_points[-1], 99998)
+        self.assertNotIn(50000, missing_points)
+        with self.assertRaises(Exception):
+            chain.fill(50000)
+        with self.assertRaises(Exception):
+            chain.fill(100001)
+
 
 class DirnameForDbTest(unittest.TestCase):
     def test_normal_db_name(self):
@@ -162,3 +190,37 @@ class DirnameForDbTest(unittest.TestCase):
         expected = "some@002ddb1"
         result = dirname_for_db(db_name)
         self.assertEqual(expected, result)
+
+
+class PrefetchFileTest(unittest.TestCase):
+    def test_prefetch_file(self):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b"data")
+            f.flush()
+            self.assertEqual(prefetch_file(f.name), hasattr(os, "posix_fadvise"))
+
+    def test_prefetch_missing_file(self):
+        self.assertFalse(prefetch_file("/nonexistent/osc_outfile"))
+
+
+class GcPausedTest(unittest.TestCase):
+    def test_gc_paused(self):
+        self.assertTrue(gc.isenabled())
+        with gc_paused():
+            self.assertFalse(gc.isenabled())
+        self.assertTrue(gc.isenabled())
+
+    def test_gc_paused_restored_on_error(self):
+        with self.assertRaises(ValueError):
+            with gc_paused():
+                raise ValueError()
+        self.assertTrue(gc.isenabled())
+
+    def test_gc_paused_keeps_disabled(self):
+        gc.disable()
+        try:
+            with gc_paused():
+                pass
+            self.assertFalse(gc.isenabled())
+        finally:
+            gc.enable()